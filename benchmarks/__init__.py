@@ -0,0 +1,175 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+==========
+Benchmarks
+==========
+
+Timing and memory benchmarks of the engine hot paths. Run them all with::
+
+  python -m benchmarks -o results.json
+
+and check a later run against those results with ``--baseline results.json``: every benchmark
+slower than the baseline by more than the threshold is reported as a regression (and the exit
+status is 1).
+
+*Large* benchmarks, which need a full size database (a 276MB temporary file, and over 1GB of
+memory to load it), only run when asked for by name, e.g. ``python -m benchmarks probsdb ply``.
+
+A benchmark is a function registered with :py:func:`benchmark`. It does the setup (with a fixed
+random seed, so every run measures the same work) and returns a function doing ``ops`` operations,
+which is what is timed. The time reported is the best per operation over a few repeats, with the
+garbage collector off; the memory is the peak of the allocations (``tracemalloc``) of one call,
+measured in a separate call.
+"""
+from __future__ import absolute_import
+
+import gc
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+__all__ = ["benchmark", "BENCHMARKS", "selected", "samplePositions", "runBenchmark", "runAll",
+           "compare"]
+
+BENCHMARKS = []
+"""All registered benchmarks, as (name, setup, ops, repeat, large) tuples, in registration order."""
+
+
+def benchmark(name, ops=1, repeat=5, large=False):
+    """ Register the decorated setup function as benchmark ``name``. The function it returns does
+    ``ops`` operations per call, and is timed ``repeat`` times. A ``large`` benchmark only runs
+    when selected by name. """
+
+    def register(setup):
+        BENCHMARKS.append((name, setup, ops, repeat, large))
+        return setup
+    return register
+
+
+def selected(name, large, select=None):
+    """ True if benchmark ``name`` runs with ``select`` (see :py:func:`runAll`). """
+
+    if not select:
+        return not large
+    return any(s in name for s in select)
+
+
+def _load():
+    # registration happens on import
+    from . import urcoreBench, probsdbBench, playBench  # noqa: F401
+
+
+def samplePositions(n, seed=0):
+    """ ``n`` random positions (boards) where the game is not over, the same ones every time. """
+
+    from royalur.urcore import TOTAL_POSITIONS, gameOver, index2Board
+
+    rnd = random.Random(seed)
+    boards = []
+    while len(boards) < n:
+        b = index2Board(rnd.randrange(TOTAL_POSITIONS))
+        if not gameOver(b):
+            boards.append(b)
+    return boards
+
+
+def runBenchmark(setup, ops, repeat, minTime=0.2):
+    """ Time the function returned by ``setup``. Return a dict with the best and median ``seconds``
+    per operation, the number of ``calls`` per repeat and the ``peakBytes`` allocated by a call. """
+
+    run = setup()
+
+    times = []
+    calls = 1
+    gcOld = gc.isenabled()
+    gc.disable()
+    try:
+        # calls per repeat, so that a repeat lasts at least minTime (warm-up, not counted)
+        while repeat > 1:
+            t = time.perf_counter()
+            for _ in range(calls):
+                run()
+            elapsed = time.perf_counter() - t
+            if elapsed >= minTime:
+                break
+            calls *= max(2, int(minTime / max(elapsed, 1e-6)) + 1)
+
+        for _ in range(repeat):
+            t = time.perf_counter()
+            for _ in range(calls):
+                run()
+            times.append((time.perf_counter() - t) / calls)
+    finally:
+        if gcOld:
+            gc.enable()
+
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    times.sort()
+    return {"seconds": times[0] / ops, "median": times[len(times) // 2] / ops, "calls": calls,
+            "ops": ops, "peakBytes": peak}
+
+
+def runAll(select=None, report=None):
+    """ Run the benchmarks whose names contain one of the strings in ``select`` (all but the large
+    ones if None). Call ``report(name, result)`` after each. Return the results document (a dict,
+    JSON ready). """
+
+    _load()
+    results = {}
+    for name, setup, ops, repeat, large in BENCHMARKS:
+        if not selected(name, large, select):
+            continue
+        results[name] = runBenchmark(setup, ops, repeat)
+        if report:
+            report(name, results[name])
+    meta = {"python": sys.version.split()[0], "implementation": platform.python_implementation(),
+            "machine": platform.machine(), "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    return {"meta": meta, "results": results}
+
+
+def compare(results, baseline, threshold=0.1):
+    """ Compare two results documents. Return a list of (name, new seconds, baseline seconds, ratio,
+    regression) tuples for the benchmarks in both; a regression is a ratio above 1 + ``threshold``.
+    """
+
+    rows = []
+    base = baseline["results"]
+    for name, r in results["results"].items():
+        if name in base:
+            ratio = r["seconds"] / base[name]["seconds"]
+            rows.append((name, r["seconds"], base[name]["seconds"], ratio, ratio > 1 + threshold))
+    return rows
+
+
+def save(results, filename):
+    with open(filename, "w") as f:
+        json.dump(results, f, indent=1, sort_keys=True)
+
+
+def load(filename):
+    with open(filename) as f:
+        return json.load(f)
@@ -0,0 +1,70 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+""" Run the benchmarks, save the results as JSON, compare them with a baseline. """
+from __future__ import print_function
+from __future__ import absolute_import
+
+import argparse
+import sys
+
+from . import runAll, compare, save, load
+
+
+def _human(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e3), ("us", 1e6)):
+        if seconds * scale >= 1:
+            return "{0:.3g}{1}".format(seconds * scale, unit)
+    return "{0:.3g}ns".format(seconds * 1e9)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="""Run the royalur benchmarks.""")
+
+    parser.add_argument("--output", "-o", metavar="FILE", help="Save the results (JSON) to FILE.")
+
+    parser.add_argument("--baseline", "-b", metavar="FILE",
+                        help="Compare with the results in FILE, exit with 1 on a regression.")
+
+    parser.add_argument("--threshold", "-t", type=float, default=0.1,
+                        help="Slowdown counted as a regression (default 0.1, 10%%).")
+
+    parser.add_argument("select", metavar="NAME", nargs="*",
+                        help="Run only benchmarks whose name contains one of these (needed for "
+                        "the large ones, e.g. probsdb).")
+
+    options = parser.parse_args()
+
+    def report(name, r):
+        print("{0:32} {1:>10}/op  {2:>8.1f}KB peak".format(name, _human(r["seconds"]),
+                                                           r["peakBytes"] / 1024.))
+        sys.stdout.flush()
+
+    results = runAll(options.select, report)
+    if options.output:
+        save(results, options.output)
+
+    if options.baseline:
+        rows = compare(results, load(options.baseline), options.threshold)
+        print()
+        for name, new, old, ratio, regression in rows:
+            print("{0:32} {1:>10} {2:>10} {3:6.2f}x{4}".format(name, _human(new), _human(old), ratio,
+                                                              "  REGRESSION" if regression else ""))
+        if any(row[-1] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
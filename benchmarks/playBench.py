@@ -0,0 +1,67 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+""" Benchmarks of searching and playing (royalur.play), with a memory-mapped database. """
+from __future__ import absolute_import
+
+import random
+
+from royalur.urcore import startPosition
+from royalur.probsdb import PositionsWinProbs
+from royalur.play import ply1, prob, rollout, pitStrategies
+from royalur.humanStrategies import bestHumanStrategySoFar as hplay
+
+from . import benchmark, samplePositions
+from .probsdbBench import dbFile
+
+
+@benchmark("play.ply1", ops=100, large=True)
+def ply1Bench():
+    db = PositionsWinProbs(dbFile(), useMmap=True)
+    boards = samplePositions(100)
+
+    def run():
+        for b in boards:
+            ply1(b, db)
+    return run
+
+
+@benchmark("play.prob.2ply", ops=10, large=True)
+def probBench():
+    db = PositionsWinProbs(dbFile(), useMmap=True)
+    boards = samplePositions(10)
+
+    def run():
+        for b in boards:
+            prob(b, 2, db)
+    return run
+
+
+@benchmark("play.rollout", ops=20)
+def rolloutBench():
+    # per game
+    def run():
+        random.seed(0)
+        rollout(startPosition(), 20)
+    return run
+
+
+@benchmark("play.pitStrategies", ops=20)
+def pitStrategiesBench():
+    # per game
+    def run():
+        random.seed(0)
+        pitStrategies(hplay, hplay, 20)
+    return run
@@ -0,0 +1,79 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+""" Benchmarks of the probabilities database (royalur.probsdb), on a 16-bit database file of the
+full size with made up values. These are large benchmarks (see benchmarks), as are those using
+:py:func:`dbFile` elsewhere: run them with ``python -m benchmarks probsdb``. """
+from __future__ import absolute_import
+
+import atexit
+import os
+import random
+import shutil
+import tempfile
+
+from royalur.urcore import TOTAL_POSITIONS
+from royalur.probsdb import PositionsWinProbs
+
+from . import benchmark, samplePositions
+
+N = 1000
+
+_dbFile = None
+
+
+def dbFile():
+    """ Name of a 16-bit database file (made once, removed on exit). """
+
+    global _dbFile
+    if _dbFile is None:
+        tmpdir = tempfile.mkdtemp()
+        atexit.register(shutil.rmtree, tmpdir)
+        _dbFile = os.path.join(tmpdir, "db16.bin")
+        rnd = random.Random(0)
+        chunk = bytes(rnd.getrandbits(8) for _ in range(1 << 16))
+        with open(_dbFile, "wb") as f:
+            for _ in range(0, 2 * TOTAL_POSITIONS, len(chunk)):
+                f.write(chunk)
+            f.truncate(2 * TOTAL_POSITIONS)
+    return _dbFile
+
+
+@benchmark("probsdb.load", repeat=1, large=True)
+def loadBench():
+    fname = dbFile()
+    return lambda: PositionsWinProbs(fname)
+
+
+@benchmark("probsdb.aget", ops=N, large=True)
+def agetBench():
+    db = PositionsWinProbs(dbFile())
+    boards = samplePositions(N)
+
+    def run():
+        for b in boards:
+            db.aget(b)
+    return run
+
+
+@benchmark("probsdb.aget.mmap", ops=N, large=True)
+def agetMmapBench():
+    db = PositionsWinProbs(dbFile(), useMmap=True)
+    boards = samplePositions(N)
+
+    def run():
+        for b in boards:
+            db.aget(b)
+    return run
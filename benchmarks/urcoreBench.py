@@ -0,0 +1,106 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+""" Benchmarks of the board primitives (royalur.urcore). """
+from __future__ import absolute_import
+
+from royalur.urcore import allMoves, board2Code, board2Index, boards2Indices, code2Board, \
+    index2Board, indices2Boards, positionsIterator, reverseBoard
+
+from . import benchmark, samplePositions
+
+N = 1000
+
+
+@benchmark("urcore.allMoves", ops=5 * N)
+def allMovesBench():
+    boards = samplePositions(N)
+
+    def run():
+        for b in boards:
+            for pips in range(5):
+                allMoves(b, pips)
+    return run
+
+
+@benchmark("urcore.reverseBoard", ops=N)
+def reverseBoardBench():
+    boards = samplePositions(N)
+
+    def run():
+        for b in boards:
+            reverseBoard(b)
+    return run
+
+
+@benchmark("urcore.board2Index", ops=N)
+def board2IndexBench():
+    boards = samplePositions(N)
+
+    def run():
+        for b in boards:
+            board2Index(b)
+    return run
+
+
+@benchmark("urcore.index2Board", ops=N)
+def index2BoardBench():
+    indices = [board2Index(b) for b in samplePositions(N)]
+
+    def run():
+        for i in indices:
+            index2Board(i)
+    return run
+
+
+@benchmark("urcore.boards2Indices", ops=N)
+def boards2IndicesBench():
+    boards = samplePositions(N)
+    return lambda: boards2Indices(boards)
+
+
+@benchmark("urcore.indices2Boards", ops=N)
+def indices2BoardsBench():
+    indices = boards2Indices(samplePositions(N))
+    return lambda: indices2Boards(indices)
+
+
+@benchmark("urcore.board2Code", ops=N)
+def board2CodeBench():
+    boards = samplePositions(N)
+
+    def run():
+        for b in boards:
+            board2Code(b)
+    return run
+
+
+@benchmark("urcore.code2Board", ops=N)
+def code2BoardBench():
+    codes = [board2Code(b) for b in samplePositions(N)]
+
+    def run():
+        for c in codes:
+            code2Board(c)
+    return run
+
+
+@benchmark("urcore.positionsIterator", ops=9696)
+def positionsIteratorBench():
+    # the (5, 5) block: 9696 positions
+    def run():
+        for _ in positionsIterator(5, 5):
+            pass
+    return run
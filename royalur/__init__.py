@@ -18,20 +18,48 @@
 .. automodule:: royalur.urcore
   :members:
 
+.. automodule:: royalur.bitboard
+  :members:
+
 .. automodule:: royalur.play
   :members:
 
+.. automodule:: royalur.rollouts
+  :members:
+
+.. automodule:: royalur.search
+  :members:
+
 .. automodule:: royalur.humanStrategies
   :members:
 
 .. automodule:: royalur.probsdb
   :members:
 
+.. automodule:: royalur.policy
+  :members:
+
+.. automodule:: royalur.successors
+  :members:
+
+.. automodule:: royalur.solver
+  :members:
+
+.. automodule:: royalur.checkpoint
+  :members:
+
+.. automodule:: royalur.server
+  :members:
+
+.. automodule:: royalur.instrument
+  :members:
+
 """
 from __future__ import absolute_import
 
 from .dice import *
 from .urcore import *
+from .bitboard import *
 from .probsdb import *
 from .play import *
 from .humanStrategies import bestHumanStrategySoFar
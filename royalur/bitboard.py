@@ -0,0 +1,98 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+========================
+Bit-packed ROGOUR boards
+========================
+
+An alternative to the 22 element list board of :py:mod:`royalur.urcore`: the whole board packed
+into one integer (34 bits), which is cheap to copy, hash and compare. Each side's pieces are kept
+as a 14 bit mask *along its own path*, so Green and Red are handled by the very same bit
+operations, and reversing the board is just swapping the two halves.
+
+::
+
+  bits  0-13   Green pieces, path squares abcd12345678yz (same order as board[0:14])
+  bits 14-27   Red pieces, path squares ABCD12345678YZ
+  bits 28-30   Green pieces off
+  bits 31-33   Red pieces off
+
+The shared strip squares 1-8 sit at path positions 4-11 for both sides, so a Green piece landing
+on path position ``t`` (4 <= t <= 11) hits a Red piece exactly when Red's bit ``t`` is set.
+
+Functions mirror their list counterparts (``bitsAllMoves`` is :py:func:`royalur.urcore.allMoves`
+and so on), and return moves in the same order. Move generation and index conversion are in the C
+extension, next to :py:func:`royalur.urcore.board2Index`, and work on the masks directly:
+:py:func:`bitsMoveIndices` gives the indices of all moves without building a single list board. Use
+:py:func:`board2Bits` and :py:func:`bits2Board` to convert (losslessly) between the two forms.
+
+The C functions raise ValueError on an invalid packed board, and the move functions also when the
+game is over.
+"""
+from __future__ import absolute_import
+
+try:
+    import royalur.irogaur as irogaur
+except ImportError:
+    import irogaur
+
+__all__ = [
+    "board2Bits", "bits2Board", "bitsReverse", "bitsAllMoves", "bitsMoveIndices",
+    "bitsHomes", "bitsGameOver", "bitsTypeBearOff", "bits2Index", "index2Bits"
+]
+
+_M14 = (1 << 14) - 1
+_RED_SHIFT = 14
+_GOFF_SHIFT = 28
+_ROFF_SHIFT = 31
+
+_HOMESTRETCH = 3 << 12
+
+_POPC = [bin(_i).count("1") for _i in range(1 << 14)]
+
+board2Bits = irogaur.board2Bits
+bits2Board = irogaur.bits2Board
+bits2Index = irogaur.bits2Index
+index2Bits = irogaur.index2Bits
+bitsAllMoves = irogaur.bitsAllMoves
+bitsMoveIndices = irogaur.bitsMoveIndices
+
+
+def bitsReverse(bb):
+    """ Reverse roles of Red and Green. """
+
+    return (((bb >> _RED_SHIFT) & _M14) | ((bb & _M14) << _RED_SHIFT) |
+            (((bb >> _GOFF_SHIFT) & 7) << _ROFF_SHIFT) | ((bb >> _ROFF_SHIFT) << _GOFF_SHIFT))
+
+
+def bitsHomes(bb):
+    """ Helper returning a (numberOfGreenMenAtHome, numberOfRedMenAtHome) pair. """
+
+    return (7 - ((bb >> _GOFF_SHIFT) & 7) - _POPC[bb & _M14],
+            7 - (bb >> _ROFF_SHIFT) - _POPC[(bb >> _RED_SHIFT) & _M14])
+
+
+def bitsGameOver(bb):
+    """ True if game on ``bb`` is over, False otherwise. """
+
+    return (bb >> _GOFF_SHIFT) & 7 == 7 or bb >> _ROFF_SHIFT == 7
+
+
+def bitsTypeBearOff(bb):
+    """ True if ``bb`` is in *bear-off* mode. (i.e. no more contact possible). """
+
+    return (_POPC[bb & _HOMESTRETCH] + ((bb >> _GOFF_SHIFT) & 7) == 7 or
+            _POPC[(bb >> _RED_SHIFT) & _HOMESTRETCH] + (bb >> _ROFF_SHIFT) == 7)
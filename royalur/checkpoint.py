@@ -0,0 +1,174 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+===========
+Checkpoints
+===========
+
+Progress of a long database build (``scripts/makedb.py``, ``scripts/expectedToEnd.py``): the
+(gOff, rOff) blocks done, the blocks being solved with the number of sweeps done and the last
+maximum error, and the raw values computed so far.
+
+The file is a small header followed by the values exactly as they are in memory, so saving is one
+big write. It is written to a temporary file first and then renamed over the old one, so a crash
+while saving leaves the previous checkpoint intact.
+
+::
+
+  header   magic "URCK", version, byte order (0 little, 1 big), number of blocks done, number of
+           blocks in progress (uint8 each), sweep (uint32), maximum error (float64), payload size
+           (uint64), all little-endian
+  blocks   gOff, rOff (uint8 each) of each block done, then of each block in progress
+  payload  the values
+"""
+from __future__ import absolute_import
+
+import os
+import struct
+import sys
+import time
+
+__all__ = ["Checkpoint", "loadCheckpoint"]
+
+_HEADER = struct.Struct("<4sBBBBIdQ")
+_MAGIC = b"URCK"
+_VERSION = 1
+_BYTEORDER = 0 if sys.byteorder == "little" else 1
+
+# Payload bytes per read
+_CHUNK = 1 << 24
+
+_replace = getattr(os, "replace", os.rename)
+
+
+class Checkpoint(object):
+    """ Progress of a build. ``done`` is the list of blocks solved, ``current`` the blocks being
+    solved, ``sweep`` the number of sweeps done on them and ``maxError`` the maximum error of the
+    last one.
+
+    If ``filename`` is given, :py:meth:`due` returns True once every ``interval`` seconds. Without
+    one nothing is ever saved.
+    """
+
+    def __init__(self, filename=None, interval=600):
+        self.filename = filename
+        self.interval = interval
+        self.done = []
+        self.current = []
+        self.sweep = 0
+        self.maxError = 1.0
+        self.lastSave = time.time()
+
+
+    def start(self, blocks):
+        """ Begin (or continue, when resuming) solving ``blocks``. Return the number of sweeps
+        already done on them. """
+
+        blocks = list(blocks)
+        if blocks != self.current:
+            self.current = blocks
+            self.sweep = 0
+            self.maxError = 1.0
+        return self.sweep
+
+
+    def swept(self, sweep, maxError):
+        """ Record a finished sweep of the current blocks. """
+
+        self.sweep = sweep
+        self.maxError = maxError
+
+
+    def finish(self):
+        """ The current blocks are solved. """
+
+        self.done.extend(self.current)
+        self.current = []
+        self.sweep = 0
+        self.maxError = 1.0
+
+
+    def due(self):
+        """ True if a checkpoint should be saved now. """
+
+        return self.filename is not None and time.time() - self.lastSave >= self.interval
+
+
+    def save(self, payload, filename=None):
+        """ Save the checkpoint, with the bytes of ``payload`` (any buffer), atomically. """
+
+        filename = filename or self.filename
+        data = memoryview(payload).cast("B")
+        blocks = bytearray()
+        for gOff, rOff in self.done + self.current:
+            blocks.extend((gOff, rOff))
+
+        tmp = filename + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, _VERSION, _BYTEORDER, len(self.done), len(self.current),
+                                 self.sweep, self.maxError, len(data)))
+            f.write(blocks)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        _replace(tmp, filename)
+        self.lastSave = time.time()
+
+
+    def remove(self):
+        """ Delete the checkpoint file, if any (the build it was for is done). """
+
+        if self.filename is not None and os.path.exists(self.filename):
+            os.remove(self.filename)
+
+
+def loadCheckpoint(filename, payload, interval=600):
+    """ Read the checkpoint in ``filename``. The values are read into ``payload`` (a writable buffer
+    of the right size), the progress is returned as a :py:class:`Checkpoint` which saves to the
+    same file. """
+
+    with open(filename, "rb") as f:
+        header = f.read(_HEADER.size)
+        if len(header) != _HEADER.size:
+            raise ValueError("{0} is not a checkpoint".format(filename))
+        magic, version, byteorder, nDone, nCurrent, sweep, maxError, size = _HEADER.unpack(header)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError("{0} is not a checkpoint".format(filename))
+        if byteorder != _BYTEORDER:
+            raise ValueError("{0} was saved on a machine with a different byte order"
+                             .format(filename))
+
+        data = memoryview(payload).cast("B")
+        if size != len(data):
+            raise ValueError("{0} holds {1} bytes of values, expected {2}"
+                             .format(filename, size, len(data)))
+
+        blocks = bytearray(f.read(2 * (nDone + nCurrent)))
+        blocks = [(blocks[i], blocks[i + 1]) for i in range(0, len(blocks), 2)]
+
+        pos = 0
+        while pos < size:
+            n = f.readinto(data[pos:pos + _CHUNK])
+            if not n:
+                raise ValueError("{0} is truncated".format(filename))
+            pos += n
+
+    cp = Checkpoint(filename, interval)
+    cp.done = blocks[:nDone]
+    cp.current = blocks[nDone:]
+    cp.sweep = sweep
+    cp.maxError = maxError
+    return cp
@@ -7,7 +7,7 @@
 from __future__ import print_function
 from __future__ import absolute_import
 
-import argparse, sys
+import argparse, sys, os.path
 import curses, random
 
 from royalur import *
@@ -354,7 +354,18 @@ def main():
                       choices=["SimpleSam", "Joe", "Santa", "Expert", "Ishtar"], default = "Santa",
                       help = "SimpleSam (1650), Joe (1730), Santa (1820), Expert (1880), Ishtar (2000)")
 
+  parser.add_argument("--policy", metavar="FILE",
+                      default = os.path.join(royalURdataDir, "policy.bin"),
+                      help = "Policy table Ishtar plays from (see scripts/makepolicy.py). "
+                      "Ishtar uses the database if there is none.")
+
+  parser.add_argument("--profile", help="Print where the time went on exit.",
+                      action = "store_true", default = False)
+
   options = parser.parse_args()
+  if options.profile:
+    from royalur import instrument
+    instrument.profileAtExit(globals())
   try :
     flog = open(options.record, 'a') if options.record else None
   except:
@@ -367,14 +378,16 @@ def main():
     player = getByNicks('safe;homestretch;hit;Extra;Chuck;Frank;bear;Donkey')
   elif options.player == "Santa" :
     player = bestHumanStrategySoFar
+  elif options.player == "Ishtar" and os.path.exists(options.policy):
+    player = getPolicyPlayer(options.policy)
   elif options.player == "Expert" or options.player == "Ishtar":
     print("loading database...,", file=sys.stderr)
-    db = PositionsWinProbs(royalURdataDir + "/db16.bin")
+    db = openDatabase(royalURdataDir + "/db16.bin")
     print("done.", file=sys.stderr)
     if options.player == "Expert" :
       player = lambda m : dbdPlayer(m, db)
     else :
-      player = lambda m : getDBmove(m, db)
+      player = getDBplayer(db)
   else :
     assert False
 
@@ -115,9 +115,15 @@ def main():
 
   parser.add_argument("--database", "-d", metavar="FILE", help="Probabilities database.")
 
+  parser.add_argument("--profile", help="Print where the time went on exit.",
+                      action = "store_true", default = False)
+
   parser.add_argument('match', metavar='FILE', help="Match log file")
 
   options = parser.parse_args()
+  if options.profile:
+    from royalur import instrument
+    instrument.profileAtExit(globals())
   URFileName = options.match
   try :
     urMatchLog = open(URFileName)
@@ -132,9 +138,9 @@ def main():
   if annotate:
     try:
       if options.database:
-        db = PositionsWinProbs(options.database)
+        db = openDatabase(options.database)
       else :
-        db = PositionsWinProbs(royalURdataDir + "/db16.bin")
+        db = openDatabase(royalURdataDir + "/db16.bin")
     except:
       print("Error: no dababase, can't annotate.", file=sys.stderr)
       sys.exit(1)
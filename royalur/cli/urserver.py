@@ -0,0 +1,72 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+=============================
+ROGOUR evaluation HTTP server
+=============================
+
+Serve position evaluations over HTTP (see :py:mod:`royalur.server`).
+"""
+from __future__ import print_function
+from __future__ import absolute_import
+
+import argparse
+import asyncio
+import os.path
+import sys
+
+from royalur import royalURdataDir, openDatabase
+from royalur.server import startServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="""Serve ROGOUR position evaluations over HTTP.""")
+
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on.")
+
+    parser.add_argument("--port", "-p", type=int, default=8080, help="Port to listen on.")
+
+    parser.add_argument("--max-ply", type=int, default=3, help="Deepest n-ply search allowed.")
+
+    parser.add_argument("--database", "-d", metavar="FILE",
+                        default=os.path.join(royalURdataDir, "db16.bin"),
+                        help="Probabilities database (or ROYALUR_SHM, see dbserver.py).")
+
+    parser.add_argument("--profile", action="store_true", help="Print where the time went on exit.")
+
+    options = parser.parse_args()
+    if options.profile:
+        from royalur import instrument
+        instrument.profileAtExit(globals())
+
+    db = openDatabase(options.database)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    server = loop.run_until_complete(startServer(db, options.host, options.port, options.max_ply))
+    print("serving on {0}:{1}".format(options.host, options.port), file=sys.stderr)
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+        loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -13,7 +13,11 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import hashlib
 import random
+import struct
+
+__all__ = ["initialize_rng", "get_pips", "streamSeed", "PipsSource"]
 
 
 def initialize_rng():
@@ -24,3 +28,66 @@ def initialize_rng():
 def get_pips():
     """Roll the dice (equivalent to 4D2-4)"""
     return tuple([random.randint(0, 1) for _ in range(4)])
+
+
+def streamSeed(seed, stream):
+    """Seed of random stream number ``stream`` derived from ``seed``.
+
+    Streams are reproducible, and (being hashes) unrelated to each other for any two stream
+    numbers."""
+    digest = hashlib.sha256("{0}:{1}".format(seed, stream).encode("ascii")).digest()
+    return struct.unpack("<Q", digest[:8])[0]
+
+
+# Pips of a random byte: the number of ones among its 4 low bits, which gives the 1-4-6-4-1
+# distribution of 4D2-4.
+_PIPS_OF_BYTE = bytes(bytearray(bin(i & 0xf).count("1") for i in range(256)))
+
+
+class PipsSource(object):
+    """A fast source of dice rolls (pips, 0 to 4).
+
+    Calling the source returns the next roll. Rolls are generated in blocks of ``blockSize`` from a
+    private ``random.Random``, seeded with ``seed`` (random if None), and handed out from a buffer,
+    so a roll costs little more than indexing.
+    """
+
+    def __init__(self, seed=None, blockSize=4096):
+        self.blockSize = blockSize
+        self.seed(seed)
+
+    def seed(self, seed=None):
+        """Restart the source with ``seed``."""
+        self.rng = random.Random(seed)
+        self.initialSeed = seed if seed is not None else self.rng.getrandbits(64)
+        self.buffer = bytearray()
+        self.pos = 0
+
+    def refill(self):
+        """Generate the next block of rolls."""
+        raw = self.rng.getrandbits(8 * self.blockSize).to_bytes(self.blockSize, "little")
+        self.buffer = bytearray(raw.translate(_PIPS_OF_BYTE))
+        self.pos = 0
+
+    def block(self, n):
+        """Return the next ``n`` rolls (a bytearray), the same as ``n`` calls would."""
+        rolls = bytearray()
+        while len(rolls) < n:
+            if self.pos == len(self.buffer):
+                self.refill()
+            part = self.buffer[self.pos:self.pos + n - len(rolls)]
+            self.pos += len(part)
+            rolls += part
+        return rolls
+
+    def __call__(self):
+        if self.pos == len(self.buffer):
+            self.refill()
+        pips = self.buffer[self.pos]
+        self.pos += 1
+        return pips
+
+    def split(self, stream):
+        """Return an independent source for stream number ``stream``, derived from this source's
+        seed (see :py:func:`streamSeed`)."""
+        return PipsSource(streamSeed(self.initialSeed, stream), self.blockSize)
@@ -388,8 +388,10 @@ class UrCanvas(tk.Frame) :
       self.player = getByNicks('safe;homestretch;hit;Extra;Chuck;Frank;bear;Donkey')
     elif name == "santa" :
       self.player = bestHumanStrategySoFar
+    elif name == "ishtar" and os.path.exists(os.path.join(dataDir, "policy.bin")) :
+      self.player = getPolicyPlayer(os.path.join(dataDir, "policy.bin"))
     elif name == "expert" or name == "ishtar" :
-      db = PositionsWinProbs(os.path.join(dataDir, "/db16.bin"))
+      db = openDatabase(os.path.join(dataDir, "/db16.bin"))
       if name == "expert" :
         self.player = lambda m : dbdPlayer(m, db)
       else :
@@ -458,11 +460,18 @@ def main():
   parser.add_argument("-n", "--name", metavar="STR", default = "Human", help = "Your name.")
 
   parser.add_argument("--data-dir", metavar="STR", dest = "datadir", default = None,
-                      help = "Location of database (db16.bin)")
+                      help = "Location of database (db16.bin), and of the policy table "
+                      "Ishtar plays from if there is one (policy.bin)")
 
   parser.add_argument("--debug", default = None, action="store_true", help = "for developers")
 
+  parser.add_argument("--profile", default = False, action="store_true",
+                      help = "Print where the time went on exit.")
+
   options = parser.parse_args()
+  if options.profile:
+    from royalur import instrument
+    instrument.profileAtExit(globals())
   logging.basicConfig(level=logging.DEBUG if options.debug else logging.ERROR)
   try :
     flog = open(options.record, 'a') if options.record else None
@@ -504,7 +513,8 @@ def main():
   foemenu.add_command(label = "Ishtar (2000)", command = lambda : setPlayer("ishtar", 5) )
   if not os.path.exists(dataDir + "/db16.bin") :
     foemenu.entryconfig("Expert (1880)", state="disabled")
-    foemenu.entryconfig("Ishtar (2000)", state="disabled")
+    if not os.path.exists(os.path.join(dataDir, "policy.bin")) :
+      foemenu.entryconfig("Ishtar (2000)", state="disabled")
 
   menu.add_separator()
   menu.add_separator()
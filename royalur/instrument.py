@@ -0,0 +1,229 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+===============
+Instrumentation
+===============
+
+Counts of calls and time spent in the hot paths: move generation, board/index and board/code
+conversions, database lookups, the human-like strategy filters and the steps of the vectorized
+solver (:py:mod:`royalur.solver`, what ``scripts/makedb.py`` runs by default).
+
+Nothing is instrumented (or even imported) until :py:func:`enable` is called, so there is no cost
+at all otherwise. The hook points are listed explicitly: each is a function, where it is defined (a
+module, or the database class) and the royalur modules which call it through a name of their own
+(after ``from .urcore import allMoves``). :py:func:`enable` puts a timing wrapper in exactly those places, and
+:py:func:`disable` puts the originals back. A script importing the functions by name passes its
+``globals()`` to be covered as well. References kept in any other way (e.g. the filters of players
+made by :py:func:`royalur.humanStrategies.getByNicks` before enabling) are not counted, and
+neither are the calls in worker processes.
+
+Times include the time of instrumented functions called from within (``aget`` includes
+``board2Index`` and ``get``).
+
+::
+
+  instrument.enable()
+  rollout(board, 1000)
+  instrument.report()          # or instrument.snapshot()
+
+The scripts and command line tools take ``--profile``, which prints the report on exit.
+"""
+from __future__ import print_function
+from __future__ import absolute_import
+
+import atexit
+import functools
+import importlib
+import sys
+import time
+
+__all__ = ["enable", "disable", "enabled", "reset", "snapshot", "report", "profileAtExit"]
+
+# Hook points: (name, owner, attribute, call sites). The function is ``owner.attribute``; each call
+# site is a module or (module, name) holding its own reference to it. Modules are named relative to
+# royalur ("." is the package itself), with ":Class" for a class, and only imported by
+# :py:func:`enable`, so that importing this module costs nothing.
+_POINTS = [
+    ("moves.allMoves", ".urcore", "allMoves",
+     (".", ".play", ".policy", ".rollouts", ".search", ".server")),
+    ("moves.allActualMoves", ".urcore", "allActualMoves", (".", ".play")),
+    ("board.reverseBoard", ".urcore", "reverseBoard", (".", ".play", ".rollouts")),
+    ("index.board2Index", ".urcore", "board2Index",
+     (".", ".play", ".policy", ".probsdb", ".search")),
+    ("index.index2Board", ".urcore", "index2Board", (".", ".play", ".probsdb")),
+    ("index.boards2Indices", ".urcore", "boards2Indices", (".", ".play", ".server")),
+    ("index.indices2Boards", ".urcore", "indices2Boards", (".", ".play", ".server")),
+    ("moves.bitsMoveIndices", ".bitboard", "bitsMoveIndices", (".", ".successors")),
+    ("index.index2Bits", ".bitboard", "index2Bits", (".", ".successors")),
+    ("code.board2Code", ".urcore", "board2Code", (".", ".play", ".server")),
+    ("code.code2Board", ".urcore", "code2Board", (".", ".play", ".server")),
+    ("db.get", ".probsdb:PositionsWinProbs", "get", ()),
+    ("db.aget", ".probsdb:PositionsWinProbs", "aget", ()),
+    ("db.take", ".probsdb:PositionsWinProbs", "take", ()),
+    ("db.chunk", ".probsdb:PositionsWinProbs", "chunk", ()),
+    ("solver.blockPairs", ".solver", "_blockPairs", ()),
+    ("solver.receipts", ".solver", "_receipts", ()),
+    ("solver.sweep", ".solver", "_sweep", ()),
+    ("strategy.bestHumanStrategySoFar", ".humanStrategies", "bestHumanStrategySoFar",
+     (".", (".play", "hplay"), (".rollouts", "hplay"))),
+]
+
+# name -> [calls, seconds]
+_counters = {}
+
+# (place, key, original) of every reference replaced while enabled. A place is a module, a class,
+# a namespace dict or the list of strategies.
+_replaced = []
+
+_callback = None
+
+
+def _wrap(name, f):
+    counter = _counters.setdefault(name, [0, 0.0])
+    clock = time.perf_counter
+
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        t = clock()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            dt = clock() - t
+            counter[0] += 1
+            counter[1] += dt
+            if _callback is not None:
+                _callback(name, dt)
+    return wrapper
+
+
+def _get(place, key):
+    return place.get(key) if isinstance(place, dict) else getattr(place, key, None)
+
+
+def _put(place, key, value):
+    if isinstance(place, (dict, list)):
+        place[key] = value
+    else:
+        setattr(place, key, value)
+
+
+def _resolve(name):
+    """ The module or class ``name``, as in :py:data:`_POINTS`. """
+
+    module, _, cls = name.partition(":")
+    obj = importlib.import_module(module, "royalur")
+    return getattr(obj, cls) if cls else obj
+
+
+def _points():
+    """ The hook points, with their owners and call sites resolved, and one point per filter of the
+    human-like strategies. """
+
+    points = []
+    for name, owner, attr, sites in _POINTS:
+        sites = tuple((_resolve(s[0]), s[1]) if isinstance(s, tuple) else _resolve(s)
+                      for s in sites)
+        points.append((name, _resolve(owner), attr, sites))
+    humanStrategies = _resolve(".humanStrategies")
+    return points + [("strategy." + f.__name__, humanStrategies, f.__name__, ())
+                     for f in humanStrategies.strategies]
+
+
+def _places(owner, attr, sites, namespace):
+    """ (place, key) of every reference to ``owner.attr`` to replace. """
+
+    places = [(owner, attr)]
+    for site in sites:
+        places.append(site if isinstance(site, tuple) else (site, attr))
+    if namespace is not None:
+        places.append((namespace, attr))
+    return places
+
+
+def enabled():
+    """ True if the hot paths are instrumented. """
+
+    return bool(_replaced)
+
+
+def enable(callback=None, namespace=None):
+    """ Instrument the hot paths. If given, ``callback(name, seconds)`` is called after every call
+    of an instrumented function (a hook for profilers). The functions are replaced in
+    ``namespace`` (a dict, e.g. the ``globals()`` of a script) too. """
+
+    global _callback
+    _callback = callback
+    if _replaced:
+        return
+    wrappers = {}
+    for name, owner, attr, sites in _points():
+        f = vars(owner)[attr]
+        wrappers[f] = _wrap(name, f)
+        for place, key in _places(owner, attr, sites, namespace):
+            if _get(place, key) is f:
+                _replaced.append((place, key, f))
+                _put(place, key, wrappers[f])
+
+    # the filters are called through the list
+    strategies = _resolve(".humanStrategies").strategies
+    _replaced.append((strategies, slice(None), list(strategies)))
+    strategies[:] = [wrappers[f] for f in strategies]
+
+
+def disable():
+    """ Put the original functions back. The counters are kept. """
+
+    global _callback
+    _callback = None
+    while _replaced:
+        place, key, f = _replaced.pop()
+        _put(place, key, f)
+
+
+def reset():
+    """ Zero all counters. """
+
+    for counter in _counters.values():
+        counter[0] = 0
+        counter[1] = 0.0
+
+
+def snapshot():
+    """ The counters: a dict mapping each name to a dict with the number of ``calls`` and the total
+    ``seconds`` spent in them. Functions never called are left out. """
+
+    return dict((name, {"calls": c[0], "seconds": c[1]}) for name, c in _counters.items() if c[0])
+
+
+def report(file=None):
+    """ Print the counters, most time first, on ``file`` (stderr by default). """
+
+    file = file or sys.stderr
+    counters = sorted(snapshot().items(), key=lambda x: -x[1]["seconds"])
+    print("{0:36} {1:>12} {2:>10} {3:>10}".format("", "calls", "seconds", "us/call"), file=file)
+    for name, c in counters:
+        print("{0:36} {1:12d} {2:10.3f} {3:10.2f}".format(name, c["calls"], c["seconds"],
+                                                          1e6 * c["seconds"] / c["calls"]),
+              file=file)
+
+
+def profileAtExit(namespace=None):
+    """ Instrument the hot paths now (see :py:func:`enable` for ``namespace``), and print the
+    report when the program exits (what ``--profile`` does). """
+
+    enable(namespace=namespace)
+    atexit.register(report)
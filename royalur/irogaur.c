@@ -45,256 +45,976 @@ initm(void)
   }
 }
 
-static int
-sum(int const a[], unsigned int const n)
-{
-  int s = 0;
-  unsigned int k;
-  for(k = 0; k < n; ++ k) {
-    s += a[k];
-  }
-  return s;
-}
-
 static unsigned int
 bitsIndex(int const bits[], int k, unsigned int const N)
 {
   int i = 0, n = N;
   unsigned int j;
   for(j = 0; j < N; ++j) {
-    if( bits[j] ) {
-      i += bmap[n-1][k];
-      k -= 1;
-    }
+    /* branch free: bits are 0/1 */
+    i += bits[j] * bmap[n-1][k];
+    k -= bits[j];
     n -= 1;
   }
   return i;
 }
 
+static const unsigned int GR_OFF = 14;
+static const unsigned int RD_OFF = 21;
+
+/* Block layout of the position index, see urcore.py. Mirrors nPositionsOff, spMap and pSums. */
+
+static unsigned long nOnBoard[8][8];
+static unsigned long nOff[8][8];
+static unsigned long spTable[8][8][8][8];
+static unsigned long psTable[8][8][9];
+
+#define N_BLOCKS 1296
+static unsigned long blockStart[N_BLOCKS + 1];
+static unsigned char blockKey[N_BLOCKS][4];
+static unsigned long totalPositions;
+
+/* The block of the first index of each bucket of 2^BUCKET_BITS indices, where the search for the
+   block of an index starts (there are fewer than 2^28 positions). */
+#define BUCKET_BITS 16
+static unsigned short bucketBlock[1u << (28 - BUCKET_BITS)];
+
 static void
-i2bits(int bits[], unsigned int i, int k, int N)
+initTables(void)
 {
-  int j;
-  unsigned int bnk;
-  for(j = 0; j < N; ++j) {
-    bits[j] = 0;
-  }
-  j = 0;
-  while( N > 0 ) {
-    bnk = bmap[N-1][k];
-    if( i >= bnk ) {
-      bits[j] = 1;
-      i -= bnk;
-      k -= 1;
+  int m, n, m1, i, j, k, l, gOff, rOff, gHome, rHome, b;
+  unsigned long tot, start;
+
+  for(m = 0; m < 8; ++m) {
+    for(n = 0; n < 8; ++n) {
+      tot = 0;
+      for(m1 = 0; m1 <= (m < 6 ? m : 6); ++m1) {
+        tot += (unsigned long)bmap[6][m1] * bmap[8][m - m1] * bmap[14 - (m - m1)][n];
+        psTable[m][n][m1 + 1] = tot;
+      }
+      /* past the end, for indexToBoard */
+      for(m1 = m1 + 1; m1 < 9; ++m1) {
+        psTable[m][n][m1] = (unsigned long)-1;
+      }
+      psTable[m][n][0] = 0;
+      nOnBoard[m][n] = tot;
+    }
+  }
+
+  for(m = 0; m < 8; ++m) {
+    for(n = 0; n < 8; ++n) {
+      tot = 0;
+      for(i = 0; i <= 7 - m; ++i) {
+        for(j = 0; j <= 7 - n; ++j) {
+          tot += nOnBoard[7 - m - i][7 - n - j];
+        }
+      }
+      nOff[m][n] = tot;
+    }
+  }
+
+  b = 0;
+  totalPositions = 0;
+  for(gOff = 0; gOff < 8; ++gOff) {
+    for(rOff = 0; rOff < 8; ++rOff) {
+      for(gHome = 0; gHome < 8 - gOff; ++gHome) {
+        for(rHome = 0; rHome < 8 - rOff; ++rHome) {
+          start = 0;
+          for(i = 0; i < gOff; ++i) {
+            for(j = 0; j < 8; ++j) {
+              start += nOff[i][j];
+            }
+          }
+          for(j = 0; j < rOff; ++j) {
+            start += nOff[gOff][j];
+          }
+          for(k = 0; k < gHome; ++k) {
+            for(l = 0; l < 8 - rOff; ++l) {
+              start += nOnBoard[7 - (k + gOff)][7 - (l + rOff)];
+            }
+          }
+          for(l = 0; l < rHome; ++l) {
+            start += nOnBoard[7 - (gHome + gOff)][7 - (l + rOff)];
+          }
+          spTable[gOff][rOff][gHome][rHome] = start;
+          blockStart[b] = start;
+          blockKey[b][0] = gOff;
+          blockKey[b][1] = rOff;
+          blockKey[b][2] = gHome;
+          blockKey[b][3] = rHome;
+          b += 1;
+        }
+      }
+      totalPositions += nOff[gOff][rOff];
     }
-    N -= 1;
-    j += 1;
+  }
+  assert( b == N_BLOCKS );
+  blockStart[N_BLOCKS] = totalPositions;
+  assert( totalPositions <= (1ul << 28) );
+
+  b = 0;
+  for(start = 0; start < totalPositions; start += 1u << BUCKET_BITS) {
+    while( blockStart[b + 1] <= start ) {
+      b += 1;
+    }
+    bucketBlock[start >> BUCKET_BITS] = b;
   }
 }
 
-static const unsigned int GR_OFF = 14;
-static const unsigned int RD_OFF = 21;
+/* Rank of an N bit mask among all N bit masks with the same number of set bits, as computed by
+   bitsIndex (bit j of the mask is element j of the bits sequence), and the inverse, for N = 0..14.
+   Masks of N bits start at offset 2^N - 1 in the flat tables. */
 
+#define MAX_BITS 14
+#define MASK_OFF(N) ((1u << (N)) - 1)
+static unsigned short maskRank[1 << (MAX_BITS + 1)];
+static unsigned short rankMask[1 << (MAX_BITS + 1)];
+static unsigned int rankMaskStart[MAX_BITS + 1][MAX_BITS + 1];
+static unsigned char popc[1 << MAX_BITS];
 
-static PyObject*
-board2Index(PyObject* module, PyObject* args)
+static void
+initMasks(void)
+{
+  int bits[MAX_BITS];
+  unsigned int N, mask, j, k, r;
+
+  for(mask = 0; mask < (1u << MAX_BITS); ++mask) {
+    popc[mask] = 0;
+    for(j = 0; j < MAX_BITS; ++j) {
+      popc[mask] += (mask >> j) & 1;
+    }
+  }
+
+  for(N = 0; N <= MAX_BITS; ++N) {
+    r = MASK_OFF(N);
+    for(k = 0; k <= N; ++k) {
+      rankMaskStart[N][k] = r;
+      r += bmap[N][k];
+    }
+    for(mask = 0; mask < (1u << N); ++mask) {
+      for(j = 0; j < N; ++j) {
+        bits[j] = (mask >> j) & 1;
+      }
+      k = popc[mask];
+      r = bitsIndex(bits, k, N);
+      maskRank[MASK_OFF(N) + mask] = r;
+      rankMask[rankMaskStart[N][k] + r] = mask;
+    }
+  }
+}
+
+/* Store x at p, as load8 reads it. */
+static inline void
+store8(signed char* p, unsigned long long x)
+{
+  unsigned char* u = (unsigned char*)p;
+  u[0] = x; u[1] = x >> 8; u[2] = x >> 16; u[3] = x >> 24;
+  u[4] = x >> 32; u[5] = x >> 40; u[6] = x >> 48; u[7] = x >> 56;
+}
+
+/* The 8 bytes at p, byte k in bits 8k..8k+7 (compilers make it a single load where they can). */
+static inline unsigned long long
+load8(signed char const* p)
+{
+  unsigned char const* u = (unsigned char const*)p;
+  return (unsigned long long)u[0] | (unsigned long long)u[1] << 8 |
+    (unsigned long long)u[2] << 16 | (unsigned long long)u[3] << 24 |
+    (unsigned long long)u[4] << 32 | (unsigned long long)u[5] << 40 |
+    (unsigned long long)u[6] << 48 | (unsigned long long)u[7] << 56;
+}
+
+#define ONES 0x0101010101010101ull
+#define LOW7 0x7f7f7f7f7f7f7f7full
+
+/* Bit k set iff byte k of x is v (v repeated in every byte). */
+static inline unsigned int
+bytesEqual(unsigned long long x, unsigned long long v)
+{
+  unsigned long long y = x ^ v;
+  /* high bit of each byte set iff the byte of y is zero, with no carries between bytes */
+  y = ~(((y & LOW7) + LOW7) | y | LOW7);
+  return (unsigned int)(((y >> 7) * 0x0102040810204080ull) >> 56);
+}
+
+/* compress4[mask][bits]: the bits of bits (4 of them) where mask is clear, packed in order.
+   expand4[mask][bits] is the inverse, and spread8[bits] has byte k set to bit k of bits. */
+static unsigned char compress4[16][16];
+static unsigned char expand4[16][16];
+static unsigned long long spread8[256];
+
+static void
+initCompress(void)
+{
+  unsigned int mask, bits, j, n, c;
+
+  for(mask = 0; mask < 16; ++mask) {
+    for(bits = 0; bits < 16; ++bits) {
+      c = n = 0;
+      for(j = 0; j < 4; ++j) {
+        if( !((mask >> j) & 1) ) {
+          c |= ((bits >> j) & 1) << n;
+          n += 1;
+        }
+      }
+      compress4[mask][bits] = c;
+      expand4[mask][c] = bits & ~mask;
+    }
+  }
+  for(bits = 0; bits < 256; ++bits) {
+    spread8[bits] = 0;
+    for(j = 0; j < 8; ++j) {
+      spread8[bits] |= (unsigned long long)((bits >> j) & 1) << (8 * j);
+    }
+  }
+}
+
+/* Pieces of a side as a 14 bit mask along its own path: bit k set iff the side has a piece on the
+   k'th square of its path (squares abcd 1-8 yz for Green, ABCD 1-8 YZ for Red). */
+
+/* Index of the position with Green pieces g, Red pieces r (path masks) and gOff/rOff pieces off,
+   or -1 if that is not a valid position. */
+static inline long
+masksToIndex(unsigned int g, unsigned int r, int gOff, int rOff)
+{
+  int gHome, rHome, gMen, rMen;
+  unsigned int m, nb, gSafe, gStrip, rStrip, rBits, i2, i3;
+
+  if( gOff < 0 || gOff > 7 || rOff < 0 || rOff > 7 || (g & r & 0xff0) ) {
+    return -1;
+  }
+
+  gSafe = (g & 0xf) | (g >> 12) << 4;
+  gStrip = (g >> 4) & 0xff;
+  rStrip = (r >> 4) & 0xff;
+
+  /* Red pieces on the squares not taken by Green, in order ABCD 1-8 YZ */
+  nb = 4 - popc[gStrip & 0xf];
+  rBits = compress4[gStrip & 0xf][rStrip & 0xf] | compress4[gStrip >> 4][rStrip >> 4] << nb;
+  nb += 4 - popc[gStrip >> 4];
+  rBits = (r & 0xf) | rBits << 4 | (r >> 12) << (nb + 4);
+  nb += 6;
+
+  m = popc[gSafe];
+  gMen = m + popc[gStrip];
+  rMen = popc[rBits];
+
+  gHome = 7 - (gMen + gOff);
+  rHome = 7 - (rMen + rOff);
+  if( gHome < 0 || rHome < 0 ) {
+    return -1;
+  }
+
+  /* all in 32 bits: there are fewer than 2^32 positions */
+  i2 = (unsigned int)maskRank[MASK_OFF(6) + gSafe] * bmap[8][gMen - m] + maskRank[MASK_OFF(8) + gStrip];
+  i3 = i2 * bmap[nb][rMen] + maskRank[MASK_OFF(nb) + rBits];
+
+  return spTable[gOff][rOff][gHome][rHome] + psTable[gMen][rMen][m] + i3;
+}
+
+/* The path masks of the pieces on board b (internal representation). */
+static inline void
+boardToMasks(signed char const b[22], unsigned int* g, unsigned int* r)
+{
+  unsigned long long x0, x1;
+  unsigned int rPriv;
+
+  /* squares 0-7 and 8-15, then 14-21 for the private squares of Red (the counts of pieces off in
+     14 and 21 are never -1) */
+  x0 = load8(b);
+  x1 = load8(b + 8);
+  *g = (bytesEqual(x0, ONES) | bytesEqual(x1, ONES) << 8) & 0x3fff;
+  rPriv = bytesEqual(load8(b + 14), ~0ull) >> 1;
+  *r = (rPriv & 0xf) | ((bytesEqual(x0, ~0ull) | bytesEqual(x1, ~0ull) << 8) & 0xff0) |
+    (rPriv >> 4) << 12;
+}
+
+/* Index of board b (internal representation), or -1 if b is not a valid board. */
+static long
+boardToIndex(signed char const b[22])
+{
+  unsigned int g, r;
+
+  boardToMasks(b, &g, &r);
+  return masksToIndex(g, r, b[GR_OFF], b[RD_OFF]);
+}
+
+/* Division by a binomial as a multiplication: j / bmap[n][k] is (j * bmapInverse[n][k]) >> 35,
+   with bmapInverse[n][k] = ceil(2^35 / bmap[n][k]). The error is below j / 2^35, so this is exact
+   as long as j / 2^35 < 1 / bmap[n][k]: bmap[n][k] <= 3432 for n <= 14, and j is less than the size
+   of a (gOff, rOff, gHome, rHome, m) sub-block, below 2^23 (checked in initDivide). */
+static unsigned long long bmapInverse[MAX_BITS + 1][MAX_BITS + 1];
+#define DIVIDE(j, n, k) ((unsigned int)(((unsigned long long)(j) * bmapInverse[n][k]) >> 35))
+
+static void
+initDivide(void)
+{
+  int n, k, m;
+
+  for(n = 0; n <= MAX_BITS; ++n) {
+    for(k = 0; k <= n; ++k) {
+      assert( bmap[n][k] < 4096 );
+      bmapInverse[n][k] = ((1ull << 35) + bmap[n][k] - 1) / bmap[n][k];
+    }
+  }
+  for(n = 0; n < 8; ++n) {
+    for(k = 0; k < 8; ++k) {
+      for(m = 0; m <= (n < 6 ? n : 6); ++m) {
+        assert( psTable[n][k][m + 1] - psTable[n][k][m] < (1ul << 23) );
+      }
+    }
+  }
+}
+
+/* The path masks and pieces off of the position of index. Return 0 on success, -1 if the index
+   is out of range. */
+static inline int
+indexToMasks(unsigned long index, unsigned int* g, unsigned int* r, int* gOff, int* rOff)
+{
+  int lo, m;
+  int gMen, rMen;
+  unsigned long const* ps;
+  unsigned int j, u, i2, nb, k, i, gSafe, gStrip, rStrip, rBits;
+
+  if( index >= totalPositions ) {
+    return -1;
+  }
+  lo = bucketBlock[index >> BUCKET_BITS];
+  while( blockStart[lo + 1] <= index ) {
+    lo += 1;
+  }
+  index -= blockStart[lo];
+  *gOff = blockKey[lo][0];
+  *rOff = blockKey[lo][1];
+  gMen = 7 - (*gOff + blockKey[lo][2]);
+  rMen = 7 - (*rOff + blockKey[lo][3]);
+
+  /* branch free: the entries are increasing, and the largest possible past the last one */
+  ps = psTable[gMen][rMen];
+  m = (index >= ps[1]) + (index >= ps[2]) + (index >= ps[3]) + (index >= ps[4]) +
+    (index >= ps[5]) + (index >= ps[6]);
+  j = (unsigned int)(index - ps[m]);
+
+  nb = 14 - (gMen - m);
+  i2 = DIVIDE(j, nb, rMen);
+  rBits = rankMask[rankMaskStart[nb][rMen] + (j - i2 * bmap[nb][rMen])];
+  u = DIVIDE(i2, 8, gMen - m);
+  gSafe = rankMask[rankMaskStart[6][m] + u];
+  gStrip = rankMask[rankMaskStart[8][gMen - m] + (i2 - u * bmap[8][gMen - m])];
+
+  /* Red pieces on the squares not taken by Green, as in masksToIndex */
+  k = 4 - popc[gStrip & 0xf];
+  i = 4 - popc[gStrip >> 4];
+  rStrip = expand4[gStrip & 0xf][(rBits >> 4) & ((1u << k) - 1)] |
+    expand4[gStrip >> 4][(rBits >> (4 + k)) & ((1u << i) - 1)] << 4;
+
+  *g = (gSafe & 0xf) | gStrip << 4 | (gSafe >> 4) << 12;
+  *r = (rBits & 0xf) | rStrip << 4 | ((rBits >> (4 + k + i)) & 3) << 12;
+  return 0;
+}
+
+/* Fill b (internal representation) from path masks and pieces off. */
+static inline void
+masksToBoard(unsigned int g, unsigned int r, int gOff, int rOff, signed char b[22])
+{
+  /* 1 for Green, -1 (all bits set) for Red */
+  store8(b, spread8[g & 0xff] | spread8[r & 0xf0] * 0xff);
+  store8(b + 8, spread8[g >> 8] | spread8[(r >> 8) & 0xf] * 0xff);
+  store8(b + 14, (unsigned long long)gOff | spread8[(r & 0xf) | (r >> 12) << 4] * 0xff << 8);
+  b[21] = rOff;
+}
+
+/* Fill b with the board of index. Return 0 on success, -1 if the index is out of range. */
+static int
+indexToBoard(unsigned long index, signed char b[22])
+{
+  unsigned int g, r;
+  int gOff, rOff;
+
+  if( indexToMasks(index, &g, &r, &gOff, &rOff) < 0 ) {
+    return -1;
+  }
+  masksToBoard(g, r, gOff, rOff, b);
+  return 0;
+}
+
+/* Packed boards (see bitboard.py): Green path mask in bits 0-13, Red in 14-27, Green pieces off in
+   28-30 and Red in 31-33. */
+
+#define BB_RED 14
+#define BB_GOFF 28
+#define BB_ROFF 31
+#define BB_BITS 34
+#define M14 0x3fffu
+
+/* Path squares bestowing an extra roll (d, 4, z), the protected one (4) and the shared strip. */
+#define PATH_EXTRA ((1u << 3) | (1u << 7) | (1u << 13))
+#define PATH_ROSETTE 7
+#define PATH_STRIP 0xff0u
+
+static inline unsigned long long
+bitsReverse(unsigned long long bb)
+{
+  return ((bb >> BB_RED) & M14) | (bb & M14) << BB_RED |
+    ((bb >> BB_GOFF) & 7) << BB_ROFF | (bb >> BB_ROFF) << BB_GOFF;
+}
+
+/* True if bb is a valid packed board. */
+static inline int
+validBits(unsigned long long bb)
+{
+  unsigned int g = bb & M14, r = (bb >> BB_RED) & M14;
+
+  return (bb >> BB_BITS) == 0 && !(g & r & PATH_STRIP) &&
+    popc[g] + ((bb >> BB_GOFF) & 7) <= 7 && popc[r] + (bb >> BB_ROFF) <= 7;
+}
+
+/* All moves by Green on bb (not over) with pips, in the order of allMoves, the board flipped
+   unless extra[k] (an extra turn). Return the number of moves. */
+static int
+bitsMoves(unsigned long long bb, int pips, unsigned long long moves[8], int extra[8])
+{
+  unsigned int g = bb & M14, r = (bb >> BB_RED) & M14, gOff = (bb >> BB_GOFF) & 7;
+  unsigned long long offs = bb & ~(((unsigned long long)M14 << BB_RED) | M14);
+  unsigned int pieces, low, to;
+  int n = 0, k;
+
+  if( pips > 0 ) {
+    to = pips - 1;
+    if( popc[g] + gOff < 7 && !((g >> to) & 1) ) {
+      moves[n] = bb | 1u << to;
+      extra[n] = (PATH_EXTRA >> to) & 1;
+      n += 1;
+    }
+    for(pieces = g; pieces; pieces &= pieces - 1) {
+      low = pieces & -pieces;
+      to = popc[low - 1] + pips;
+      if( to < 14 ) {
+        if( ((g >> to) & 1) || (to == PATH_ROSETTE && ((r >> to) & 1)) ) {
+          continue;
+        }
+        moves[n] = ((g ^ low) | 1u << to) |
+          (unsigned long long)(r & ~((1u << to) & PATH_STRIP)) << BB_RED | offs;
+        extra[n] = (PATH_EXTRA >> to) & 1;
+        n += 1;
+      } else if( to == 14 ) {
+        moves[n] = (bb ^ low) + (1ull << BB_GOFF);
+        extra[n] = 0;
+        n += 1;
+      }
+    }
+  }
+
+  if( n == 0 ) {
+    moves[0] = bitsReverse(bb);
+    extra[0] = 0;
+    return 1;
+  }
+  for(k = 0; k < n; ++k) {
+    if( !extra[k] ) {
+      moves[k] = bitsReverse(moves[k]);
+    }
+  }
+  return n;
+}
+
+static inline long
+bitsToIndex(unsigned long long bb)
+{
+  return masksToIndex(bb & M14, (bb >> BB_RED) & M14, (bb >> BB_GOFF) & 7, bb >> BB_ROFF);
+}
+
+/* Fast calling convention where available: the arguments arrive as a C array, with no tuple. */
+#if PY_VERSION_HEX >= 0x03070000
+#define IR_METH_FAST METH_FASTCALL
+#define IR_ARGS PyObject* const* args, Py_ssize_t nargs
+#define IR_UNPACK_ARGS
+#else
+#define IR_METH_FAST METH_VARARGS
+#define IR_ARGS PyObject* argsTuple
+#define IR_UNPACK_ARGS \
+  PyObject** args = &PyTuple_GET_ITEM(argsTuple, 0); \
+  Py_ssize_t nargs = PyTuple_GET_SIZE(argsTuple);
+#endif
+
+/* Read a board (list or tuple of 22 ints) into b. Return 0 on success, -1 with an exception set. */
+static int
+parseBoard(PyObject* pyBoard, signed char b[22])
 {
-  PyObject* pyBoard;
-  PyObject* spMap;
-  PyObject* pSums;
-  PyObject* pyi0;
   PyObject** s;
-  PyObject* t;
-  PyObject* pyps;
-  long i0, i1, i2, i3;
-  unsigned int m, k, nb;
-  int b[22];
-  int bits[14];
-  int gSafe[6];
-  int gOff, rOff, gHome, rHome, smb, gStrip, partSafeG, gMen, rMen, partR;
-
-  if( !PyArg_ParseTuple(args, "OOO", &pyBoard, &spMap, &pSums) ) {
+  long v;
+  unsigned int k;
+
+  if( PyList_Check(pyBoard) && PyList_GET_SIZE(pyBoard) == 22 ) {
+    s = &PyList_GET_ITEM(pyBoard, 0);
+  } else if( PyTuple_Check(pyBoard) && PyTuple_GET_SIZE(pyBoard) == 22 ) {
+    s = &PyTuple_GET_ITEM(pyBoard, 0);
+  } else {
     PyErr_SetString(PyExc_ValueError, "wrong args.");
+    return -1;
+  }
+
+  for(k = 0; k < 22; ++k) {
+    v = PyInt_AsLong(s[k]);
+    /* out of range is an empty square, or an invalid number of pieces off */
+    b[k] = (v < -1 || v > 7) ? 8 : v;
+  }
+  return PyErr_Occurred() ? -1 : 0;
+}
+
+static PyObject*
+board2Index(PyObject* module, IR_ARGS)
+{
+  IR_UNPACK_ARGS
+  signed char b[22];
+  long index;
+
+  if( nargs != 1 ) {
+    PyErr_SetString(PyExc_TypeError, "board2Index expects a single board.");
+    return 0;
+  }
+  if( parseBoard(args[0], b) < 0 ) {
     return 0;
   }
 
-  if( !(PySequence_Check(pyBoard) && PySequence_Size(pyBoard) == 22) ) {
-    PyErr_SetString(PyExc_ValueError, "wrong args.");
+  index = boardToIndex(b);
+  if( index < 0 ) {
+    PyErr_SetString(PyExc_ValueError, "Invalid board");
     return 0;
   }
+  return PyInt_FromLong(index);
+}
 
-  if( !( PyDict_Check(spMap) && PyDict_Check(pSums) ) ) {
-    PyErr_SetString(PyExc_ValueError, "wrong args.");
+static PyObject*
+index2Board(PyObject* module, IR_ARGS)
+{
+  IR_UNPACK_ARGS
+  PyObject* pyb;
+  PY_LONG_LONG index;
+  signed char b[22];
+  int i;
+
+  if( nargs != 1 ) {
+    PyErr_SetString(PyExc_TypeError, "index2Board expects a single index.");
+    return 0;
+  }
+  index = PyLong_AsLongLong(args[0]);
+  if( index == -1 && PyErr_Occurred() ) {
+    return 0;
+  }
+  if( index < 0 || index >= (PY_LONG_LONG)totalPositions || indexToBoard((unsigned long)index, b) < 0 ) {
+    PyErr_SetString(PyExc_ValueError, "Index invalid");
     return 0;
   }
 
-  s = &PyList_GET_ITEM(pyBoard, 0);
-  for(k = 0; k < 22; ++k) {
-    b[k] = PyInt_AsLong(s[k]);
+  pyb = PyList_New(22);
+  if( ! pyb ) {
+    return 0;
+  }
+  for(i = 0; i < 22; ++i) {
+    PyList_SET_ITEM(pyb, i, PyInt_FromLong(b[i]));
+  }
+  return pyb;
+}
+
+/* Read a packed board. Return 0 on success, -1 with an exception set. */
+static int
+parseBits(PyObject* obj, unsigned long long* bb)
+{
+  *bb = PyLong_AsUnsignedLongLong(obj);
+  if( *bb == (unsigned long long)-1 && PyErr_Occurred() ) {
+    return -1;
   }
+  if( !validBits(*bb) ) {
+    PyErr_SetString(PyExc_ValueError, "Invalid bits");
+    return -1;
+  }
+  return 0;
+}
 
-  gOff = b[GR_OFF];
-  rOff = b[RD_OFF];
+static PyObject*
+board2Bits(PyObject* module, IR_ARGS)
+{
+  IR_UNPACK_ARGS
+  signed char b[22];
+  unsigned int g, r;
+  unsigned long long bb;
 
-  gSafe[0] = b[0];gSafe[1] = b[1];gSafe[2] = b[2];gSafe[3] = b[3];gSafe[4] = b[12];gSafe[5] = b[13];
-  m = sum(gSafe, 6);
-  partSafeG = bitsIndex(gSafe, m, 6);
-  for(k = 4; k < 12; ++k) {
-    bits[k-4] = b[k] == 1;
+  if( nargs != 1 ) {
+    PyErr_SetString(PyExc_TypeError, "board2Bits expects a single board.");
+    return 0;
+  }
+  if( parseBoard(args[0], b) < 0 ) {
+    return 0;
+  }
+  if( b[GR_OFF] < 0 || b[GR_OFF] > 7 || b[RD_OFF] < 0 || b[RD_OFF] > 7 ) {
+    PyErr_SetString(PyExc_ValueError, "Invalid board");
+    return 0;
   }
-  smb = sum(bits, 8);
-  gStrip = bitsIndex(bits, smb, 8);
-  gMen = smb + m;
 
-  for(k = 15; k < 19; ++k) {
-    bits[k-15] = b[k] == -1;
+  boardToMasks(b, &g, &r);
+  bb = g | (unsigned long long)r << BB_RED | (unsigned long long)b[GR_OFF] << BB_GOFF |
+    (unsigned long long)b[RD_OFF] << BB_ROFF;
+  if( !validBits(bb) ) {
+    PyErr_SetString(PyExc_ValueError, "Invalid board");
+    return 0;
   }
+  return PyLong_FromUnsignedLongLong(bb);
+}
 
-  nb = 4;
-  for(k = 4; k < 12; ++k) {
-    if( b[k] == 1 ) {
-      continue;
-    }
-    bits[nb] = b[k] == -1;
-    nb += 1;
+static PyObject*
+bits2Board(PyObject* module, IR_ARGS)
+{
+  IR_UNPACK_ARGS
+  PyObject* pyb;
+  unsigned long long bb;
+  signed char b[22];
+  int i;
+
+  if( nargs != 1 ) {
+    PyErr_SetString(PyExc_TypeError, "bits2Board expects a single packed board.");
+    return 0;
   }
-  for(k = 19; k < 21; ++k, ++nb) {
-    bits[nb] = b[k] == -1;
+  if( parseBits(args[0], &bb) < 0 ) {
+    return 0;
   }
-  rMen = sum(bits, nb);
-  partR = bitsIndex(bits, rMen, nb);
 
-  gHome = 7 - (gMen + gOff);
-  rHome = 7 - (rMen + rOff);
+  masksToBoard(bb & M14, (bb >> BB_RED) & M14, (bb >> BB_GOFF) & 7, bb >> BB_ROFF, b);
+  pyb = PyList_New(22);
+  if( ! pyb ) {
+    return 0;
+  }
+  for(i = 0; i < 22; ++i) {
+    PyList_SET_ITEM(pyb, i, PyInt_FromLong(b[i]));
+  }
+  return pyb;
+}
 
-  t = PyTuple_New(4);
-  PyTuple_SET_ITEM(t, 0, PyLong_FromLong(gOff));
-  PyTuple_SET_ITEM(t, 1, PyLong_FromLong(rOff));
-  PyTuple_SET_ITEM(t, 2, PyLong_FromLong(gHome));
-  PyTuple_SET_ITEM(t, 3, PyLong_FromLong(rHome));
+static PyObject*
+bits2Index(PyObject* module, IR_ARGS)
+{
+  IR_UNPACK_ARGS
+  unsigned long long bb;
+  long index;
 
-  pyi0 = PyDict_GetItem(spMap, t);
-  Py_DECREF(t);
+  if( nargs != 1 ) {
+    PyErr_SetString(PyExc_TypeError, "bits2Index expects a single packed board.");
+    return 0;
+  }
+  if( parseBits(args[0], &bb) < 0 ) {
+    return 0;
+  }
 
-  if( ! pyi0 ) {
-    PyErr_SetString(PyExc_ValueError, "wrong args.");
+  index = bitsToIndex(bb);
+  if( index < 0 ) {
+    PyErr_SetString(PyExc_ValueError, "Invalid board");
     return 0;
   }
+  return PyInt_FromLong(index);
+}
 
-  i0 = PyLong_AsLong(pyi0);
+static PyObject*
+index2Bits(PyObject* module, IR_ARGS)
+{
+  IR_UNPACK_ARGS
+  PY_LONG_LONG index;
+  unsigned int g, r;
+  int gOff, rOff;
 
-  t = PyTuple_New(2);
-  PyTuple_SET_ITEM(t, 0, PyLong_FromLong(gMen));
-  PyTuple_SET_ITEM(t, 1, PyLong_FromLong(rMen));
+  if( nargs != 1 ) {
+    PyErr_SetString(PyExc_TypeError, "index2Bits expects a single index.");
+    return 0;
+  }
+  index = PyLong_AsLongLong(args[0]);
+  if( index == -1 && PyErr_Occurred() ) {
+    return 0;
+  }
+  if( index < 0 || indexToMasks((unsigned long)index, &g, &r, &gOff, &rOff) < 0 ) {
+    PyErr_SetString(PyExc_ValueError, "Index invalid");
+    return 0;
+  }
+  return PyLong_FromUnsignedLongLong(g | (unsigned long long)r << BB_RED |
+                                     (unsigned long long)gOff << BB_GOFF |
+                                     (unsigned long long)rOff << BB_ROFF);
+}
 
-  pyps = PyDict_GetItem(pSums, t);     assert(pyps);
-  Py_DECREF(t);
+/* The moves of the (bb, pips) arguments. Return their number, or -1 with an exception set. */
+static int
+parseMoves(PyObject* const* args, Py_ssize_t nargs, char const* name,
+           unsigned long long moves[8], int extra[8])
+{
+  unsigned long long bb;
+  long pips;
 
-  if( ! PySequence_Check(pyps) ) {
-    Py_INCREF(Py_None);
-    return Py_None;
+  if( nargs != 2 ) {
+    PyErr_Format(PyExc_TypeError, "%s expects a packed board and pips.", name);
+    return -1;
+  }
+  if( parseBits(args[0], &bb) < 0 ) {
+    return -1;
+  }
+  pips = PyInt_AsLong(args[1]);
+  if( pips == -1 && PyErr_Occurred() ) {
+    return -1;
+  }
+  if( pips < 0 || pips > 4 ) {
+    PyErr_SetString(PyExc_ValueError, "pips out of range");
+    return -1;
   }
-  i1 = PyLong_AsLong(PyList_GET_ITEM(pyps, m));
-  i2 = partSafeG * bmap[8][gMen - m] + gStrip;
-  i3 = i2 * bmap[14 - (gMen-m)][rMen] + partR;
+  if( ((bb >> BB_GOFF) & 7) == 7 || (bb >> BB_ROFF) == 7 ) {
+    PyErr_SetString(PyExc_ValueError, "game is over");
+    return -1;
+  }
+  return bitsMoves(bb, (int)pips, moves, extra);
+}
 
-  return PyLong_FromLong(i0 + i1 + i3);
+static PyObject*
+bitsAllMoves(PyObject* module, IR_ARGS)
+{
+  IR_UNPACK_ARGS
+  PyObject* pym;
+  unsigned long long moves[8];
+  int extra[8];
+  int n, k;
+
+  n = parseMoves(args, nargs, "bitsAllMoves", moves, extra);
+  if( n < 0 ) {
+    return 0;
+  }
+  pym = PyList_New(n);
+  if( ! pym ) {
+    return 0;
+  }
+  for(k = 0; k < n; ++k) {
+    PyList_SET_ITEM(pym, k, Py_BuildValue("(KO)", moves[k], extra[k] ? Py_True : Py_False));
+  }
+  return pym;
 }
 
 static PyObject*
-index2Board(PyObject* module, PyObject* args)
+bitsMoveIndices(PyObject* module, IR_ARGS)
 {
-  PyObject *pi, *a0, *a1, *a2, *a3;
-  PyObject *pSums;
-  PyObject* pyb;
-  PyObject* t;
-  PyObject* pyps;
-  PyObject** ps;
-  Py_ssize_t plen;
-  long index, gOff, rOff, gHome, rHome, gMen, rMen;
-  unsigned int u, i2, partR, partSafeG, gStrip;
-  int b[22] = {0};
-  int bOther[14];
-  int m = 0;
-  int i, k;
-
-  if( !PyArg_ParseTuple(args, "OOOOOO", &pi, &a0, &a1, &a2, &a3, &pSums) ) {
-    PyErr_SetString(PyExc_ValueError, "wrong args.");
+  IR_UNPACK_ARGS
+  PyObject* pym;
+  unsigned long long moves[8];
+  int extra[8];
+  int n, k;
+
+  n = parseMoves(args, nargs, "bitsMoveIndices", moves, extra);
+  if( n < 0 ) {
     return 0;
   }
-  index = PyLong_AsLong(pi);
-  gOff = PyLong_AsLong(a0);
-  rOff = PyLong_AsLong(a1);
-  gHome = PyLong_AsLong(a2);
-  rHome = PyLong_AsLong(a3);
+  pym = PyList_New(n);
+  if( ! pym ) {
+    return 0;
+  }
+  for(k = 0; k < n; ++k) {
+    PyList_SET_ITEM(pym, k, Py_BuildValue("(lO)", bitsToIndex(moves[k]),
+                                          extra[k] ? Py_True : Py_False));
+  }
+  return pym;
+}
 
-  gMen = 7 - (gOff + gHome);
-  rMen = 7 - (rOff + rHome);
-  t = PyTuple_New(2);
-  PyTuple_SET_ITEM(t, 0, PyLong_FromLong(gMen));
-  PyTuple_SET_ITEM(t, 1, PyLong_FromLong(rMen));
+/* Get a C-contiguous buffer of items of type 'code' ('b' for boards, 'I' for indices; a signed
+   byte buffer may also be unsigned, 'B'). Anything else is rejected rather than reinterpreted. */
+static int
+getTypedBuffer(PyObject* obj, Py_buffer* view, char code, int writable)
+{
+  char const* f;
+  int flags = PyBUF_FORMAT | PyBUF_C_CONTIGUOUS | (writable ? PyBUF_WRITABLE : 0);
+  size_t size = code == 'I' ? sizeof(unsigned int) : 1;
 
-  pyps = PyDict_GetItem(pSums, t);     assert(pyps && PySequence_Check(pyps));
-  Py_DECREF(t);
+  if( PyObject_GetBuffer(obj, view, flags) < 0 ) {
+    return -1;
+  }
+  f = view->format ? view->format : "B";
+  if( *f == '@' || *f == '=' ) {
+    ++f;
+  }
+  if( !((f[0] == code || (code == 'b' && f[0] == 'B')) && f[1] == 0)
+      || (size_t)view->itemsize != size ) {
+    PyErr_Format(PyExc_TypeError, "expected a buffer of '%c' items, got '%s'", code,
+                 view->format ? view->format : "B");
+    PyBuffer_Release(view);
+    return -1;
+  }
+  return 0;
+}
 
-  plen = PySequence_Length(pyps);
+static PyObject*
+boards2Indices(PyObject* module, PyObject* args)
+{
+  PyObject *src, *dst;
+  Py_buffer vsrc, vdst;
+  Py_ssize_t n, j;
+  signed char const* p;
+  unsigned int* out;
+  int bad = 0;
+  long index;
 
-  ps = &PyList_GET_ITEM(pyps, 0);
-  if( index >= PyLong_AsLong(ps[plen-1]) ) {
-    PyErr_SetString(PyExc_ValueError, "Index invalid");
+  if( !PyArg_ParseTuple(args, "OO", &src, &dst) ) {
+    return 0;
+  }
+  if( getTypedBuffer(src, &vsrc, 'b', 0) < 0 ) {
+    return 0;
+  }
+  if( getTypedBuffer(dst, &vdst, 'I', 1) < 0 ) {
+    PyBuffer_Release(&vsrc);
     return 0;
   }
 
-  while( ! ( PyLong_AsLong(ps[m]) <= index && index < PyLong_AsLong(ps[m+1]) ) ) {
-    m += 1;
+  n = vsrc.len / 22;
+  if( vsrc.len % 22 != 0 || vdst.len < n * (Py_ssize_t)sizeof(unsigned int) ) {
+    PyBuffer_Release(&vsrc);
+    PyBuffer_Release(&vdst);
+    PyErr_SetString(PyExc_ValueError, "wrong args.");
+    return 0;
   }
-  index -= PyLong_AsLong(ps[m]);
 
-  u = bmap[14 - (gMen-m)][rMen];
-  i2 = index / u;
-  partR = index - i2 * u;
-  u = bmap[8][gMen - m];
-  partSafeG = i2 / u;
-  gStrip = i2 - u * partSafeG;
+  p = (signed char const*)vsrc.buf;
+  out = (unsigned int*)vdst.buf;
 
-  b[14] = gOff;
-  b[21] = rOff;
+  Py_BEGIN_ALLOW_THREADS
+  for(j = 0; j < n; ++j, p += 22) {
+    index = boardToIndex(p);
+    if( index < 0 ) {
+      bad = 1;
+      break;
+    }
+    out[j] = (unsigned int)index;
+  }
+  Py_END_ALLOW_THREADS
 
-  i2bits(b, partSafeG, m ,6);
-  b[12] = b[4];
-  b[13] = b[5];
-  b[4] = b[5] = 0;
+  PyBuffer_Release(&vsrc);
+  PyBuffer_Release(&vdst);
+  if( bad ) {
+    PyErr_Format(PyExc_ValueError, "Invalid board at %zd", j);
+    return 0;
+  }
+  return PyLong_FromSsize_t(n);
+}
 
-  i2bits(b + 4, gStrip, gMen - m, 8);
+static PyObject*
+indices2Boards(PyObject* module, PyObject* args)
+{
+  PyObject *src, *dst;
+  Py_buffer vsrc, vdst;
+  Py_ssize_t n, j;
+  unsigned int const* p;
+  signed char* out;
+  int bad = 0;
 
-  i2bits(bOther, partR, rMen, 14 - (gMen-m));
+  if( !PyArg_ParseTuple(args, "OO", &src, &dst) ) {
+    return 0;
+  }
+  if( getTypedBuffer(src, &vsrc, 'I', 0) < 0 ) {
+    return 0;
+  }
+  if( getTypedBuffer(dst, &vdst, 'b', 1) < 0 ) {
+    PyBuffer_Release(&vsrc);
+    return 0;
+  }
 
-  for(i = 0; i < 4; ++i) {
-    b[15+i] = -bOther[i];
+  n = vsrc.len / sizeof(unsigned int);
+  if( vsrc.len % sizeof(unsigned int) != 0 || vdst.len < n * 22 ) {
+    PyBuffer_Release(&vsrc);
+    PyBuffer_Release(&vdst);
+    PyErr_SetString(PyExc_ValueError, "wrong args.");
+    return 0;
   }
-  for(k = 4; k < 12; ++k) {
-    if( b[k] == 0 ) {
-      if( bOther[i] ) {
-	      b[k] = -1;
-      }
-      i += 1;
+
+  p = (unsigned int const*)vsrc.buf;
+  out = (signed char*)vdst.buf;
+
+  Py_BEGIN_ALLOW_THREADS
+  for(j = 0; j < n; ++j, out += 22) {
+    if( indexToBoard(p[j], out) < 0 ) {
+      bad = 1;
+      break;
     }
   }
-  b[19] = -bOther[i];
-  b[20] = -bOther[i+1];
+  Py_END_ALLOW_THREADS
 
-  pyb = PyList_New(22);
-  for(i = 0; i < 22; ++i) {
-    PyList_SET_ITEM(pyb, i, PyLong_FromLong(b[i]));
+  PyBuffer_Release(&vsrc);
+  PyBuffer_Release(&vdst);
+  if( bad ) {
+    PyErr_SetString(PyExc_ValueError, "Index invalid");
+    return 0;
   }
-  return pyb;
+  return PyLong_FromSsize_t(n);
+}
+
+static PyObject*
+rangeBoards(PyObject* module, PyObject* args)
+{
+  PyObject *dst;
+  Py_buffer vdst;
+  Py_ssize_t n, j;
+  unsigned long start;
+  signed char* out;
+
+  if( !PyArg_ParseTuple(args, "kO", &start, &dst) ) {
+    return 0;
+  }
+  if( getTypedBuffer(dst, &vdst, 'b', 1) < 0 ) {
+    return 0;
+  }
+
+  n = vdst.len / 22;
+  if( vdst.len % 22 != 0 || start > totalPositions || n > (Py_ssize_t)(totalPositions - start) ) {
+    PyBuffer_Release(&vdst);
+    PyErr_SetString(PyExc_ValueError, "Index invalid");
+    return 0;
+  }
+
+  out = (signed char*)vdst.buf;
+
+  Py_BEGIN_ALLOW_THREADS
+  for(j = 0; j < n; ++j, out += 22) {
+    indexToBoard(start + j, out);
+  }
+  Py_END_ALLOW_THREADS
+
+  PyBuffer_Release(&vdst);
+  return PyLong_FromSsize_t(n);
 }
 
 static PyMethodDef irMethods[] =
 {
-  {"board2Index", board2Index, METH_VARARGS, ""},
+  {"board2Index", (PyCFunction)(void(*)(void))board2Index, IR_METH_FAST,
+   "board2Index(board): the index of board (internal representation)."},
+
+  {"index2Board", (PyCFunction)(void(*)(void))index2Board, IR_METH_FAST,
+   "index2Board(index): the board (internal representation) of index."},
+
+  {"board2Bits", (PyCFunction)(void(*)(void))board2Bits, IR_METH_FAST,
+   "board2Bits(board): board (internal representation) packed into an integer."},
+
+  {"bits2Board", (PyCFunction)(void(*)(void))bits2Board, IR_METH_FAST,
+   "bits2Board(bb): the board (internal representation) of the packed board bb."},
+
+  {"bits2Index", (PyCFunction)(void(*)(void))bits2Index, IR_METH_FAST,
+   "bits2Index(bb): the index of the packed board bb."},
+
+  {"index2Bits", (PyCFunction)(void(*)(void))index2Bits, IR_METH_FAST,
+   "index2Bits(index): the packed board of index."},
+
+  {"bitsAllMoves", (PyCFunction)(void(*)(void))bitsAllMoves, IR_METH_FAST,
+   "bitsAllMoves(bb, pips): the (packed board, extra turn) moves of allMoves."},
+
+  {"bitsMoveIndices", (PyCFunction)(void(*)(void))bitsMoveIndices, IR_METH_FAST,
+   "bitsMoveIndices(bb, pips): the (index, extra turn) of each move of bitsAllMoves."},
+
+  {"boards2Indices", boards2Indices, METH_VARARGS,
+   "boards2Indices(boards, out): write the indices of the packed int8 boards (22 bytes each) in\n"
+   "boards to the unsigned int buffer out. Return the number of boards."},
+
+  {"indices2Boards", indices2Boards, METH_VARARGS,
+   "indices2Boards(indices, out): write the boards of the unsigned int indices to the int8\n"
+   "buffer out (22 bytes per board). Return the number of boards."},
 
-  {"index2Board", index2Board, METH_VARARGS, ""},
+  {"rangeBoards", rangeBoards, METH_VARARGS,
+   "rangeBoards(start, out): write the boards of indices start, start + 1, ... to the int8 buffer\n"
+   "out (22 bytes per board), as many as fit. Return the number of boards."},
 
   {NULL, NULL, 0, NULL}        /* Sentinel */
 };
@@ -322,6 +1042,10 @@ initirogaur(void)
 {
   PyObject *m = NULL;
   initm();
+  initTables();
+  initMasks();
+  initCompress();
+  initDivide();
 #if PY_MAJOR_VERSION >= 3
   m = PyModule_Create(&moduledef);
 #else
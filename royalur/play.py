@@ -24,7 +24,7 @@ Functions to play ROGOUR games and positions, using different strategies for X a
 from __future__ import print_function
 from __future__ import absolute_import
 
-__all__ = ["rollout", "getDBplayer", "ply1", "prob"]
+__all__ = ["rollout", "getDBplayer", "getPolicyPlayer", "choose", "ply1", "prob"]
 
 import random
 
@@ -32,7 +32,8 @@ from .dice import *
 from .urcore import *
 # A default player when there is nothing else.
 from .humanStrategies import bestHumanStrategySoFar as hplay
-from .probsdb import PositionsWinProbs
+from .probsdb import openDatabase
+from .policy import Policy
 
 
 def showBoard(b):
@@ -41,13 +42,25 @@ def showBoard(b):
     print(boardAsString(b))
 
 
+def choose(player, board, pips, moves):
+    """ The moves ``player`` picks among ``moves``, all the moves of Green at ``board`` with ``pips``.
+
+    A player is a function of the moves, or an object with a ``choose(board, pips, moves)`` method,
+    which gets to see the position as well.
+    """
+
+    pick = getattr(player, "choose", None)
+    return pick(board, pips, moves) if pick else player(moves)
+
+
 def playGame(playerX=lambda x: x, playerO=lambda x: x,
-             startingBoardAndSide=None, record=None):
+             startingBoardAndSide=None, record=None, dice=None):
     """ Play one game from start to finish. Report who won.
 
     Use playerX/playerO to determine X/O moves. Use a random player if unspecified. Start at
     ``startingBoardAndSide`` if given. If ``record`` is not None fill it with a record of the game,
-    each move specified as a triplet (board-code, side-to-play, pips (the dice)).
+    each move specified as a triplet (board-code, side-to-play, pips (the dice)). Roll with ``dice``
+    (e.g. a :py:class:`royalur.dice.PipsSource`) if given, with :py:func:`get_pips` otherwise.
 
     Return last board and the side on move, i.e. the loser.
     """
@@ -58,7 +71,7 @@ def playGame(playerX=lambda x: x, playerO=lambda x: x,
         b, side = startPosition(), 1
 
     while not gameOver(b):
-        pips = sum(get_pips())
+        pips = dice() if dice else sum(get_pips())
 
         if record is not None:
             record.append((board2Code(b), "OX"[side], pips))
@@ -69,7 +82,7 @@ def playGame(playerX=lambda x: x, playerO=lambda x: x,
         if len(am) == 1:
             m, e = am[0]
         else:
-            le = (playerX if side else playerO)(am)
+            le = choose(playerX if side else playerO, b, pips, am)
 
             if len(le) == 1:
                 m, e = le[0]
@@ -98,14 +111,17 @@ def showGame(record):
         print()
 
 
-def pitStrategies(playerX, playerO, N, sEvery=-1):
-    """ Play ``N`` games games between two strategies, report number of wins for X and O. """
+def pitStrategies(playerX, playerO, N, sEvery=-1, dice=None):
+    """ Play ``N`` games games between two strategies, report number of wins for X and O.
+
+    ``dice`` is passed to :py:func:`playGame`.
+    """
     Xs, Ys = 0, 0
     for k in range(N//2):
-        b, t = playGame(playerX, playerO)
+        b, t = playGame(playerX, playerO, dice=dice)
         Xs += t == 'O'
         Ys += t == 'X'
-        b, t = playGame(playerO, playerX)
+        b, t = playGame(playerO, playerX, dice=dice)
         Xs += t == 'X'
         Ys += t == 'O'
         if sEvery > 0 and (k % sEvery == 0):
@@ -136,27 +152,91 @@ def getDBplayer(db):
     """
 
     if isinstance(db, str):
-        db = PositionsWinProbs(db)
+        db = openDatabase(db)
 
     return lambda moves: getDBmove(moves, db)
 
 
-def rolloutPlay(b, side, playerX=hplay, playerO=hplay, evaluator=None):
+def _positionOf(moves):
+    """ The (board, pips) at which ``moves`` (two or more) are all the moves of Green, or None.
+
+    Each candidate undoes the move of one piece of the first move: the square it came from gets the
+    piece back, and the square it went to gets what it has after another move (a hit Red piece, or
+    nothing). Only a candidate with exactly ``moves`` as its moves is the position.
+    """
+
+    boards = [b if e else reverseBoard(b) for b, e in moves]
+    first, other = boards[0], boards[-1]
+    moves = [tuple(m) for m in moves]
+    for pips in range(1, 5):
+        for to in range(15):
+            if (first[to] != 1 if to < 14 else first[14] == 0) or to - pips < -1:
+                continue
+            board = first[:]
+            if to < 14:
+                board[to] = other[to]
+            else:
+                board[14] -= 1
+            frm = to - pips
+            if frm >= 0:
+                if board[frm] != 0:
+                    continue
+                board[frm] = 1
+            if not gameOver(board) and allMoves(board, pips) == moves:
+                return board, pips
+    return None
+
+
+class _PolicyPlayer(object):
+    def __init__(self, policy):
+        self.policy = policy
+
+
+    def choose(self, board, pips, moves):
+        m = self.policy.move(board, pips, moves)
+        return [m] if m is not None else hplay(moves)
+
+
+    def __call__(self, moves):
+        if len(moves) < 2:
+            return moves
+        position = _positionOf(moves)
+        if position is None:
+            return hplay(moves)
+        return self.choose(position[0], position[1], moves)
+
+
+def getPolicyPlayer(policy):
+    """ Return a player making the moves of ``policy``, a :py:class:`royalur.policy.Policy` or the
+    name of its file (which is memory-mapped).
+
+    Fall back to default human player if the policy has no move for the position. Called with the
+    moves alone, the player first works out the position (and roll) they are from; it is faster
+    through :py:func:`choose` (as in :py:func:`playGame`), which gives it the position.
+    """
+
+    if isinstance(policy, str):
+        policy = Policy(policy)
+
+    return _PolicyPlayer(policy)
+
+
+def rolloutPlay(b, side, playerX=hplay, playerO=hplay, evaluator=None, dice=None):
     """ Play ``b`` to completion. Report who won.
 
     Use playerX/playerO to determine X/O moves. If unspecified, use the best human-like player. If
     ``evaluator`` is given, truncate the game at the first position with a valid probability, and
-    return it.
+    return it. ``dice`` is as in :py:func:`playGame`.
     """
 
     while not gameOver(b):
-        pips = sum(get_pips())
+        pips = dice() if dice else sum(get_pips())
         am = allMoves(b, pips)
         assert am
         if len(am) == 1:
             m, e = am[0]
         else:
-            le = (playerX if side else playerO)(am)
+            le = choose(playerX if side else playerO, b, pips, am)
             if len(le) == 1:
                 m, e = le[0]
             else:
@@ -0,0 +1,207 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+============
+Policy table
+============
+
+The best move of every position and roll, precomputed from a probabilities database. Playing
+perfectly is then one table lookup per move, instead of a database probe (and a
+:py:func:`royalur.urcore.board2Index`) per candidate move, and the table is smaller than even the
+16-bit database.
+
+A move is stored as its rank in the list of moves returned by :py:func:`royalur.urcore.allMoves`
+(there are at most 7), in 3 bits; 7 means no move is known (game over, or no database value for
+some candidate). The ranks for pips 1 to 4 make a 12-bit code per position (pips 1 in the low bits),
+and two codes are packed in 3 bytes, the even position in the low 12 bits:
+
+::
+
+  header  magic "URPT", version (uint32), number of positions (uint64), little-endian
+  codes   3 bytes (little-endian) per pair of positions
+
+The table of the full game space is about 200MB. Ties between moves go to the first one. Build it
+with ``scripts/makepolicy.py``.
+"""
+from __future__ import absolute_import
+
+import mmap
+import struct
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .urcore import TOTAL_POSITIONS, allMoves, board2Index
+
+__all__ = ["Policy", "buildPolicy", "moveChanges", "UNKNOWN"]
+
+UNKNOWN = 7
+"""Rank of a (position, pips) pair without a known best move."""
+
+_HEADER = struct.Struct("<4sIQ")
+_MAGIC = b"URPT"
+_VERSION = 1
+
+# Positions handled per round when building (even).
+_CHUNK = 1 << 16
+
+
+def _gather(db, indices):
+    """ Probabilities of ``indices`` from ``db``, in memory or memory-mapped, as float64. """
+
+    return numpy.frombuffer(db.take(indices), dtype=numpy.float64)
+
+
+def _rolls(rows, graph):
+    """ The candidate moves of the positions ``rows``, for pips 1 to 4: iterate over (pips, rows
+    with moves, their number of moves, position of their first move, rank of each move, index of
+    the position after each move, whether each move gets an extra turn). """
+
+    from .solver import _INDEX_MASK, _rowEdges
+    from .successors import EXTRA_TURN
+
+    counts, first, edges = _rowEdges(rows, graph)
+    first = first + counts[:, 0]
+    for pips in range(1, 5):
+        c = counts[:, pips]
+        live = numpy.flatnonzero(c)
+        cl = c[live]
+        starts = numpy.cumsum(cl) - cl
+        if cl.sum():
+            rank = numpy.arange(int(cl.sum())) - numpy.repeat(starts, cl)
+            e = edges[numpy.repeat(first[live], cl) + rank]
+            yield (pips, live, cl, starts, rank, (e & _INDEX_MASK).astype(numpy.int64),
+                   (e & EXTRA_TURN) != 0)
+        first = first + c
+
+
+def _values(db, indices, extra):
+    """ Values of moves for the player making them. """
+
+    v = _gather(db, indices)
+    return numpy.where(extra, v, 1 - v)
+
+
+def _ranks(db, rows, graph):
+    """ Best move ranks (rows x 4, pips 1 to 4) of the positions ``rows``. """
+
+    ranks = numpy.full((len(rows), 4), UNKNOWN, dtype=numpy.uint32)
+    for pips, live, cl, starts, rank, indices, extra in _rolls(rows, graph):
+        v = _values(db, indices, extra)
+        best = numpy.maximum.reduceat(v, starts)
+        first_best = numpy.where(v == numpy.repeat(best, cl), rank, UNKNOWN)
+        r = numpy.minimum.reduceat(first_best, starts)
+        ranks[live, pips - 1] = numpy.where(numpy.isnan(best), UNKNOWN, r)
+    return ranks
+
+
+def moveChanges(db, ref, rows, graph=None):
+    """ Positions among ``rows`` (a numpy array of indices) where playing by ``db`` makes a worse
+    move than playing by ``ref`` for some roll: the first best move according to ``db`` is not a
+    best move according to ``ref``. Return a boolean numpy array. Requires numpy. """
+
+    changed = numpy.zeros(len(rows), dtype=bool)
+    for pips, live, cl, starts, rank, indices, extra in _rolls(rows, graph):
+        v = _values(db, indices, extra)
+        vRef = _values(ref, indices, extra)
+        best = numpy.maximum.reduceat(v, starts)
+        bestRef = numpy.maximum.reduceat(vRef, starts)
+        first_best = numpy.where(v == numpy.repeat(best, cl), rank, UNKNOWN)
+        r = numpy.minimum.reduceat(first_best, starts)
+        chosen = r < UNKNOWN
+        # value (by ref) of the move chosen by db
+        vChosen = vRef[starts[chosen] + r[chosen]]
+        changed[live[chosen]] |= vChosen < bestRef[chosen]
+    return changed
+
+
+def _pack(ranks):
+    """ 3 bytes per pair of positions, from the ranks (an even number of rows x 4). """
+
+    codes = ranks[:, 0] | (ranks[:, 1] << 3) | (ranks[:, 2] << 6) | (ranks[:, 3] << 9)
+    words = codes[0::2] | (codes[1::2] << 12)
+    packed = numpy.empty((len(words), 3), dtype=numpy.uint8)
+    for k in range(3):
+        packed[:, k] = (words >> (8 * k)) & 0xff
+    return packed.tobytes()
+
+
+def buildPolicy(db, filename, graph=None, start=0, stop=TOTAL_POSITIONS, report=None):
+    """ Write the policy table of ``db`` (a :py:class:`royalur.probsdb.PositionsWinProbs`, in memory
+    or memory-mapped) to ``filename``. Requires numpy.
+
+    Only positions [start, stop) are computed, the others are left as unknown. With a successor
+    ``graph`` (:py:class:`royalur.successors.SuccessorGraph`) covering them, no moves are generated.
+    If given, ``report`` is called with the number of positions done after every chunk.
+    """
+
+    if numpy is None:
+        raise RuntimeError("building a policy table requires numpy")
+
+    start &= ~1
+    stop = min(stop + (stop & 1), TOTAL_POSITIONS)
+    size = 3 * (TOTAL_POSITIONS // 2)
+
+    with open(filename, "w+b") as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, TOTAL_POSITIONS))
+        unknown = b"\xff" * (3 * (_CHUNK // 2))
+        for pos in range(0, size, len(unknown)):
+            f.write(unknown[:size - pos])
+
+        for first in range(start, stop, _CHUNK):
+            last = min(first + _CHUNK, stop)
+            rows = numpy.arange(first, last, dtype=numpy.uint32)
+            f.seek(_HEADER.size + 3 * (first // 2))
+            f.write(_pack(_ranks(db, rows, graph)))
+            if report:
+                report(last - start)
+
+
+class Policy(object):
+    """ A policy table file, memory-mapped (read-only). """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, "rb") as f:
+            self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = _HEADER.unpack_from(self.buf, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError("{0} is not a policy table".format(filename))
+        if count != TOTAL_POSITIONS or len(self.buf) != _HEADER.size + 3 * (count // 2):
+            raise ValueError("corrupt {0}".format(filename))
+
+
+    def rank(self, index, pips):
+        """ Rank of the best move of position ``index`` with ``pips`` (1 to 4), or
+        :py:data:`UNKNOWN`. """
+
+        at = _HEADER.size + 3 * (index >> 1)
+        word = int.from_bytes(self.buf[at:at + 3], "little")
+        return (word >> (12 * (index & 1) + 3 * (pips - 1))) & 7
+
+
+    def move(self, board, pips, moves=None):
+        """ Best move, a (board, extraTurn) pair, of Green at ``board`` with ``pips``, or None if
+        unknown. ``moves``, if given, must be ``allMoves(board, pips)``. """
+
+        if moves is None:
+            moves = allMoves(board, pips)
+        if len(moves) == 1:
+            return moves[0]
+        r = self.rank(board2Index(board), pips)
+        return moves[r] if r < len(moves) else None
@@ -20,63 +20,916 @@ Probabilities Database
 ======================
 
 Per-Position win probabilities for the full game space.
+
+Probabilities are stored as float64, float32, or quantized to 16, 12 or 8 bits (the 8-bit codes
+are logit-spaced, so probabilities close to 0 or 1 keep more precision). ``scripts/convertdb.py``
+converts between formats, and reports the quantization error and how many positions are played
+differently.
+
+A database file can be served from shared memory (``scripts/dbserver.py``): the file is loaded once
+into a named segment, and every process on the host attaches to it by name and reads from it in
+place, without loading or copying anything.
+
+A database file can also be saved *compressed* (set ``compression`` to "zlib" or "lzma"), in blocks of
+8K entries found through an offsets index. Neighbouring 16-bit entries are delta coded, and the
+bytes of the entries are split into planes, before compression (about 15% smaller with zlib, 20%
+with lzma). Memory-mapped, a compressed file is decoded a block at a time, keeping the most
+recently used blocks.
+
+A *compact* database (set ``compact``) leaves out the positions where the game is over, whose values
+are known: 1 where Green has won, 0 where Red has, and no value for the one position where both
+have. The other positions are stored in index order, plain or compressed, and reads of any index
+are transparent. There are only 43,839 such positions (the blocks with 7 pieces off on either
+side), so the file is smaller by 0.03%, and these values can no longer be damaged by a bad solve.
 """
 from __future__ import absolute_import
 
 import os
+import sys
+import mmap
+import multiprocessing.sharedctypes
 import struct
 import array
+import bisect
+import itertools
+import math
+import zlib
+from collections import OrderedDict
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+try:
+    from multiprocessing import shared_memory, resource_tracker
+except ImportError:
+    shared_memory = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .urcore import TOTAL_POSITIONS, blockRanges, board2Index, index2Board
+
+__all__ = ["PositionsWinProbs", "shareDatabase", "openDatabase", "compareValues", "SHARED_NAME",
+           "COMPACT_POSITIONS"]
+
+SHARED_NAME = "royalur-db"
+"""Default name of the shared memory segment of a served database."""
+
+
+# Entry formats, by format character, and their sizes in bytes:
+#   d  float64
+#   f  float32
+#   H  16-bit, p * 65535
+#   T  12-bit, round(p * 4094), two entries packed in 3 bytes (little-endian), the even entry in
+#      the low 12 bits
+#   B  8-bit, logit-spaced (see _b2d)
+# The largest code of the integer formats marks "no value".
+_itemSizes = {"d": 8, "f": 4, "H": 2, "T": 1.5, "B": 1}
+
+# 8-bit codes 1 to 253 are evenly spaced in logit space over [-_LOGIT_RANGE, _LOGIT_RANGE]
+_LOGIT_RANGE = 5.0
+
+# Number of entries moved per read/write when loading and saving.
+_CHUNK = 1 << 20
+
+# Header of a database in shared memory: magic, format character, size of the data in bytes.
+_SHARED_HEADER = struct.Struct("<4sc3xQ")
+_SHARED_MAGIC = b"URDB"
+
+# Compressed database file: header, offsets of the blocks (number of blocks + 1, little-endian,
+# from the start of the file), blocks.
+#   magic, version, format character, codec, block size (entries), entries
+_Z_HEADER = struct.Struct("<4sBcBxIQ")
+_Z_MAGIC = b"URDZ"
+_Z_VERSION = 1
+_CODECS = ("zlib", "lzma")
+_Z_BLOCK = 1 << 13
+
+# Decoded blocks kept by a memory-mapped compressed database (8 bytes per entry, so 32MB).
+_CACHE_BLOCKS = 512
+
+# Decoding table for the 16-bit quantization, 65535 marking "no value".
+_H2D = None
+
+
+def _h2d():
+    global _H2D
+    if _H2D is None:
+        _H2D = array.array("d", [x/(-1 + 2.0**16) for x in range(65535)] + [float("NaN")])
+    return _H2D
+
+
+_T2D = None
+_B2D = None
+
+
+def _t2d():
+    global _T2D
+    if _T2D is None:
+        _T2D = array.array("d", [x/4094. for x in range(4095)] + [float("NaN")])
+    return _T2D
+
+
+def _b2d():
+    """ Decoding table of the 8-bit format: 0 and 1 exactly for codes 0 and 254, logit-spaced
+    values in between, and 255 for "no value". """
+
+    global _B2D
+    if _B2D is None:
+        logits = [_LOGIT_RANGE * (c - 127) / 126. for c in range(1, 254)]
+        _B2D = array.array("d", [0.0] + [1 / (1 + math.exp(-x)) for x in logits] +
+                           [1.0, float("NaN")])
+    return _B2D
+
+
+def _nbytes(formatchar, entries):
+    """ Size in bytes of ``entries`` entries of format ``formatchar``. """
+
+    if formatchar == "T":
+        return 3 * ((entries + 1) // 2)
+    return _itemSizes[formatchar] * entries
+
+
+def _terminalRanges():
+    """ The positions where the game is over, as merged ``(start, stop, value)`` index ranges in
+    index order. """
+
+    ranges = []
+    for gOff, rOff, _, _, start, stop in blockRanges():
+        if gOff == 7 or rOff == 7:
+            won = (gOff == 7, rOff == 7)
+            if ranges and ranges[-1][1] == start and ranges[-1][2] == won:
+                ranges[-1][1] = stop
+            else:
+                ranges.append([start, stop, won])
+    values = {(True, False): 1.0, (False, True): 0.0, (True, True): float("NaN")}
+    return [(start, stop, values[won]) for start, stop, won in ranges]
+
+
+# Positions left out of a compact database, and how many of them come before each range.
+_TERMINAL = _terminalRanges()
+_terminalStarts = [start for start, _, _ in _TERMINAL]
+_droppedBefore = [0]
+for _start, _stop, _ in _TERMINAL:
+    _droppedBefore.append(_droppedBefore[-1] + _stop - _start)
+
+COMPACT_POSITIONS = TOTAL_POSITIONS - _droppedBefore[-1]
+"""Number of entries of a compact database."""
+
+
+def _keptRanges():
+    """ The index ranges [start, stop) stored in a compact database, in index order. """
+
+    at = 0
+    for start, stop, _ in _TERMINAL:
+        if at < start:
+            yield at, start
+        at = stop
+    if at < TOTAL_POSITIONS:
+        yield at, TOTAL_POSITIONS
+
+
+# (format, compact) of each plain file size. Formats and layouts are told apart by file size alone,
+# so the sizes must all differ.
+_plainSizes = dict((_nbytes(formatchar, entries), (formatchar, entries == COMPACT_POSITIONS))
+                   for formatchar in _itemSizes for entries in (TOTAL_POSITIONS, COMPACT_POSITIONS))
+assert len(_plainSizes) == 2 * len(_itemSizes), "two database formats have the same file size"
+
+
+def _unpackT(raw):
+    """ The 12-bit codes in the packed bytes ``raw``, as a numpy array. """
+
+    b = numpy.frombuffer(raw, dtype=numpy.uint8).reshape(-1, 3).astype(numpy.uint16)
+    codes = numpy.empty(2 * len(b), dtype=numpy.uint16)
+    codes[0::2] = b[:, 0] | ((b[:, 1] & 0xf) << 8)
+    codes[1::2] = (b[:, 1] >> 4) | (b[:, 2] << 4)
+    return codes
+
+
+def _decode(raw, formatchar):
+    """ Decode the big-endian bytes ``raw`` of a ``formatchar`` database into an ``array('d')``. """
+
+    if numpy is not None:
+        if formatchar == "T":
+            d = numpy.frombuffer(_t2d(), dtype=numpy.float64)[_unpackT(raw)]
+        elif formatchar == "B":
+            d = numpy.frombuffer(_b2d(), dtype=numpy.float64)[numpy.frombuffer(raw, numpy.uint8)]
+        else:
+            a = numpy.frombuffer(raw, dtype=">" + formatchar)
+            if formatchar == "H":
+                d = a.astype(numpy.float64) / (-1 + 2.0**16)
+                d[a == 65535] = float("NaN")
+            else:
+                d = a.astype(numpy.float64)
+        return array.array("d", d.tobytes())
+
+    if formatchar == "T":
+        codes = []
+        for k in range(0, len(raw), 3):
+            word = int.from_bytes(raw[k:k + 3], "little")
+            codes += (word & 0xfff, word >> 12)
+        return array.array("d", map(_t2d().__getitem__, codes))
+    if formatchar == "B":
+        return array.array("d", map(_b2d().__getitem__, bytearray(raw)))
+
+    a = array.array(formatchar)
+    a.frombytes(raw)
+    if sys.byteorder == "little":
+        a.byteswap()
+    if formatchar == "d":
+        return a
+    if formatchar == "H":
+        return array.array("d", map(_h2d().__getitem__, a))
+    return array.array("d", a)
+
+
+def _encode(values, formatchar):
+    """ Encode the floats in ``values`` (an ``array('d')`` or a slice of one) as big-endian
+    ``formatchar`` bytes. """
+
+    if formatchar in "TB":
+        codes = _quantize(values, formatchar)
+        if formatchar == "B":
+            return array.array("B", codes).tobytes()
+        if len(codes) % 2:
+            codes.append(0)
+        if numpy is not None:
+            c = numpy.frombuffer(codes, dtype=numpy.uint16)
+            b = numpy.empty((len(c) // 2, 3), dtype=numpy.uint8)
+            b[:, 0] = c[0::2] & 0xff
+            b[:, 1] = (c[0::2] >> 8) | ((c[1::2] & 0xf) << 4)
+            b[:, 2] = c[1::2] >> 4
+            return b.tobytes()
+        return b"".join((codes[k] | codes[k + 1] << 12).to_bytes(3, "little")
+                        for k in range(0, len(codes), 2))
+
+    if numpy is not None:
+        d = numpy.frombuffer(values, dtype=numpy.float64)
+        if formatchar == "H":
+            nan = numpy.isnan(d)
+            a = (numpy.where(nan, 0, d) * (-1 + 2.0**16)).astype(">H")
+            a[nan] = 65535
+        else:
+            a = d.astype(">" + formatchar)
+        return a.tobytes()
+
+    if formatchar == "H":
+        a = array.array("H", [int(x*(-1 + 2.0**16)) if x == x else 65535 for x in values])
+    elif formatchar == "f":
+        a = array.array("f", values)
+    else:
+        a = array.array("d", values)
+    if sys.byteorder == "little":
+        a.byteswap()
+    return a.tobytes()
+
+
+_MIDPOINTS = {}
+
+
+def _quantize(values, formatchar):
+    """ The nearest 12-bit ("T") or 8-bit ("B") codes of the floats in ``values``, as an
+    ``array('H')``. """
+
+    table = _t2d() if formatchar == "T" else _b2d()
+    nan = len(table) - 1
+    mid = _MIDPOINTS.get(formatchar)
+    if mid is None:
+        # a value is closer to a code than to the next one below their midpoint
+        mid = _MIDPOINTS[formatchar] = [(table[k] + table[k + 1]) / 2 for k in range(nan - 1)]
+    if numpy is not None:
+        d = numpy.frombuffer(values, dtype=numpy.float64)
+        codes = numpy.searchsorted(mid, numpy.where(numpy.isnan(d), 0, d)).astype(numpy.uint16)
+        codes[numpy.isnan(d)] = nan
+        return array.array("H", codes.tobytes())
+    return array.array("H", [bisect.bisect_left(mid, x) if x == x else nan for x in values])
+
+
+def _compress(raw, formatchar, codec):
+    """ Compress the big-endian bytes ``raw`` of a block. """
+
+    # a pair of 12-bit entries is 3 bytes
+    size = 3 if formatchar == "T" else _itemSizes[formatchar]
+    if formatchar == "H":
+        raw = _delta(raw)
+    # byte planes: the high bytes of all entries, then the next ...
+    raw = b"".join(raw[k::size] for k in range(size))
+    if codec == "lzma":
+        return lzma.compress(raw, format=lzma.FORMAT_ALONE)
+    return zlib.compress(raw, 6)
+
+
+def _decompress(data, formatchar, codec):
+    """ The big-endian bytes of a block compressed by :py:func:`_compress`. """
+
+    planes = lzma.decompress(data) if codec == "lzma" else zlib.decompress(data)
+    size = 3 if formatchar == "T" else _itemSizes[formatchar]
+    n = len(planes) // size
+    raw = bytearray(len(planes))
+    for k in range(size):
+        raw[k::size] = planes[k*n:(k+1)*n]
+    if formatchar == "H":
+        raw = _delta(raw, undo=True)
+    return bytes(raw)
+
+
+def _delta(raw, undo=False):
+    """ Delta code (or decode, with ``undo``) the big-endian 16-bit entries in ``raw``, modulo
+    2**16. """
+
+    if numpy is not None:
+        a = numpy.frombuffer(raw, dtype=">u2").astype(numpy.uint16)
+        if undo:
+            d = numpy.cumsum(a, dtype=numpy.uint16)
+        else:
+            d = a.copy()
+            d[1:] -= a[:-1]
+        return d.astype(">u2").tobytes()
+
+    a = array.array("H")
+    a.frombytes(raw)
+    if sys.byteorder == "little":
+        a.byteswap()
+    if undo:
+        d = array.array("H", itertools.accumulate(a, lambda s, x: (s + x) & 0xffff))
+    else:
+        d = array.array("H", [(x - y) & 0xffff for x, y in zip(a, [0] + a[:-1].tolist())])
+    if sys.byteorder == "little":
+        d.byteswap()
+    return d.tobytes()
+
+
+def _compressedSize(f):
+    """ The size of the compressed database at the start of ``f`` (an open file or a mmap), as
+    given by its header and offsets index, or None if it does not start like one. """
+
+    f.seek(0)
+    header = f.read(_Z_HEADER.size)
+    if len(header) != _Z_HEADER.size:
+        return None
+    magic, version, _, _, blockSize, entries = _Z_HEADER.unpack(header)
+    if magic != _Z_MAGIC or version != _Z_VERSION or blockSize == 0:
+        return None
+    f.seek(_Z_HEADER.size + 8 * ((entries + blockSize - 1) // blockSize))
+    end = f.read(8)
+    return struct.unpack("<Q", end)[0] if len(end) == 8 else None
+
+
+def _isCompressed(filename):
+    """ True if ``filename`` is a compressed database: the magic alone could be the first values of
+    a plain one, so the offsets index must end exactly at the end of the file too. """
+
+    with open(filename, "rb") as f:
+        return _compressedSize(f) == os.fstat(f.fileno()).st_size
+
+
+def _reblock(pieces, size):
+    """ The values in ``pieces`` (an iterator of ``array('d')``), in pieces of ``size`` (the last
+    one possibly shorter). """
+
+    pending = array.array("d")
+    for values in pieces:
+        pending.extend(values)
+        if len(pending) >= size:
+            n = len(pending) - len(pending) % size
+            for k in range(0, n, size):
+                yield pending[k:k + size]
+            pending = pending[n:]
+    if pending:
+        yield pending
+
+
+def _saveCompressed(f, pieces, entries, formatchar, codec):
+    """ Write the ``entries`` values in ``pieces`` (an iterator of ``array('d')``) to the open file
+    ``f``, compressed. """
+
+    if codec not in _CODECS or (codec == "lzma" and lzma is None):
+        raise ValueError("unknown compression {0!r}".format(codec))
+    nBlocks = (entries + _Z_BLOCK - 1) // _Z_BLOCK
+    offsets = array.array("Q", [0]) * (nBlocks + 1)
+    f.write(_Z_HEADER.pack(_Z_MAGIC, _Z_VERSION, formatchar.encode(), _CODECS.index(codec),
+                           _Z_BLOCK, entries))
+    f.write(bytes(8 * len(offsets)))
+    pos = _Z_HEADER.size + 8 * len(offsets)
+
+    k = 0
+    for values in _reblock(pieces, _Z_BLOCK):
+        offsets[k] = pos
+        pos += f.write(_compress(_encode(values, formatchar), formatchar, codec))
+        k += 1
+    if k != nBlocks:
+        raise ValueError("expected {0} entries".format(entries))
+    offsets[k] = pos
+
+    if sys.byteorder == "big":
+        offsets.byteswap()
+    f.seek(_Z_HEADER.size)
+    f.write(offsets.tobytes())
+
+
+def _formatOf(filename):
+    """ Return the format character of the plain database in ``filename`` and whether it is compact,
+    deduced from its size. """
+
+    size = os.path.getsize(filename)
+    layout = _plainSizes.get(size)
+    if layout is None:
+        raise ValueError("corrupt {0}, size is {1}".format(filename, size))
+    return layout
+
+
+def _formatOfSize(size):
+    layout = _plainSizes.get(size)
+    return layout and layout[0]
+
+
+class _MappedProbs(object):
+    """ Read-only sequence view of a big-endian database buffer, decoded on access.
+
+    Indexing returns a float, with NaN marking positions without a value, exactly like the in-memory
+    ``array('d')``.
+    """
 
-from .urcore import TOTAL_POSITIONS, board2Index, index2Board
+    readonly = True
 
-__all__ = ["PositionsWinProbs"]
+    def __init__(self, buf, formatchar):
+        self.buf = buf
+        self.formatchar = formatchar
+        self.itemsize = _itemSizes[formatchar]
+        if formatchar not in "TB":
+            self._unpack = struct.Struct(">{0}".format(formatchar)).unpack_from
+
+
+    def __len__(self):
+        return int(len(self.buf) // self.itemsize)
+
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if self.formatchar == "T":
+            at = 3 * (i >> 1)
+            word = int.from_bytes(self.buf[at:at + 3], "little")
+            return _t2d()[(word >> (12 * (i & 1))) & 0xfff]
+        if self.formatchar == "B":
+            return _b2d()[self.buf[i]]
+        v = self._unpack(self.buf, i * self.itemsize)[0]
+        if self.formatchar == "H":
+            return v/(-1 + 2.0**16) if v != 65535 else float("NaN")
+        return v
+
+
+    def chunk(self, start, stop):
+        """ The values of [start, stop), as an ``array('d')``. """
+
+        if self.formatchar == "T":
+            # whole pairs
+            first = start & ~1
+            values = _decode(self.buf[3 * (first // 2):3 * ((stop + 1) // 2)], "T")
+            return values[start - first:stop - first]
+        size = self.itemsize
+        return _decode(self.buf[start*size:stop*size], self.formatchar)
+
+
+    def take(self, indices):
+        """ The values of ``indices``, as an ``array('d')``. """
+
+        if numpy is None:
+            return array.array("d", map(self.__getitem__, indices))
+        indices = numpy.asarray(indices)
+        if self.formatchar == "T":
+            b = numpy.frombuffer(self.buf, dtype=numpy.uint8)
+            at = 3 * (indices.astype(numpy.int64) >> 1)
+            words = b[at].astype(numpy.uint32) | (b[at + 1].astype(numpy.uint32) << 8) | \
+                (b[at + 2].astype(numpy.uint32) << 16)
+            codes = (words >> (12 * (indices & 1)).astype(numpy.uint32)) & 0xfff
+            return array.array("d", numpy.frombuffer(_t2d(), dtype=numpy.float64)[codes].tobytes())
+        raw = numpy.frombuffer(self.buf, dtype=">" + self.formatchar)[indices]
+        return _decode(raw.tobytes(), self.formatchar)
+
+
+class _CompressedProbs(object):
+    """ Read-only sequence view of a compressed database (the memory-mapped file ``buf``). Blocks
+    are decoded when first needed, and the last ``cacheBlocks`` used are kept. """
+
+    readonly = True
+
+    def __init__(self, buf, cacheBlocks=_CACHE_BLOCKS):
+        magic, version, formatchar, codec, self.blockSize, self.entries = \
+            _Z_HEADER.unpack_from(buf, 0)
+        if magic != _Z_MAGIC or version != _Z_VERSION or codec >= len(_CODECS):
+            raise ValueError("not a compressed database")
+        self.buf = buf
+        self.formatchar = formatchar.decode()
+        self.codec = _CODECS[codec]
+        nBlocks = (self.entries + self.blockSize - 1) // self.blockSize
+        self.offsets = array.array("Q")
+        self.offsets.frombytes(buf[_Z_HEADER.size:_Z_HEADER.size + 8 * (nBlocks + 1)])
+        if sys.byteorder == "big":
+            self.offsets.byteswap()
+        self.cacheBlocks = cacheBlocks
+        self.cache = OrderedDict()
+
+
+    def __len__(self):
+        return self.entries
+
+
+    def block(self, k):
+        """ The values of block ``k``, as an ``array('d')``. """
+
+        cache = self.cache
+        values = cache.get(k)
+        if values is not None:
+            cache.move_to_end(k)
+            return values
+        data = self.buf[self.offsets[k]:self.offsets[k + 1]]
+        values = _decode(_decompress(data, self.formatchar, self.codec), self.formatchar)
+        cache[k] = values
+        while len(cache) > self.cacheBlocks:
+            cache.popitem(last=False)
+        return values
+
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.entries
+        k, j = divmod(i, self.blockSize)
+        return self.block(k)[j]
+
+
+    def chunk(self, start, stop):
+        """ The values of [start, stop), as an ``array('d')``. """
+
+        stop = min(stop, self.entries)
+        values = array.array("d")
+        size = self.blockSize
+        for k in range(start // size, (stop + size - 1) // size):
+            values.extend(self.block(k)[max(start - k*size, 0):stop - k*size])
+        return values
+
+
+    def take(self, indices):
+        """ The values of ``indices``, as an ``array('d')``. """
+
+        if numpy is None:
+            return array.array("d", map(self.__getitem__, indices))
+        indices = numpy.asarray(indices, dtype=numpy.int64)
+        blocks, offsets = numpy.divmod(indices, self.blockSize)
+        order = numpy.argsort(blocks, kind="stable")
+        bounds = numpy.flatnonzero(numpy.diff(blocks[order])) + 1
+        out = numpy.empty(len(indices))
+        for part in numpy.split(order, bounds):
+            if len(part):
+                values = numpy.frombuffer(self.block(int(blocks[part[0]])), dtype=numpy.float64)
+                out[part] = values[offsets[part]]
+        return array.array("d", out.tobytes())
+
+
+class _CompactProbs(object):
+    """ Read-only sequence view of all positions over ``inner``, the values of a compact database.
+    The values of the positions left out are filled in on access. """
+
+    readonly = True
+
+    def __init__(self, inner):
+        if len(inner) != COMPACT_POSITIONS:
+            raise ValueError("not a compact database")
+        self.inner = inner
+
+
+    def __len__(self):
+        return TOTAL_POSITIONS
+
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += TOTAL_POSITIONS
+        if not 0 <= i < TOTAL_POSITIONS:
+            raise IndexError("index out of range")
+        k = bisect.bisect_right(_terminalStarts, i) - 1
+        if k >= 0 and i < _TERMINAL[k][1]:
+            return _TERMINAL[k][2]
+        return self.inner[i - _droppedBefore[k + 1]]
+
+
+    def chunk(self, start, stop):
+        """ The values of [start, stop), as an ``array('d')``. """
+
+        stop = min(stop, TOTAL_POSITIONS)
+        values = array.array("d")
+        at = start
+        for (first, last, value), before in zip(_TERMINAL, _droppedBefore):
+            if at >= stop:
+                break
+            if last <= at:
+                continue
+            if at < first:
+                values.extend(self.inner.chunk(at - before, min(first, stop) - before))
+                at = min(first, stop)
+            if at < stop:
+                values.extend(array.array("d", [value]) * (min(last, stop) - at))
+                at = min(last, stop)
+        if at < stop:
+            values.extend(self.inner.chunk(at - _droppedBefore[-1], stop - _droppedBefore[-1]))
+        return values
+
+
+    def take(self, indices):
+        """ The values of ``indices``, as an ``array('d')``. """
+
+        if numpy is None:
+            return array.array("d", map(self.__getitem__, indices))
+        indices = numpy.asarray(indices, dtype=numpy.int64)
+        k = numpy.searchsorted(_terminalStarts, indices, side="right") - 1
+        stops = numpy.array([stop for _, stop, _ in _TERMINAL], dtype=numpy.int64)
+        known = (k >= 0) & (indices < stops[numpy.maximum(k, 0)])
+        out = numpy.empty(len(indices))
+        out[known] = numpy.array([value for _, _, value in _TERMINAL])[k[known]]
+        stored = ~known
+        shifted = indices[stored] - numpy.array(_droppedBefore, dtype=numpy.int64)[k[stored] + 1]
+        out[stored] = numpy.frombuffer(self.inner.take(shifted), dtype=numpy.float64)
+        return array.array("d", out.tobytes())
+
+
+def _openShared(name):
+    """ Attach to the existing shared memory segment ``name``, without taking ownership of it. """
+
+    if shared_memory is None:
+        raise RuntimeError("shared memory requires Python 3.8 or later")
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+    shm = shared_memory.SharedMemory(name)
+    # otherwise the segment would be destroyed when this process exits
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def shareDatabase(filename, name=SHARED_NAME):
+    """ Load the database file ``filename`` (in its own format, e.g. 16-bit) into a new shared
+    memory segment called ``name``, and return it (a ``SharedMemory``). A compressed file is served
+    decompressed.
+
+    The segment lives until ``unlink()`` is called on it, normally by the serving process on exit.
+    """
+
+    if shared_memory is None:
+        raise RuntimeError("shared memory requires Python 3.8 or later")
+    compressed = None
+    if _isCompressed(filename):
+        with open(filename, "rb") as f:
+            compressed = _CompressedProbs(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), 1)
+        formatchar = compressed.formatchar
+        size = _nbytes(formatchar, len(compressed))
+    else:
+        formatchar, _ = _formatOf(filename)
+        size = os.path.getsize(filename)
+    shm = shared_memory.SharedMemory(name, create=True, size=_SHARED_HEADER.size + size)
+    try:
+        data = shm.buf[_SHARED_HEADER.size:_SHARED_HEADER.size + size]
+        if compressed is not None:
+            pos = 0
+            for start in range(0, len(compressed), _CHUNK):
+                raw = _encode(compressed.chunk(start, start + _CHUNK), formatchar)
+                data[pos:pos + len(raw)] = raw
+                pos += len(raw)
+        else:
+            with open(filename, "rb") as f:
+                pos = 0
+                while pos < size:
+                    n = f.readinto(data[pos:pos + _CHUNK * 8])
+                    if not n:
+                        raise ValueError("{0} is truncated".format(filename))
+                    pos += n
+        data.release()
+        _SHARED_HEADER.pack_into(shm.buf, 0, _SHARED_MAGIC, formatchar.encode(), size)
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+    return shm
+
+
+def compareValues(db, ref, start=0, stop=TOTAL_POSITIONS, report=None):
+    """ Compare the probabilities of ``db`` with those of ``ref`` (e.g. a quantized database with
+    the one it was made from) over positions [start, stop). Return a dict with the ``maxError`` and
+    ``meanError`` (absolute) over the ``count`` positions with a value in both, and the number of
+    positions with a value in only one (``missing``). If given, ``report`` is called with the
+    number of positions done after every chunk. """
+
+    maxError, total, count, missing = 0.0, 0.0, 0, 0
+    for first in range(start, stop, _CHUNK):
+        last = min(first + _CHUNK, stop)
+        a, b = db.chunk(first, last), ref.chunk(first, last)
+        if numpy is not None:
+            a = numpy.frombuffer(a, dtype=numpy.float64)
+            b = numpy.frombuffer(b, dtype=numpy.float64)
+            known = ~(numpy.isnan(a) | numpy.isnan(b))
+            missing += int((numpy.isnan(a) != numpy.isnan(b)).sum())
+            e = numpy.abs(a[known] - b[known])
+            if len(e):
+                maxError = max(maxError, float(e.max()))
+            total += float(e.sum())
+            count += len(e)
+        else:
+            for x, y in zip(a, b):
+                if x == x and y == y:
+                    e = abs(x - y)
+                    maxError = max(maxError, e)
+                    total += e
+                    count += 1
+                elif x == x or y == y:
+                    missing += 1
+        if report:
+            report(last - start)
+    return {"maxError": maxError, "meanError": total / count if count else 0.0, "count": count,
+            "missing": missing}
+
+
+def openDatabase(filename, shared=None):
+    """ The database for a tool: the shared memory segment ``shared`` (default
+    ``$ROYALUR_SHM``) if it is served, ``filename`` memory-mapped otherwise. """
+
+    shared = shared or os.environ.get("ROYALUR_SHM")
+    if shared and shared_memory is not None:
+        try:
+            return PositionsWinProbs(shared=shared)
+        except FileNotFoundError:
+            pass
+    return PositionsWinProbs(filename, useMmap=True)
 
 
 class PositionsWinProbs(object):
-    """ Win probability for Green (on play) for each ROGOUR position. """
+    """ Win probability for Green (on play) for each ROGOUR position.
+
+    With ``useMmap`` the database file is memory-mapped read-only and probabilities are decoded
+    directly from the file on every :py:meth:`get`. Loading is then instantaneous and all processes
+    using the same file share a single copy in the page cache, but :py:meth:`set` is not available.
 
-    def __init__(self, filename=None):
+    With ``buffer`` the probabilities are the float64 values in ``buffer`` (typically shared memory
+    from :py:meth:`shareMemory`), used in place.
+
+    With ``shared`` the probabilities are read, in place and read-only, from the shared memory
+    segment of that name, served by :py:func:`shareDatabase`.
+
+    ``formatchar`` is the format of the entries in the file: "d" (float64), "f" (float32), "H"
+    (16-bit), "T" (12-bit) or "B" (8-bit, logit-spaced), ``compression`` is the codec of a
+    compressed file or None, and ``compact`` is True for a file without the positions where the game
+    is over (see above). Set ``formatchar``, ``compression`` and ``compact`` before saving to choose
+    the format of the file.
+    """
+
+    def __init__(self, filename=None, useMmap=False, buffer=None, shared=None):
         self.db = array.array("d")
-        if filename:
-            self.load(filename)
+        self.compression = None
+        self.compact = False
+        if shared is not None:
+            self.attachShared(shared)
+        elif buffer is not None:
+            self.attach(buffer)
+        elif filename:
+            if useMmap:
+                self.mapFile(filename)
+            else:
+                self.load(filename)
         else:
             self.formatchar = "d"
-            self.db.extend([0.5] * TOTAL_POSITIONS)
+            self.db = array.array("d", [0.5]) * TOTAL_POSITIONS
             self.db[-1] = float("NaN")
 
 
     def load(self, filename):
-        size = os.path.getsize(filename)
-        if size == 8 * TOTAL_POSITIONS:
-            self.formatchar = "d"
-            readsize = 8
-            fcn = lambda x: x
-        elif size == 4 * TOTAL_POSITIONS:
-            self.formatchar = "f"
-            readsize = 4
-            fcn = lambda x: x
-        elif size == 2 * TOTAL_POSITIONS:
-            self.formatchar = "H"
-            readsize = 2
-            fcn = lambda x: x/(-1 + 2.0**16) if x != 65535 else float("NaN")
-        else:
-            raise ValueError("corrupt {0}, read only {1}".format(filename, len(self.b)))
+        if _isCompressed(filename) or _formatOf(filename)[1]:
+            # decoded through the mapped view
+            self.mapFile(filename)
+            db = array.array("d")
+            for start in range(0, TOTAL_POSITIONS, _CHUNK):
+                db.extend(self.chunk(start, start + _CHUNK))
+            self.db = db
+            return
+        self.formatchar, self.compact = _formatOf(filename)
+        self.compression = None
+        readsize = _nbytes(self.formatchar, _CHUNK)
+        self.db = array.array("d")
+        with open(filename, "rb") as f:
+            while True:
+                raw = f.read(readsize)
+                if not raw:
+                    break
+                self.db.extend(_decode(raw, self.formatchar))
+
+
+    def mapFile(self, filename):
+        """ Memory-map the database in ``filename`` (read-only). """
+
         with open(filename, "rb") as f:
-            for _ in range(TOTAL_POSITIONS):
-                self.db.append(fcn(struct.unpack(">{0}".format(self.formatchar), f.read(readsize))[0]))
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if _compressedSize(buf) == len(buf):
+            db = _CompressedProbs(buf)
+            self.formatchar, self.compression = db.formatchar, db.codec
+            if len(db) not in (TOTAL_POSITIONS, COMPACT_POSITIONS):
+                raise ValueError("corrupt {0}, {1} entries".format(filename, len(db)))
+            self.compact = len(db) == COMPACT_POSITIONS
+        else:
+            self.formatchar, self.compact = _formatOf(filename)
+            self.compression = None
+            db = _MappedProbs(buf, self.formatchar)
+        self.db = _CompactProbs(db) if self.compact else db
+
+
+    def attach(self, buffer):
+        """ Use the float64 values in ``buffer`` (native byte order) as the database, in place. """
+
+        view = memoryview(buffer).cast("B").cast("d")
+        if len(view) != TOTAL_POSITIONS:
+            raise ValueError("buffer has {0} entries, not {1}".format(len(view), TOTAL_POSITIONS))
+        self.formatchar = "d"
+        self.db = view
+
+
+    def attachShared(self, name):
+        """ Read the probabilities from the database served in shared memory segment ``name``. """
+
+        shm = _openShared(name)
+        magic, formatchar, size = _SHARED_HEADER.unpack_from(shm.buf, 0)
+        formatchar = formatchar.decode()
+        if magic != _SHARED_MAGIC or _formatOfSize(size) is None:
+            shm.close()
+            raise ValueError("shared memory {0} does not hold a database".format(name))
+        self.formatchar = formatchar
+        self.compact = _plainSizes[size][1]
+        self.db = _MappedProbs(shm.buf[_SHARED_HEADER.size:_SHARED_HEADER.size + size], formatchar)
+        if self.compact:
+            self.db = _CompactProbs(self.db)
+        # keep the segment mapped as long as the database
+        self.shm = shm
+
+
+    def shareMemory(self):
+        """ Move the probabilities to shared memory and return it (a ``multiprocessing`` RawArray).
+
+        Processes started afterwards can pass it to the ``buffer`` argument of the constructor, and
+        updates made by any of them are seen by all.
+        """
+
+        shared = multiprocessing.sharedctypes.RawArray("d", TOTAL_POSITIONS)
+        view = memoryview(shared).cast("B").cast("d")
+        for start in range(0, TOTAL_POSITIONS, _CHUNK):
+            values = self.chunk(start, start + _CHUNK)
+            view[start:start + len(values)] = values
+        self.attach(shared)
+        return shared
+
+
+    def readonly(self):
+        """ True if the probabilities are served from a read-only source (e.g. a mapped file). """
+
+        return getattr(self.db, "readonly", False)
 
 
     def save(self, filename):
-        fcn = None
-        if self.formatchar == "d":
-            fcn = lambda x: x
-        elif self.formatchar == "f":
-            fcn = lambda x: x
-        elif self.formatchar == "H":
-            fcn = lambda x: int(x*(-1 + 2.0**16)) if x == x else 65535
+        """ Save the database to ``filename``, in the format given by ``formatchar``,
+        ``compression`` and ``compact``.
+
+        Set them before saving to convert between formats.
+        """
+
+        ranges = _keptRanges() if self.compact else [(0, TOTAL_POSITIONS)]
+        pieces = (self.chunk(start, min(start + _CHUNK, stop))
+                  for first, stop in ranges for start in range(first, stop, _CHUNK))
+        entries = COMPACT_POSITIONS if self.compact else TOTAL_POSITIONS
         with open(filename, "wb") as f:
-            for i in range(TOTAL_POSITIONS):
-                f.write(struct.pack(">{0}".format(self.formatchar), fcn(self.db[i])))
+            if self.compression:
+                _saveCompressed(f, pieces, entries, self.formatchar, self.compression)
+                return
+            # 12-bit entries are written in pairs
+            for values in _reblock(pieces, _CHUNK):
+                f.write(_encode(values, self.formatchar))
+
+
+    def chunk(self, start, stop):
+        """ Return the win probabilities of positions [start, stop) as an ``array('d')``. """
+
+        stop = min(stop, TOTAL_POSITIONS)
+        if isinstance(self.db, (_MappedProbs, _CompressedProbs, _CompactProbs)):
+            return self.db.chunk(start, stop)
+        return self.db[start:stop]
+
+
+    def take(self, indices):
+        """ Return the win probabilities (NaN for none) of ``indices`` (a sequence of ints, an
+        ``array('I')`` or an integer numpy array) as an ``array('d')``. """
+
+        if isinstance(self.db, (_MappedProbs, _CompressedProbs, _CompactProbs)):
+            return self.db.take(indices)
+        if numpy is not None:
+            values = numpy.frombuffer(self.db, dtype=numpy.float64)[numpy.asarray(indices)]
+            return array.array("d", values.tobytes())
+        return array.array("d", map(self.db.__getitem__, indices))
 
 
     def board2key(self, board):
@@ -93,11 +946,14 @@ class PositionsWinProbs(object):
 
     def get(self, bpos):
         """ Get the win probability associated with position ``bpos``. """
-        return self.db[bpos] if self.db[bpos] == self.db[bpos] else None
+        p = self.db[bpos]
+        return p if p == p else None
 
 
     def set(self, bpos, pr):
         """ Set the win probability associated with position ``bpos`` to ``pr``. """
+        if self.readonly():
+            raise ValueError("database is read-only")
         self.db[bpos] = pr
 
 
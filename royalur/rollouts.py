@@ -0,0 +1,302 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+===========================
+Variance-reduced rollouts
+===========================
+
+Rollouts which get the same accuracy as :py:func:`royalur.play.rollout` from far fewer games:
+
+- **Common random numbers.** :py:func:`compareMoves` plays every candidate with the same dice
+  (game ``t`` of each candidate uses random stream ``t``), so the luck mostly cancels out in the
+  differences between candidates.
+- **Antithetic dice.** Games are played in pairs, the second one rolling ``4 - pips`` whenever the
+  first rolls ``pips`` (the 1-4-6-4-1 distribution is symmetric). Good rolls in one game are bad
+  rolls in the other, and the average of the pair varies less than a single game.
+- **Control variate.** Given an ``evaluator`` (win probability of Green on play, e.g. ``db.aget`` or
+  :py:func:`pipCountEvaluator`), the *luck* of every roll is how much better the best move with that
+  roll is than the average over all rolls, according to the evaluator. The luck has mean zero no
+  matter how bad the evaluator is, so subtracting the total luck of a game from its result keeps
+  the estimate unbiased, and the better the evaluator, the less variance is left. This is the
+  variance reduction used by backgammon rollouts. The luck is scaled by the regression coefficient
+  of the results on it (estimated from the games themselves), so a poor evaluator does not add
+  variance.
+
+:py:func:`parallelRollout` plays plain rollouts (as :py:func:`royalur.play.rollout`) in worker
+processes instead.
+
+All functions are reproducible given ``seed``, and report the variance of their estimate as
+``stdErr**2 * games``, the variance *per game played*, which can be compared directly between modes
+(and with plain Monte Carlo, where it is the variance of a single game's result).
+"""
+from __future__ import absolute_import
+
+import math
+import multiprocessing
+import pickle
+import random
+
+from .dice import PipsSource, streamSeed
+from .play import choose, rolloutPlay
+from .urcore import allMoves, gameOver, reverseBoard
+from .humanStrategies import bestHumanStrategySoFar as hplay, totPips1s
+
+__all__ = ["rolloutStats", "compareMoves", "pipCountEvaluator", "parallelRollout"]
+
+# Roll probabilities, in 16ths.
+_WEIGHTS = (1, 4, 6, 4, 1)
+
+# Rolls generated at a time, about one game's worth.
+_BLOCK = 256
+
+
+def pipCountEvaluator(board):
+    """ A crude win probability of Green on play, from the pip counts alone. """
+
+    lead = totPips1s(reverseBoard(board)) - totPips1s(board)
+    return 1 / (1 + math.exp(-(lead + 4) / 12.))
+
+
+def _rollValue(board, pips, evaluator):
+    """ Value for Green of the best move (according to ``evaluator``) with ``pips``, or None. """
+
+    best = 0.0
+    for b, e in allMoves(board, pips):
+        if gameOver(b):
+            return 1.0
+        p = evaluator(b)
+        if p is None:
+            return None
+        best = max(best, p if e else 1 - p)
+    return best
+
+
+def _luck(board, pips, evaluator):
+    """ Value of the roll ``pips`` for Green, above the average roll. """
+
+    values = [_rollValue(board, k, evaluator) for k in range(5)]
+    if None in values:
+        return 0.0
+    return values[pips] - sum(w * v for w, v in zip(_WEIGHTS, values)) / 16.
+
+
+def _playOut(board, side, players, dice, choices, flip, evaluator):
+    """ Play ``board`` (``side`` on play, 1 for X) to the end. Return the result for X and the luck
+    of X (0 without an evaluator). """
+
+    luck = 0.0
+    while not gameOver(board):
+        pips = dice()
+        if flip:
+            pips = 4 - pips
+        if evaluator:
+            lk = _luck(board, pips, evaluator)
+            luck += lk if side else -lk
+
+        am = allMoves(board, pips)
+        if len(am) > 1:
+            am = choose(players[side], board, pips, am)
+        m, e = am[0] if len(am) == 1 else choices.choice(am)
+        board = m
+        if not e:
+            side = 1 - side
+
+    # the side on play lost
+    return 1 - side, luck
+
+
+def _trial(board, players, seed, t, antithetic, evaluator):
+    """ Result and luck of game ``t`` for X on play at ``board`` (averages of the pair with
+    ``antithetic``). """
+
+    def play(flip):
+        # dice, and ties between moves, from streams of their own
+        dice = PipsSource(streamSeed(seed, t), _BLOCK)
+        choices = random.Random(dice.split("choice").initialSeed)
+        return _playOut(board, 1, players, dice, choices, flip, evaluator)
+
+    r, lk = play(False)
+    if antithetic:
+        r2, lk2 = play(True)
+        r, lk = (r + r2) / 2., (lk + lk2) / 2.
+    return r, lk
+
+
+def _mean(values):
+    return sum(values) / float(len(values))
+
+
+def _controlled(trials):
+    """ Results of ``trials`` ((result, luck) pairs) corrected by the luck. """
+
+    ml = _mean([lk for _, lk in trials])
+    varL = sum((lk - ml)**2 for _, lk in trials)
+    if varL == 0:
+        return [r for r, _ in trials]
+    mr = _mean([r for r, _ in trials])
+    beta = sum((r - mr) * (lk - ml) for r, lk in trials) / varL
+    # the luck's true mean is 0
+    return [r - beta * lk for r, lk in trials]
+
+
+def _stats(values, gamesPerValue):
+    n = len(values)
+    mean = _mean(values)
+    var = sum((v - mean)**2 for v in values) / (n - 1) if n > 1 else 0.0
+    stdErr = math.sqrt(var / n)
+    return mean, stdErr, stdErr**2 * n * gamesPerValue
+
+
+def rolloutStats(board, nTrials, playerX=None, playerO=None, seed=None, antithetic=False,
+                 evaluator=None):
+    """ Win probability of Green (X) on play at ``board``, from ``nTrials`` games. Return (win
+    probability, standard error, variance per game).
+
+    With ``antithetic`` the games are played in antithetic pairs (``nTrials`` pairs). With
+    ``evaluator`` the (scaled) luck of each game is subtracted from its result. Players default to
+    the best human-like player.
+    """
+
+    if seed is None:
+        seed = random.getrandbits(64)
+    players = (playerO or hplay, playerX or hplay)
+    trials = [_trial(board, players, seed, t, antithetic, evaluator) for t in range(nTrials)]
+    return _stats(_controlled(trials), 2 if antithetic else 1)
+
+
+def compareMoves(moves, nTrials, playerX=None, playerO=None, seed=None, antithetic=False,
+                 evaluator=None):
+    """ Roll out the candidate ``moves`` (a list of (board, extraTurn) pairs, as from
+    :py:func:`royalur.urcore.allMoves`) of Green, using the same dice for all of them.
+
+    Return a list with one (win probability, standard error, variance per game, standard error of
+    the difference to the first candidate) tuple per move. Thanks to the common dice, the last one
+    is usually much smaller than the standard errors themselves. ``antithetic`` and ``evaluator``
+    are as in :py:func:`rolloutStats`.
+    """
+
+    if seed is None:
+        seed = random.getrandbits(64)
+    players = (playerO or hplay, playerX or hplay)
+    perGame = 2 if antithetic else 1
+
+    results = []
+    for b, e in moves:
+        if gameOver(b):
+            values = [1.0] * nTrials
+        elif e:
+            values = _controlled([_trial(b, players, seed, t, antithetic, evaluator)
+                                  for t in range(nTrials)])
+        else:
+            # the opponent is on play at b
+            values = [1 - v for v in _controlled([_trial(b, players[::-1], seed, t, antithetic,
+                                                         evaluator) for t in range(nTrials)])]
+        results.append(values)
+
+    stats = []
+    for values in results:
+        diffs = [v - v0 for v, v0 in zip(values, results[0])]
+        stats.append(_stats(values, perGame) + (_stats(diffs, perGame)[1],))
+    return stats
+
+
+# Players (and evaluator) of the rollouts of this process. Set in each worker by the pool initializer.
+_rolloutPlayers = None
+
+
+def _setRolloutPlayers(playerX, playerO, evaluator):
+    global _rolloutPlayers
+    _rolloutPlayers = (playerX or hplay, playerO or hplay, evaluator)
+
+
+def _rolloutChunk(task):
+    """ Play a chunk of trials with its own random stream. Return (trials, sum, sum of squares). """
+
+    board, n, seed = task
+    playerX, playerO, evaluator = _rolloutPlayers
+    # ties between moves are broken with the global random, so seed it too (differently)
+    dice = PipsSource(seed)
+    random.seed(dice.split("choice").initialSeed)
+    s, ss = 0.0, 0.0
+    for _ in range(n):
+        side, p = rolloutPlay(board, 1, playerX, playerO, evaluator, dice)
+        w = p if side == 1 else 1-p
+        s += w
+        ss += w*w
+    return n, s, ss
+
+
+def _picklable(obj):
+    try:
+        pickle.dumps(obj)
+    except Exception:
+        return False
+    return True
+
+
+def _workerContext(players):
+    """ Multiprocessing context for workers playing with ``players``, or None to play in this
+    process. Forked workers inherit the players; without fork (e.g. on Windows) they are pickled to
+    the workers, which lambdas and closures (such as :py:func:`royalur.play.getDBplayer` players)
+    are not. """
+
+    try:
+        return multiprocessing.get_context("fork")
+    except ValueError:
+        return multiprocessing.get_context() if _picklable(players) else None
+
+
+def parallelRollout(board, nTrials, playerX=None, playerO=None, evaluator=None, processes=None,
+                    seed=None, chunk=1000):
+    """ Same as :py:func:`royalur.play.rollout`, with the trials split among ``processes`` worker
+    processes (default one per CPU). Return (win rate, standard error of the win rate).
+
+    Trials are played in chunks of ``chunk``, chunk ``k`` using a random stream seeded with
+    ``streamSeed(seed, k)``, so the result depends on ``seed`` only, not on the number of
+    processes. A random seed is used if not given.
+
+    Where processes cannot be forked, the players and evaluator must be picklable to be sent to the
+    workers. If they are not, the trials are played in this process (with the same result).
+    """
+
+    if seed is None:
+        seed = random.getrandbits(64)
+    tasks = [(board, min(chunk, nTrials - i), streamSeed(seed, k))
+             for k, i in enumerate(range(0, nTrials, chunk))]
+
+    players = (playerX, playerO, evaluator)
+    ctx = _workerContext(players) if processes != 1 else None
+    if ctx is None:
+        state = random.getstate()
+        _setRolloutPlayers(*players)
+        try:
+            results = [_rolloutChunk(t) for t in tasks]
+        finally:
+            random.setstate(state)
+    else:
+        pool = ctx.Pool(processes, _setRolloutPlayers, players)
+        try:
+            results = pool.map(_rolloutChunk, tasks)
+        finally:
+            pool.close()
+            pool.join()
+
+    n = sum(r[0] for r in results)
+    s = sum(r[1] for r in results)
+    ss = sum(r[2] for r in results)
+    mean = s/n
+    var = max(ss - n*mean*mean, 0.0)/(n - 1) if n > 1 else 0.0
+    return mean, math.sqrt(var/n)
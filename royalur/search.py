@@ -0,0 +1,228 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+=============
+N-ply search
+=============
+
+The same expectiminimax as :py:func:`royalur.play.prob`, with a transposition table. In ROGOUR the
+same positions are reached again and again, under different rolls and move orders (and a roll with
+no legal move simply passes the turn), so a search remembering the values it computed, per position
+index and remaining depth, does a small fraction of the work of plain recursion at 3 ply and more.
+
+:py:func:`probStar` searches the same tree with alpha-beta pruning at the chance nodes (Ballard's
+Star1 and Star2). Win probabilities lie in [0, 1], so once the rolls searched so far (with the rest
+assumed as bad, or as good, as possible) put a position outside the window of interest, its other
+rolls need not be searched. Star2 first *probes* every roll with a single move, whose value is a
+lower bound for the roll, and often gets a cutoff from those bounds alone. Moves are tried best
+looking first (by the evaluator), which is what makes the cutoffs frequent. The value of the root is
+exactly that of :py:func:`royalur.play.prob`; on midgame positions about half as many positions are
+visited at 4 ply.
+
+The leaves are valued by any evaluator: a database (anything with an ``aget`` method, e.g.
+:py:class:`royalur.probsdb.PositionsWinProbs`), or a function from board to the win probability of
+Green on play, such as :py:func:`royalur.rollouts.pipCountEvaluator`.
+"""
+from __future__ import absolute_import
+
+from collections import OrderedDict
+
+from .urcore import allMoves, board2Index, gameOver
+
+__all__ = ["Search", "probStar"]
+
+# Roll probabilities.
+_ROLLS = (((1./16), 0), ((1./4), 1), ((3./8), 2), ((1./4), 3), ((1./16), 4))
+
+# Windows of children are widened by this much, so that a bound returned in place of a value is
+# always away from the bound needed by rounding errors, and never changes the result.
+_SLACK = 1e-9
+
+
+class Search(object):
+    """ N-ply search with a bounded transposition table.
+
+    The table keeps the values of up to ``tableSize`` (position index, ply) pairs, dropping the
+    least recently used first.
+    """
+
+    def __init__(self, evaluator, tableSize=1 << 20):
+        self.evaluator = evaluator.aget if hasattr(evaluator, "aget") else evaluator
+        self.tableSize = tableSize
+        self.table = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+
+    def clear(self):
+        """ Empty the table and reset the statistics. """
+
+        self.table.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+    def stats(self):
+        """ Table statistics: a dict with the number of ``hits`` and ``misses``, the ``hitRate``
+        and the number of entries (``size``). """
+
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.table),
+                "hitRate": float(self.hits) / lookups if lookups else 0.0}
+
+
+    def prob(self, board, ply):
+        """ Win probability of ``board`` (Green on play) at ``ply``-ply. Same as
+        :py:func:`royalur.play.prob` with this evaluator. """
+
+        if ply == 0:
+            return self.evaluator(board)
+
+        key = (board2Index(board), ply)
+        table = self.table
+        p = table.get(key)
+        if p is not None:
+            self.hits += 1
+            table.move_to_end(key)
+            return p
+        self.misses += 1
+
+        pWin = 0
+        for pr, pips in _ROLLS:
+            maxp = -1
+            for b, e in allMoves(board, pips):
+                if gameOver(b):
+                    maxp = 1
+                    break
+
+                p = self.prob(b, ply-1)
+                if not e:
+                    p = 1 - p
+                if p > maxp:
+                    maxp = p
+
+            assert 0 <= maxp <= 1
+            pWin += pr * maxp
+
+        table[key] = pWin
+        if len(table) > self.tableSize:
+            table.popitem(last=False)
+        return pWin
+
+
+def _evaluatorOf(evaluator):
+    return evaluator.aget if hasattr(evaluator, "aget") else evaluator
+
+
+class _StarSearch(object):
+    """ Star1/Star2 search. All values are for Green on play and fail-hard: a result <= alpha means
+    the value is at most alpha, a result >= beta that it is at least beta. """
+
+    def __init__(self, evaluator, probing):
+        self.evaluator = _evaluatorOf(evaluator)
+        self.probing = probing
+        self.nodes = 0
+
+
+    def move(self, board, extra, ply, alpha, beta):
+        """ Value, for the mover, of moving to ``board``. """
+
+        if gameOver(board):
+            return 1.0
+        if extra:
+            return self.position(board, ply, alpha, beta)
+        return 1 - self.position(board, ply, 1 - beta, 1 - alpha)
+
+
+    def order(self, moves, ply):
+        """ ``moves`` (which lead to positions searched at ``ply``), the most promising first: wins,
+        then by the evaluator when the positions are not leaves. """
+
+        for m in moves:
+            if gameOver(m[0]):
+                return [m]
+        if ply == 0 or len(moves) == 1:
+            return moves
+
+        def value(m):
+            self.nodes += 1
+            v = self.evaluator(m[0])
+            return v if m[1] else 1 - v
+        return sorted(moves, key=value, reverse=True)
+
+
+    def roll(self, moves, ply, alpha, beta):
+        """ Value of the best of ``moves``. """
+
+        best = alpha
+        for b, e in moves:
+            v = self.move(b, e, ply, best - _SLACK, beta + _SLACK)
+            if v >= beta:
+                return beta
+            if v > best:
+                best = v
+        return best
+
+
+    def position(self, board, ply, alpha, beta):
+        self.nodes += 1
+        if ply == 0:
+            return min(max(self.evaluator(board), alpha), beta)
+
+        rolls = [(pr, self.order(allMoves(board, pips), ply-1)) for pr, pips in _ROLLS]
+        lower = [0.0] * len(rolls)
+
+        if self.probing:
+            # Star2: the first (best looking) move gives a lower bound for each roll
+            done = 0.0
+            for i, (pr, moves) in enumerate(rolls):
+                bound = (beta - done) / pr
+                b, e = moves[0]
+                w = self.move(b, e, ply-1, -_SLACK, min(bound, 1.0) + _SLACK)
+                if w >= bound:
+                    return beta
+                lower[i] = w
+                done += pr * w
+                # below bound, w is the exact value of the move
+                rolls[i] = (pr, moves[1:])
+
+        # Star1, with the lower bounds of the rolls not searched yet
+        pWin = 0
+        restLower = sum(pr * w for (pr, _), w in zip(rolls, lower))
+        rest = 1.0
+        for i, (pr, moves) in enumerate(rolls):
+            rest -= pr
+            restLower -= pr * lower[i]
+            a = (alpha - pWin - rest) / pr
+            b = (beta - pWin - restLower) / pr
+            v = self.roll(moves, ply-1, max(a, lower[i]) - _SLACK, min(b, 1.0) + _SLACK)
+            # the probed move is worth exactly lower[i]
+            v = max(v, lower[i])
+            if v <= a:
+                return alpha
+            if v >= b:
+                return beta
+            pWin += pr * v
+        return pWin
+
+
+def probStar(board, ply, evaluator, probing=True):
+    """ Win probability of ``board`` (Green on play) at ``ply``-ply, the same as
+    :py:func:`royalur.play.prob`, searched with Star2 pruning (Star1 without ``probing``). Return
+    (probability, number of positions visited). """
+
+    search = _StarSearch(evaluator, probing)
+    return search.position(board, ply, 0.0, 1.0), search.nodes
@@ -0,0 +1,304 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+==================
+Evaluation service
+==================
+
+A small HTTP/1.1 JSON service (asyncio, no other dependency) evaluating batches of positions with
+one resident database. Start it with ``urserver``.
+
+``POST /evaluate`` takes a JSON object::
+
+  {"positions": ["Fbg!B", 1234, ...], "moves": true, "ply": 2}
+
+Positions are board codes (:py:func:`royalur.urcore.board2Code`) or position indices, Green on play.
+``moves`` (true or false) and ``ply`` (an integer) are optional. The answer has one result per
+position, in order::
+
+  {"results": [{"index": 1234, "code": "Fbg!B", "winProb": 0.52,
+                "moves": [null, {"pips": 1, "from": 3, "code": "...", "extraTurn": false,
+                                 "winProb": 0.49}, ...],
+                "ply": 0.51}, ...]}
+
+``winProb`` is the probability of Green winning (null if the database has no value). With ``moves``,
+``moves[pips]`` is the best move with that roll (``from`` is -1 when entering a piece, null when
+there is no legal move), ``code`` is the board after it, with the side on play to move, and
+``winProb`` the probability of the mover winning after it. When the database has no value for some
+move the best one is not known, and ``moves[pips]`` is
+``{"pips": pips, "error": "no database value"}`` instead. With ``ply`` the ``ply`` entry is the
+n-ply win probability (:py:class:`royalur.search.Search`, whose table is kept between requests).
+``GET /health`` answers ``{"status": "ok"}``.
+
+Connections are kept alive (HTTP/1.1), and requests arriving while a batch is being evaluated are
+evaluated together in the next one, so a single process serves many clients with little overhead
+per position.
+"""
+from __future__ import absolute_import
+
+import asyncio
+import concurrent.futures
+import json
+
+from .urcore import allMoves, board2Code, boards2Indices, code2Board, gameOver, indices2Boards, \
+    unpackBoards, TOTAL_POSITIONS
+from .search import Search
+
+__all__ = ["Evaluator", "startServer"]
+
+# Largest request body accepted, in bytes.
+MAX_BODY = 1 << 24
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large"}
+
+
+class Evaluator(object):
+    """ Evaluate batches of positions with ``db`` (a :py:class:`royalur.probsdb.PositionsWinProbs`).
+    n-ply values are limited to ``maxPly``. """
+
+    def __init__(self, db, maxPly=3, tableSize=1 << 20):
+        self.db = db
+        self.maxPly = maxPly
+        self.search = Search(db, tableSize)
+
+
+    def boards(self, positions):
+        """ Boards and indices of ``positions`` (board codes or indices). Raise ValueError on a bad
+        position. """
+
+        boards = [None] * len(positions)
+        byIndex = []
+        for k, p in enumerate(positions):
+            if isinstance(p, bool) or not isinstance(p, (int, str)):
+                raise ValueError("bad position {0!r}".format(p))
+            if isinstance(p, int):
+                if not 0 <= p < TOTAL_POSITIONS:
+                    raise ValueError("bad position index {0}".format(p))
+                byIndex.append(k)
+            else:
+                try:
+                    boards[k] = code2Board(p)
+                except Exception:
+                    raise ValueError("bad board code {0!r}".format(p))
+
+        if byIndex:
+            for k, b in zip(byIndex, unpackBoards(indices2Boards([positions[k] for k in byIndex]))):
+                boards[k] = b
+        return boards, boards2Indices(boards)
+
+
+    def bestMove(self, board, pips):
+        """ The best move of Green at ``board`` with ``pips``, as a result dict (with an ``error``
+        instead if the database lacks the value of some move). """
+
+        froms = []
+        best = None
+        for (b, e), frm in zip(allMoves(board, pips, froms), froms):
+            if gameOver(b):
+                p = 1.0
+            else:
+                p = self.db.aget(b)
+                if p is None:
+                    return {"pips": pips, "error": "no database value"}
+                if not e:
+                    p = 1 - p
+            if best is None or p > best[0]:
+                best = (p, b, e, frm)
+
+        p, b, e, frm = best
+        return {"pips": pips, "from": frm, "code": board2Code(b), "extraTurn": e, "winProb": p}
+
+
+    def checkOptions(self, moves, ply):
+        """ Raise ValueError unless ``moves`` is a bool and ``ply`` an int (not a bool) between 0
+        and ``maxPly``. """
+
+        if not isinstance(moves, bool):
+            raise ValueError("moves must be true or false")
+        if isinstance(ply, bool) or not isinstance(ply, int) or not 0 <= ply <= self.maxPly:
+            raise ValueError("ply must be between 0 and {0}".format(self.maxPly))
+
+
+    def evaluate(self, positions, moves=False, ply=0):
+        """ Results (a list of dicts, see the module documentation) for ``positions``. """
+
+        self.checkOptions(moves, ply)
+        boards, indices = self.boards(positions)
+        results = []
+        for board, index in zip(boards, indices):
+            r = {"index": index, "code": board2Code(board), "winProb": self.db.get(index)}
+            if not gameOver(board):
+                if moves:
+                    r["moves"] = [None] + [self.bestMove(board, pips) for pips in range(1, 5)]
+                if ply:
+                    r["ply"] = self.search.prob(board, ply)
+            results.append(r)
+        return results
+
+
+class _Batcher(object):
+    """ Evaluate the requests queued while the previous batch was evaluated in one go, in a
+    worker thread, so the event loop keeps reading requests meanwhile. """
+
+    def __init__(self, evaluator):
+        self.evaluator = evaluator
+        self.pending = []
+        self.running = False
+        self.executor = concurrent.futures.ThreadPoolExecutor(1)
+
+
+    def submit(self, positions, moves, ply):
+        future = asyncio.get_event_loop().create_future()
+        self.pending.append((positions, moves, ply, future))
+        if not self.running:
+            self.running = True
+            asyncio.ensure_future(self.run())
+        return future
+
+
+    def evaluate(self, jobs):
+        # requests with the same options make one batch
+        groups = {}
+        for job in jobs:
+            groups.setdefault((job[1], job[2]), []).append(job)
+
+        done = []
+        for (moves, ply), group in groups.items():
+            positions = [p for job in group for p in job[0]]
+            try:
+                results = self.evaluator.evaluate(positions, moves, ply)
+            except ValueError:
+                # find the culprits
+                for job in group:
+                    try:
+                        done.append((job[3], self.evaluator.evaluate(job[0], moves, ply)))
+                    except ValueError as e:
+                        done.append((job[3], e))
+                continue
+            k = 0
+            for job in group:
+                done.append((job[3], results[k:k + len(job[0])]))
+                k += len(job[0])
+        return done
+
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        try:
+            while self.pending:
+                jobs, self.pending = self.pending, []
+                try:
+                    done = await loop.run_in_executor(self.executor, self.evaluate, jobs)
+                except Exception as e:
+                    done = [(job[3], e) for job in jobs]
+                for future, result in done:
+                    if future.cancelled():
+                        continue
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+        finally:
+            self.running = False
+
+
+def _response(writer, status, body, keepAlive):
+    data = json.dumps(body).encode()
+    head = ("HTTP/1.1 {0} {1}\r\nContent-Type: application/json\r\nContent-Length: {2}\r\n"
+            "Connection: {3}\r\n\r\n").format(status, _REASONS[status], len(data),
+                                              "keep-alive" if keepAlive else "close")
+    writer.write(head.encode() + data)
+
+
+async def _request(batcher, method, path, body):
+    """ Status and JSON body of the answer to a request. """
+
+    if path == "/health":
+        return 200, {"status": "ok"}
+    if path != "/evaluate":
+        return 404, {"error": "no such resource"}
+    if method != "POST":
+        return 405, {"error": "use POST"}
+
+    try:
+        query = json.loads(body.decode())
+        if isinstance(query, list):
+            query = {"positions": query}
+        positions = query["positions"]
+        if not isinstance(positions, list):
+            raise ValueError("positions must be a list")
+        moves, ply = query.get("moves", False), query.get("ply", 0)
+        # before batching: bad options would fail the whole batch
+        batcher.evaluator.checkOptions(moves, ply)
+        results = await batcher.submit(positions, moves, ply)
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        return 400, {"error": str(e)}
+    return 200, {"results": results}
+
+
+async def _connection(batcher, reader, writer):
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                method, path, version = line.decode("latin-1").split()
+            except ValueError:
+                _response(writer, 400, {"error": "bad request line"}, False)
+                break
+
+            headers = {}
+            while True:
+                h = await reader.readline()
+                if h in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = h.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip().lower()
+
+            connection = headers.get("connection", "")
+            keepAlive = (connection != "close" if version == "HTTP/1.1"
+                         else connection == "keep-alive")
+
+            try:
+                length = int(headers.get("content-length") or 0)
+                if length < 0:
+                    raise ValueError(length)
+            except ValueError:
+                _response(writer, 400, {"error": "bad content-length"}, False)
+                break
+            if length > MAX_BODY:
+                _response(writer, 413, {"error": "request too large"}, False)
+                break
+            body = await reader.readexactly(length) if length else b""
+
+            status, answer = await _request(batcher, method, path.split("?")[0], body)
+            _response(writer, status, answer, keepAlive)
+            await writer.drain()
+            if not keepAlive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def startServer(db, host="127.0.0.1", port=8080, maxPly=3):
+    """ Start serving ``db`` on ``host``:``port``. Return the ``asyncio`` server. """
+
+    batcher = _Batcher(Evaluator(db, maxPly))
+    return await asyncio.start_server(lambda r, w: _connection(batcher, r, w), host, port)
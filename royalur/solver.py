@@ -0,0 +1,524 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+=================
+Vectorized solver
+=================
+
+Computes the winning probabilities database exactly as ``scripts/makedb.py`` does (fixed-point
+iteration over position pairs, one (gOff, rOff) block at a time, until no probability changes by
+more than 1e-12 in a sweep), but with every sweep done as numpy array operations instead of a
+Python loop per position. Requires numpy.
+
+The *receipts* of a block, what ``ply1BothFullRecpt`` keeps for each pair, are flattened into
+arrays. Each pair has two rows (the position and its reverse), and for each row:
+
+- the probability (in 16ths) of winning on the spot, and of passing the turn with the board
+  unchanged (a roll of 0 or no legal move);
+- for each other roll a *group*: the weight of the roll and the candidate moves, kept as successor
+  indices with the :py:data:`royalur.successors.EXTRA_TURN` bit set when the mover rolls again.
+
+A sweep gathers the current probabilities of all candidates, takes the best move of each group
+(``maximum.reduceat``), sums the groups of each row (``bincount``) and solves each pair in closed
+form, as ``ply1bfr``. Pairs are sorted by total pip count and updated in chunks, so later chunks
+already use the new values of earlier ones, like the in-place updates of makedb.
+
+Race pairs need no iteration: in a race every move lowers the total pip count, so updating them
+once each in order of pip count gives their exact values (:py:func:`solveRace`). They are solved
+first, and are then fixed values for the iterations of the other pairs.
+
+Receipts are read from a :py:class:`royalur.successors.SuccessorGraph` when one is given, and
+generated with :py:func:`royalur.urcore.allMoves` otherwise.
+
+Pairs with *g*/*r* pieces off only depend on pairs with one more piece off, so all blocks with the
+same total number of pieces off (a *wave*) can be solved at once. :py:func:`solveParallel` hands the
+pairs of each wave to worker processes, which update a database in shared memory and synchronize
+only between sweeps.
+"""
+from __future__ import absolute_import
+
+import array
+import multiprocessing
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .urcore import nPositionsOff, spMap
+from .successors import EXTRA_TURN, SuccessorGraph, appendEdges
+from .probsdb import PositionsWinProbs
+try:
+    import royalur.irogaur as irogaur
+except ImportError:
+    import irogaur
+
+__all__ = ["TOLERANCE", "blockRange", "dependencyWaves", "solveRace", "solveBlock", "initGameOver",
+           "solve", "solveParallel"]
+
+TOLERANCE = 1e-12
+"""Sweeps stop once no probability changed by more than this."""
+
+# Pairs updated together.
+_CHUNK = 1 << 16
+
+_INDEX_MASK = EXTRA_TURN - 1
+
+# Probability (in 16ths) of rolling 0, 1, 2, 3 and 4.
+_WEIGHTS = (1, 4, 6, 4, 1)
+
+# Board element each element of the reversed board comes from (see urcore.reverseBoard). All but
+# the pieces off (14 and 21) change sign.
+_REVERSE = (15, 16, 17, 18, 4, 5, 6, 7, 8, 9, 10, 11, 19, 20, 21, 0, 1, 2, 3, 12, 13, 14)
+
+# Pips to go of a piece on each board element (see humanStrategies.totPips2s).
+_PIPS = tuple(14 - i for i in range(14)) + (0, 14, 13, 12, 11, 2, 1, 0)
+
+
+def _needNumpy():
+    if numpy is None:
+        raise ImportError("royalur.solver requires numpy")
+
+
+def blockRange(gOff, rOff):
+    """ The ``(start, stop)`` index range of all positions with *gOff*/*rOff* Green/Red pieces
+    off. """
+
+    start = spMap[gOff, rOff, 0, 0]
+    return start, start + nPositionsOff[gOff, rOff]
+
+
+def _boards(indices):
+    boards = numpy.empty((len(indices), 22), dtype=numpy.int8)
+    irogaur.indices2Boards(numpy.ascontiguousarray(indices, dtype=numpy.uint32), boards)
+    return boards
+
+
+def _indices(boards):
+    indices = numpy.empty(len(boards), dtype=numpy.uint32)
+    irogaur.boards2Indices(numpy.ascontiguousarray(boards), indices)
+    return indices
+
+
+def _reverse(boards):
+    r = -boards[:, _REVERSE]
+    r[:, 14] = boards[:, 21]
+    r[:, 21] = boards[:, 14]
+    return r
+
+
+def _totPips(boards):
+    tot = (boards != 0).astype(numpy.int32).dot(numpy.array(_PIPS, dtype=numpy.int32))
+    onBoard = numpy.count_nonzero(boards[:, :14] == 1, axis=1) + numpy.count_nonzero(boards == -1,
+                                                                                     axis=1)
+    return tot + 15 * (14 - boards[:, 14] - boards[:, 21] - onBoard)
+
+
+def _terminal(indices):
+    """ True for the indices of positions where the game is over. """
+
+    gStarts = numpy.array([blockRange(g, 0)[0] for g in range(8)], dtype=numpy.int64)
+    rDone = numpy.array([blockRange(g, 7)[0] for g in range(8)], dtype=numpy.int64)
+    g = numpy.searchsorted(gStarts, indices, side="right") - 1
+    return (g == 7) | (indices >= rDone[g])
+
+
+def _race(boards):
+    """ True for race boards (see urcore.typeBearOff). """
+
+    return ((boards[:, 12] + boards[:, 13] + boards[:, 14] == 7) |
+            (boards[:, 21] - boards[:, 19] - boards[:, 20] == 7))
+
+
+def _blockPairs(gOff, rOff):
+    """ Keys, reversed keys, total pip count and race flag of all position pairs of the block,
+    sorted by total pip count. """
+
+    start, stop = blockRange(gOff, rOff)
+    keys, rkeys, pips, race = [], [], [], []
+    for first in range(start, stop, _CHUNK):
+        k = numpy.arange(first, min(first + _CHUNK, stop), dtype=numpy.uint32)
+        b = _boards(k)
+        rk = _indices(_reverse(b))
+        if gOff == rOff:
+            # both in this block, keep one of each pair
+            sel = k <= rk
+            k, rk, b = k[sel], rk[sel], b[sel]
+        keys.append(k)
+        rkeys.append(rk)
+        pips.append(_totPips(b))
+        race.append(_race(b))
+
+    pips = numpy.concatenate(pips)
+    order = numpy.argsort(pips, kind="stable")
+    return (numpy.concatenate(keys)[order], numpy.concatenate(rkeys)[order], pips[order],
+            numpy.concatenate(race)[order])
+
+
+def _rowEdges(rows, graph):
+    """ Edge counts (rows x 5), position of the first edge and the edges of the positions ``rows``. """
+
+    if graph is not None:
+        local = rows.astype(numpy.int64) - graph.start
+        if len(local) and (local.min() < 0 or local.max() >= graph.count):
+            raise ValueError("successor graph does not cover all positions")
+        counts = numpy.frombuffer(graph.counts, dtype=numpy.uint8).reshape(-1, 5)[local]
+        first = numpy.frombuffer(graph.offsets, dtype=numpy.uint64)[local].astype(numpy.int64)
+        return counts.astype(numpy.int64), first, numpy.frombuffer(graph.edges, dtype=numpy.uint32)
+
+    counts = bytearray()
+    edges = array.array("I")
+    first = array.array("q")
+    for index in rows.tolist():
+        first.append(len(edges))
+        appendEdges(index, counts, edges)
+    counts = numpy.frombuffer(bytes(counts), dtype=numpy.uint8).reshape(-1, 5).astype(numpy.int64)
+    return (counts, numpy.frombuffer(first, dtype=numpy.int64),
+            numpy.frombuffer(edges, dtype=numpy.uint32))
+
+
+def _receipts(keys, rkeys, graph):
+    """ Flat receipts of the pairs ``(keys[i], rkeys[i])``. Row ``2i`` is ``keys[i]``, row ``2i+1``
+    is ``rkeys[i]``. """
+
+    n2 = 2 * len(keys)
+    rows = numpy.empty(n2, dtype=numpy.uint32)
+    rows[0::2] = keys
+    rows[1::2] = rkeys
+    other = numpy.empty_like(rows)
+    other[0::2] = rkeys
+    other[1::2] = keys
+
+    counts, first, edges = _rowEdges(rows, graph)
+    win = numpy.zeros(n2, dtype=numpy.uint8)
+    rev = numpy.full(n2, _WEIGHTS[0], dtype=numpy.uint8)
+    gRow, gWeight, gCount, cand = [], [], [], []
+
+    first = first + counts[:, 0]
+    for pips in range(1, 5):
+        c = counts[:, pips]
+        starts = numpy.cumsum(c) - c
+        rowOf = numpy.repeat(numpy.arange(n2), c)
+        e = edges[numpy.repeat(first - starts, c) + numpy.arange(starts[-1] + c[-1])]
+        first = first + c
+
+        # no legal move: the only "move" is the reversed board
+        single = numpy.zeros(n2, dtype=numpy.uint32)
+        single[c == 1] = e[starts[c == 1]]
+        noMove = (c == 1) & (single == other)
+        winning = numpy.bincount(rowOf[_terminal(e & _INDEX_MASK)], minlength=n2) > 0
+        rest = ~(noMove | winning)
+
+        w = _WEIGHTS[pips]
+        rev[noMove] += w
+        win[winning] += w
+        gRow.append(numpy.flatnonzero(rest))
+        gWeight.append(numpy.full(len(gRow[-1]), w, dtype=numpy.uint8))
+        gCount.append(c[rest])
+        cand.append(e[rest[rowOf]])
+
+    # order groups by row, so that each row's groups (and candidates) are adjacent
+    gRow = numpy.concatenate(gRow)
+    gCount = numpy.concatenate(gCount)
+    cand = numpy.concatenate(cand)
+    order = numpy.argsort(gRow, kind="stable")
+    oldStart = (numpy.cumsum(gCount) - gCount)[order]
+    gRow, gWeight, gCount = gRow[order], numpy.concatenate(gWeight)[order], gCount[order]
+    gStart = numpy.cumsum(gCount) - gCount
+    cand = cand[numpy.repeat(oldStart - gStart, gCount) + numpy.arange(len(cand))]
+
+    return (keys, rkeys, win, rev, gRow, gWeight, gStart, cand)
+
+
+def _sweep(work, receipts):
+    """ One Gauss-Seidel sweep over the block. Return the largest change. """
+
+    maxErr = 0.0
+    for keys, rkeys, win, rev, gRow, gWeight, gStart, cand in receipts:
+        sm = win.astype(numpy.float64)
+        if len(cand):
+            v = work[cand & _INDEX_MASK]
+            v = numpy.where(cand >= EXTRA_TURN, v, 1.0 - v)
+            best = numpy.maximum.reduceat(v, gStart)
+            sm += numpy.bincount(gRow, weights=best * gWeight, minlength=len(sm))
+
+        a, b = sm[0::2], sm[1::2]
+        p1 = rev[0::2].astype(numpy.float64)
+        p2 = rev[1::2].astype(numpy.float64)
+        x = (16 * a + p1 * (16 - b - p2)) / (256.0 - p1 * p2)
+        y = (b + p2 * (1 - x)) / 16.0
+
+        err = max(numpy.abs(work[keys] - x).max(), numpy.abs(work[rkeys] - y).max())
+        if err > maxErr:
+            maxErr = err
+        work[keys] = x
+        work[rkeys] = y
+    return maxErr
+
+
+def _workBuffer(db):
+    if db.readonly():
+        raise ValueError("database is read-only")
+    return numpy.frombuffer(db.db, dtype=numpy.float64)
+
+
+def initGameOver(db):
+    """ Set the probabilities of all positions where the game is over (1 if Green won, 0 if Red
+    did). """
+
+    _needNumpy()
+    work = _workBuffer(db)
+    for g in range(7):
+        work[slice(*blockRange(7, g))] = 1.0
+        work[slice(*blockRange(g, 7))] = 0.0
+
+
+def _solveRace(work, keys, rkeys, pips, graph):
+    """ Solve race pairs (sorted by total pip count) with a single update each. """
+
+    levels = [0] + (numpy.flatnonzero(numpy.diff(pips)) + 1).tolist() + [len(pips)]
+    for a, b in zip(levels[:-1], levels[1:]):
+        for i in range(a, b, _CHUNK):
+            j = min(i + _CHUNK, b)
+            _sweep(work, [_receipts(keys[i:j], rkeys[i:j], graph)])
+
+
+def solveRace(db, gOff, rOff, graph=None):
+    """ Solve the race positions (see :py:func:`royalur.urcore.typeBearOff`) with *gOff*/*rOff*
+    pieces off, and their reverse, in ``db``. Return the number of pairs solved.
+
+    In a race every move brings a piece closer to home without hitting, so it lowers the total pip
+    count of the board, and every position only depends on positions with fewer pips (and on its
+    own reverse, which the pair update handles). Updating the pairs once each, in order of their
+    pip count, gives the exact probabilities without any iteration. As in :py:func:`solveBlock`,
+    all blocks with more pieces off must have been solved already.
+    """
+
+    _needNumpy()
+    keys, rkeys, pips, race = _blockPairs(gOff, rOff)
+    _solveRace(_workBuffer(db), keys[race], rkeys[race], pips[race], graph)
+    return int(race.sum())
+
+
+def solveBlock(db, gOff, rOff, graph=None, tolerance=TOLERANCE, report=None, progress=None):
+    """ Solve all positions with *gOff*/*rOff* pieces off (and their reverse) in ``db``, which must
+    be writable and hold float64 values.
+
+    Race pairs are solved first, exactly, by :py:func:`solveRace`, and then stay fixed while the
+    other pairs are iterated.
+
+    All blocks with more pieces off must have been solved already. If given, ``graph`` (a
+    :py:class:`royalur.successors.SuccessorGraph` covering those positions) supplies the moves, and
+    ``report`` is called as ``report(gOff, rOff, sweep, maxError)`` after every sweep. Progress is
+    recorded in ``progress`` (a :py:class:`royalur.checkpoint.Checkpoint`), and when resuming the
+    block the sweeps continue from there. Return the number of sweeps.
+    """
+
+    _needNumpy()
+    if not (0 <= gOff < 7 and 0 <= rOff < 7):
+        raise ValueError("no moves with {0}/{1} pieces off".format(gOff, rOff))
+
+    sweep = 0
+    maxErr = 1.0
+    if progress is not None:
+        sweep = progress.start([(gOff, rOff)])
+        maxErr = progress.maxError
+
+    work = _workBuffer(db)
+    if maxErr > tolerance:
+        keys, rkeys, pips, race = _blockPairs(gOff, rOff)
+        _solveRace(work, keys[race], rkeys[race], pips[race], graph)
+        keys, rkeys = keys[~race], rkeys[~race]
+        receipts = [_receipts(keys[i:i + _CHUNK], rkeys[i:i + _CHUNK], graph)
+                    for i in range(0, len(keys), _CHUNK)]
+        del keys, rkeys
+
+    while maxErr > tolerance:
+        sweep += 1
+        maxErr = _sweep(work, receipts)
+        if progress is not None:
+            progress.swept(sweep, maxErr)
+        if report:
+            report(gOff, rOff, sweep, maxErr)
+    if progress is not None:
+        progress.finish()
+    return sweep
+
+
+def solve(db=None, graph=None, tolerance=TOLERANCE, report=None, progress=None):
+    """ Compute the winning probabilities of all positions, block by block from the end of the game
+    back. Return the database (a new one unless given).
+
+    ``graph``, ``report`` and ``progress`` are passed to :py:func:`solveBlock`. Blocks listed as
+    done in ``progress`` are skipped.
+    """
+
+    if db is None:
+        db = PositionsWinProbs()
+    initGameOver(db)
+    for gm in range(6, -1, -1):
+        for rm in range(gm, -1, -1):
+            if progress is None or (gm, rm) not in progress.done:
+                solveBlock(db, gm, rm, graph, tolerance, report, progress)
+    return db
+
+
+def dependencyWaves():
+    """ List of waves, in the order they are solved. A wave is a list of ``(gOff, rOff)`` blocks
+    (with ``rOff <= gOff``) which can be solved independently of each other. """
+
+    return [[(gm, s - gm) for gm in range(6, -1, -1) if 0 <= s - gm <= gm]
+            for s in range(12, -1, -1)]
+
+
+def _worker(conn, shared, graphFile):
+    """ Worker process of :py:func:`solveParallel`. Updates race pairs once each (``("race",
+    [(keys, rkeys), ...])``, answered with the number of pairs), builds the receipts of its share
+    of the other pairs (``("load", [(block, keys, rkeys), ...])``), then sweeps them on request
+    (``("sweep", blocks)``, answered with the largest change of each block) until sent None. """
+
+    work = _workBuffer(PositionsWinProbs(buffer=shared))
+    graph = SuccessorGraph(graphFile) if graphFile else None
+    receipts = dict()
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            break
+        command, arg = msg
+        if command == "race":
+            _sweep(work, [_receipts(keys, rkeys, graph) for keys, rkeys in arg])
+            conn.send(sum(len(keys) for keys, _ in arg))
+        elif command == "load":
+            receipts = dict()
+            for block, keys, rkeys in arg:
+                receipts.setdefault(block, []).append(_receipts(keys, rkeys, graph))
+            conn.send(len(arg))
+        elif command == "sweep":
+            conn.send(dict((block, _sweep(work, receipts.get(block, []))) for block in arg))
+    conn.close()
+
+
+def _split(count, n):
+    """ Ranges splitting ``count`` items in chunks of at most _CHUNK, at least ``n`` of them if
+    possible. """
+
+    size = max(1, min(_CHUNK, -(-count // n)))
+    return [(i, min(i + size, count)) for i in range(0, count, size)]
+
+
+def _raceParallel(workers, keys, rkeys, pips):
+    """ :py:func:`_solveRace` with each pip count level split among ``workers``. Pairs of a level
+    only depend on lower levels, so the workers only wait for each other between levels. The pairs
+    may come from several blocks of a wave. """
+
+    order = numpy.argsort(pips, kind="stable")
+    keys, rkeys, pips = keys[order], rkeys[order], pips[order]
+    levels = [0] + (numpy.flatnonzero(numpy.diff(pips)) + 1).tolist() + [len(pips)]
+    n = len(workers)
+    for lo, hi in zip(levels[:-1], levels[1:]):
+        shares = [[] for _ in workers]
+        for j, (a, b) in enumerate(_split(hi - lo, n)):
+            shares[j % n].append((keys[lo + a:lo + b], rkeys[lo + a:lo + b]))
+        busy = [(conn, share) for (_, conn), share in zip(workers, shares) if share]
+        for conn, share in busy:
+            conn.send(("race", share))
+        for conn, _ in busy:
+            conn.recv()
+
+
+def solveParallel(db=None, processes=None, graph=None, tolerance=TOLERANCE, report=None,
+                  waves=None, progress=None):
+    """ Same as :py:func:`solve`, with the work of each wave split among ``processes`` worker
+    processes (default one per CPU).
+
+    The probabilities are moved to shared memory (see
+    :py:meth:`royalur.probsdb.PositionsWinProbs.shareMemory`) first. Workers update them in place as
+    they go, so one sweep may already use values another worker computed during it. Race pairs are
+    split among the workers too, one pip count level at a time (see :py:func:`solveRace`). A block
+    is done when no probability in it changed by more than ``tolerance`` in a sweep, as in
+    :py:func:`solveBlock`. ``waves`` (default :py:func:`dependencyWaves`) limits the blocks solved.
+    ``progress`` is used as in :py:func:`solve`, with the blocks of a wave in progress together.
+    """
+
+    _needNumpy()
+    if db is None:
+        db = PositionsWinProbs()
+    shared = db.shareMemory()
+    initGameOver(db)
+
+    n = processes or multiprocessing.cpu_count()
+    graphFile = graph.filename if graph is not None else None
+    workers = []
+    try:
+        for _ in range(n):
+            conn, child = multiprocessing.Pipe()
+            p = multiprocessing.Process(target=_worker, args=(child, shared, graphFile))
+            p.daemon = True
+            p.start()
+            workers.append((p, conn))
+
+        for wave in (dependencyWaves() if waves is None else waves):
+            sweep = 0
+            if progress is not None:
+                wave = [block for block in wave if block not in progress.done]
+                sweep = progress.start(wave)
+                if sweep and progress.maxError <= tolerance:
+                    wave = []
+            if not wave:
+                if progress is not None:
+                    progress.finish()
+                continue
+
+            # deal chunks of the pairs round-robin, so every worker has pairs of all pip counts
+            shares = [[] for _ in workers]
+            races = []
+            for block in wave:
+                keys, rkeys, pips, race = _blockPairs(*block)
+                races.append((keys[race], rkeys[race], pips[race]))
+                keys, rkeys = keys[~race], rkeys[~race]
+                for j, (a, b) in enumerate(_split(len(keys), n)):
+                    shares[j % n].append((block, keys[a:b], rkeys[a:b]))
+                del keys, rkeys
+            _raceParallel(workers, *[numpy.concatenate(x) for x in zip(*races)])
+            del races
+            for (_, conn), share in zip(workers, shares):
+                conn.send(("load", share))
+            for _, conn in workers:
+                conn.recv()
+
+            active = list(wave)
+            while active:
+                sweep += 1
+                for _, conn in workers:
+                    conn.send(("sweep", active))
+                errors = dict.fromkeys(active, 0.0)
+                for _, conn in workers:
+                    for block, err in conn.recv().items():
+                        errors[block] = max(errors[block], err)
+                if progress is not None:
+                    progress.swept(sweep, max(errors.values()))
+                if report:
+                    for block in active:
+                        report(block[0], block[1], sweep, errors[block])
+                active = [block for block in active if errors[block] > tolerance]
+            if progress is not None:
+                progress.finish()
+    finally:
+        for p, conn in workers:
+            if p.is_alive():
+                conn.send(None)
+            p.join()
+    return db
@@ -0,0 +1,172 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+===============
+Successor graph
+===============
+
+The game graph stored once on disk: for every position (index) and dice roll, the indices of all
+boards reachable by a legal move, exactly as :py:func:`royalur.urcore.allMoves` would return them
+(including the "no-move" reversed board, and in the same order). Solvers and searches can then walk
+the graph without generating moves or converting boards at all.
+
+The file is in CSR (compressed sparse row) form, little-endian:
+
+::
+
+  header   magic "URSG", version (uint32), first index, number of positions, number of edges
+           (uint64 each)
+  offsets  uint64 [positions + 1], start of the edges of each position
+  counts   uint8 [5 * positions], number of edges of each (position, pips) pair
+  edges    uint32 [edges], successor index, bit 31 set when the move gives an extra turn
+
+The edges of a position are ordered by pips, so the edges of ``(index, pips)`` start at
+``offsets[index - first]`` plus the counts of the smaller rolls.
+
+Positions where the game is over have no successors. The file for the full game space is big
+(about 11GB); build it with ``scripts/makegraph.py``.
+"""
+from __future__ import absolute_import
+
+import array
+import mmap
+import struct
+import sys
+
+from .urcore import TOTAL_POSITIONS
+from .bitboard import bitsGameOver, bitsMoveIndices, index2Bits
+
+__all__ = ["SuccessorGraph", "buildSuccessorGraph", "appendEdges", "EXTRA_TURN"]
+
+EXTRA_TURN = 1 << 31
+"""Flag bit of an edge whose move gives the mover an extra turn."""
+
+_INDEX_MASK = EXTRA_TURN - 1
+
+_HEADER = struct.Struct("<4sIQQQ")
+_MAGIC = b"URSG"
+_VERSION = 1
+
+# Positions handled per round when building.
+_CHUNK = 1 << 16
+
+
+def _littleEndian(a):
+    if sys.byteorder != "little":
+        a.byteswap()
+    return a
+
+
+def appendEdges(index, counts, edges):
+    """ Append the five edge counts of position ``index`` to ``counts`` (a bytearray) and its edges
+    to ``edges`` (an ``array('I')``).
+
+    Moves and their indices come from the packed board (:py:mod:`royalur.bitboard`), which is several
+    times faster than going through the list board, ``allMoves`` and ``board2Index``.
+    """
+
+    bb = index2Bits(index)
+    if bitsGameOver(bb):
+        counts.extend(b"\x00" * 5)
+        return
+    for pips in range(5):
+        mi = bitsMoveIndices(bb, pips)
+        counts.append(len(mi))
+        edges.extend([i | EXTRA_TURN if e else i for i, e in mi])
+
+
+def buildSuccessorGraph(filename, start=0, stop=TOTAL_POSITIONS, report=None):
+    """ Build the successor graph of positions [start, stop) and write it to ``filename``.
+
+    If given, ``report`` is called with the number of positions done after every chunk.
+    """
+
+    count = stop - start
+    countsPos = _HEADER.size + 8 * (count + 1)
+    edgesPos = countsPos + 5 * count
+    nEdges = 0
+
+    with open(filename, "w+b") as f:
+        for first in range(start, stop, _CHUNK):
+            last = min(first + _CHUNK, stop)
+            offsets = array.array("Q")
+            counts = bytearray()
+            edges = array.array("I")
+            for index in range(first, last):
+                offsets.append(nEdges + len(edges))
+                appendEdges(index, counts, edges)
+
+            f.seek(_HEADER.size + 8 * (first - start))
+            f.write(_littleEndian(offsets).tobytes())
+            f.seek(countsPos + 5 * (first - start))
+            f.write(counts)
+            f.seek(edgesPos + 4 * nEdges)
+            f.write(_littleEndian(edges).tobytes())
+            nEdges += len(edges)
+            if report:
+                report(last - start)
+
+        f.seek(_HEADER.size + 8 * count)
+        f.write(struct.pack("<Q", nEdges))
+        f.seek(0)
+        f.write(_HEADER.pack(_MAGIC, _VERSION, start, count, nEdges))
+
+
+class SuccessorGraph(object):
+    """ A successor graph file, memory-mapped (read-only). """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, "rb") as f:
+            self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.start, self.count, self.nEdges = _HEADER.unpack_from(self.buf, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError("{0} is not a successor graph".format(filename))
+
+        o0 = _HEADER.size
+        c0 = o0 + 8 * (self.count + 1)
+        e0 = c0 + 5 * self.count
+        if len(self.buf) != e0 + 4 * self.nEdges:
+            raise ValueError("corrupt {0}".format(filename))
+        view = memoryview(self.buf)
+        self.counts = view[c0:e0]
+        if sys.byteorder == "little":
+            self.offsets = view[o0:c0].cast("Q")
+            self.edges = view[e0:].cast("I")
+        else:
+            self.offsets = _littleEndian(array.array("Q", self.buf[o0:c0]))
+            self.edges = _littleEndian(array.array("I", self.buf[e0:]))
+
+
+    def __contains__(self, index):
+        return self.start <= index < self.start + self.count
+
+
+    def row(self, index, pips):
+        """ Raw edges (uint32, successor index with the :py:data:`EXTRA_TURN` bit) of ``index`` for
+        a roll of ``pips``. """
+
+        k = index - self.start
+        c = 5 * k
+        first = self.offsets[k] + sum(self.counts[c:c + pips])
+        return self.edges[first:first + self.counts[c + pips]]
+
+
+    def successors(self, index, pips):
+        """ List of ``(successorIndex, extraTurn)`` pairs, the indices of :py:func:`allMoves`.
+        Empty when the game is over. """
+
+        return [(v & _INDEX_MASK, v >= EXTRA_TURN) for v in self.row(index, pips)]
@@ -0,0 +1,114 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+""" This script converts a probabilities database between formats (see royalur.probsdb): float64,
+float32, 16-bit, 12-bit or 8-bit entries, compressed or not.
+
+It then reports what the conversion costs: the maximum and mean error of the probabilities, and how
+many positions would be played differently, i.e. where for some roll the best move according to
+the new database is not a best move according to the reference (by default the source). Moves are
+compared on a random sample of positions, or on all of them with --all (use a --graph then).
+"""
+from __future__ import print_function
+from __future__ import absolute_import
+
+import argparse
+import os.path
+import sys
+
+from royalur import TOTAL_POSITIONS, royalURdataDir, PositionsWinProbs
+from royalur.probsdb import compareValues
+from royalur.successors import SuccessorGraph
+from royalur.policy import moveChanges
+from royalur import policy
+
+
+def main():
+    parser = argparse.ArgumentParser(description="""Convert a ROGOUR probabilities database.""")
+
+    parser.add_argument("--format", "-f", choices=("d", "f", "H", "T", "B"),
+                        help="Entries: float64, float32, 16-bit, 12-bit or 8-bit (default: as the "
+                        "source).")
+    parser.add_argument("--compression", choices=("zlib", "lzma"), help="Save compressed.")
+    parser.add_argument("--compact", action="store_true",
+                        help="Leave out the positions where the game is over.")
+
+    parser.add_argument("--reference", metavar="FILE",
+                        help="Compare with this database (default: the source).")
+    parser.add_argument("--graph", metavar="FILE", help="Successor graph of all positions.")
+    parser.add_argument("--sample", type=int, default=100000, metavar="N",
+                        help="Compare moves in N random positions.")
+    parser.add_argument("--all", action="store_true", help="Compare moves in all positions.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random sample.")
+
+    parser.add_argument("--profile", action="store_true", help="Print where the time went on exit.")
+
+    parser.add_argument("source", metavar="FILE", nargs="?",
+                        default=os.path.join(royalURdataDir, "db16.bin"),
+                        help="Database to convert.")
+    parser.add_argument("output", metavar="FILE", help="Output file.")
+
+    options = parser.parse_args()
+    if options.profile:
+        from royalur import instrument
+        instrument.profileAtExit(globals())
+
+    db = PositionsWinProbs(options.source, useMmap=True)
+    db.formatchar = options.format or db.formatchar
+    db.compression = options.compression
+    db.compact = options.compact
+    db.save(options.output)
+
+    ref = PositionsWinProbs(options.reference or options.source, useMmap=True)
+    new = PositionsWinProbs(options.output, useMmap=True)
+
+    def report(done):
+        print("{0} {1}%".format(done, int(100.0 * done / TOTAL_POSITIONS)), end="\r")
+        sys.stdout.flush()
+
+    size = os.path.getsize(options.output)
+    refSize = os.path.getsize(options.reference or options.source)
+    print("{0}: {1} bytes, {2:.1f}% of the reference".format(options.output, size,
+                                                             100.0 * size / refSize))
+
+    errors = compareValues(new, ref, report=report)
+    print()
+    print("max error {0:.3g}, mean error {1:.3g} over {2} positions, {3} with a value in only one"
+          .format(errors["maxError"], errors["meanError"], errors["count"], errors["missing"]))
+
+    numpy = policy.numpy
+    if numpy is None:
+        print("comparing moves requires numpy")
+        return
+
+    graph = SuccessorGraph(options.graph) if options.graph else None
+    if options.all:
+        chunks = (numpy.arange(first, min(first + (1 << 16), TOTAL_POSITIONS), dtype=numpy.uint32)
+                  for first in range(0, TOTAL_POSITIONS, 1 << 16))
+    else:
+        rnd = numpy.random.RandomState(options.seed)
+        rows = numpy.unique(rnd.randint(0, TOTAL_POSITIONS, options.sample).astype(numpy.uint32))
+        chunks = (rows[k:k + (1 << 16)] for k in range(0, len(rows), 1 << 16))
+
+    changed = total = 0
+    for rows in chunks:
+        changed += int(moveChanges(new, ref, rows, graph).sum())
+        total += len(rows)
+    print("{0} of {1} positions ({2:.4f}%) play a worse move".format(changed, total,
+                                                                     100.0 * changed / total))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+""" This script serves a probabilities database from shared memory: it loads the file once, and the
+tools on the same host (with ROYALUR_SHM set to the segment name) attach to it instead of loading
+their own copy. The segment is removed when the server is stopped (Ctrl-C or SIGTERM).
+"""
+from __future__ import print_function
+from __future__ import absolute_import
+
+import argparse
+import os.path
+import signal
+import sys
+
+from royalur import royalURdataDir
+from royalur.probsdb import SHARED_NAME, shareDatabase
+
+
+def main():
+    parser = argparse.ArgumentParser(description="""Serve a ROGOUR database from shared memory.""")
+
+    parser.add_argument("--name", default=SHARED_NAME, help="Name of the shared memory segment.")
+
+    parser.add_argument("db", metavar="FILE", nargs="?",
+                        default=os.path.join(royalURdataDir, "db16.bin"),
+                        help="Probabilities database.")
+
+    options = parser.parse_args()
+
+    def stop(signum, frame):
+        sys.exit(0)
+    signal.signal(signal.SIGTERM, stop)
+
+    shm = shareDatabase(options.db, options.name)
+    try:
+        print("serving {0} as {1}, ROYALUR_SHM={1}".format(options.db, options.name))
+        sys.stdout.flush()
+        while True:
+            signal.pause()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+if __name__ == "__main__":
+    main()
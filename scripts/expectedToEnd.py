@@ -23,12 +23,14 @@ from __future__ import absolute_import
 from royalur import *
 from royalur import play
 from royalur.humanStrategies import totPips2s, totPips1s
+from royalur.checkpoint import Checkpoint, loadCheckpoint
 
+import argparse
 import os.path
 import sys
 from functools import reduce
 
-db = PositionsWinProbs(os.path.join(royalURdataDir, "db16.bin"))
+db = openDatabase(os.path.join(royalURdataDir, "db16.bin"))
 ishtar = getDBplayer(db)
 
 
@@ -140,19 +142,45 @@ def playr(b, N):
 
 
 def main():
+    parser = argparse.ArgumentParser(description="""Compute the expected number of turns to the
+    end of the game.""")
+
+    parser.add_argument("--checkpoint", metavar="FILE",
+                        help="Save progress to this file every now and then (deleted when done).")
+    parser.add_argument("--interval", type=float, default=600, metavar="SECONDS",
+                        help="Time between checkpoints.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue from the last --checkpoint.")
+    parser.add_argument("--profile", action="store_true",
+                        help="Print where the time went on exit.")
+
+    args = parser.parse_args()
+    if args.resume and not args.checkpoint:
+        parser.error("--resume needs a --checkpoint file")
+    if args.profile:
+        from royalur import instrument
+        instrument.profileAtExit(globals())
+
     exvals = bytearray(b'\xff') * 4*TOTAL_POSITIONS
 
-    for g in range(7):
-        for b in positionsIterator(7, g):
-            setv(exvals, board2Index(b), 0.0)
-            rb = reverseBoard(b)
-            setv(exvals, board2Index(rb), 0.0)
+    if args.resume:
+        progress = loadCheckpoint(args.checkpoint, exvals, args.interval)
+        print("resuming, {0} blocks done".format(len(progress.done)))
+    else:
+        progress = Checkpoint(args.checkpoint, args.interval)
+        for g in range(7):
+            for b in positionsIterator(7, g):
+                setv(exvals, board2Index(b), 0.0)
+                rb = reverseBoard(b)
+                setv(exvals, board2Index(rb), 0.0)
 
     frct = None
 
     fnbase = "ex.02"
     gm = 0
     for rm in range(gm, -1, -1):
+        if (gm, rm) in progress.done:
+            continue
         del frct
         added = []
         print(gm, rm)
@@ -183,8 +211,8 @@ def main():
                 sys.stdout.flush()
         print()
 
-        rnd = 0
-        maxe = 1
+        rnd = progress.start([(gm, rm)])
+        maxe = progress.maxError
         while maxe > 1e-5:
             rnd += 1
             print("round", rnd, '(', gm, rm, ')')
@@ -215,10 +243,18 @@ def main():
                     setv(exvals, rkey, e2)
                 print()
                 print(maxe, dif, dif/(2*tot))
+            progress.swept(rnd, maxe)
+            if progress.due():
+                progress.save(exvals)
+
+        progress.finish()
+        if progress.filename:
+            progress.save(exvals)
 
         f = open(fnbase + ".inpro.bin", "wb")
         f.write(exvals)
         f.close()
+    progress.remove()
 
 
 if __name__ == "__main__":
@@ -15,14 +15,23 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 """ This script creates the winning probabilities database for ROGOUR.
-It will take a veeeeerrrry long time and eat your computer memory.
-It is here for educational purposes.
+
+By default the work is done by :py:mod:`royalur.solver` (numpy required), which takes a few hours.
+The plain Python loop below does the same thing; it will take a veeeeerrrry long time and eat your
+computer memory, and it is here for educational purposes (``--python``).
 """
 from __future__ import print_function
 from __future__ import absolute_import
 
-from royalur import allMoves, gameOver, positionsIterator, reverseBoard, PositionsWinProbs
+import argparse
+
+from royalur import allMoves, gameOver, reverseBoard, typeBearOff
+from royalur import blockRanges, boardChunks, unpackBoards
+from royalur import PositionsWinProbs
 from royalur.humanStrategies import totPips2s
+from royalur.successors import SuccessorGraph
+from royalur.checkpoint import Checkpoint, loadCheckpoint
+from royalur import solver
 
 
 def ply1PartsFullRecpt(board, reversed_board, db):
@@ -95,28 +104,37 @@ def ply1bfr(recpt, db):
 
 def halfList(db, gm, rm):
     updateSet = set()
-    for board in positionsIterator(gm, rm):
-        key = db.board2key(board)
-        rboard = reverseBoard(board)
-        rkey = db.board2key(rboard)
-        if rkey not in updateSet:
-            updateSet.add(key)
-            yield (totPips2s(board), key, rkey,
-                   ply1BothFullRecpt(board, rboard, db))
+    for first, boards in boardChunks(gm, rm):
+        # keys are indices, and the chunk is in index order
+        for key, board in enumerate(unpackBoards(boards), first):
+            rboard = reverseBoard(board)
+            rkey = db.board2key(rboard)
+            if rkey not in updateSet:
+                updateSet.add(key)
+                yield (totPips2s(board), key, rkey,
+                       ply1BothFullRecpt(board, rboard, db))
 
 
-def main():
-    db = PositionsWinProbs()
+def checkpoint(db, progress):
+    if progress.due():
+        progress.save(db.db)
+        print("checkpoint saved to {0}".format(progress.filename))
 
-    for g in range(7):
-        for board in positionsIterator(7, g):
-            db.set(db.board2key(board), 1)
-            db.set(db.board2key(reverseBoard(board)), 0)
 
-    fnbase = "db"
+def pythonSolve(db, progress):
+    # Game over: Green won in the (7, g) blocks, and the reversed positions are the (g, 7) blocks.
+    for g in range(7):
+        for _, _, _, _, start, stop in blockRanges(7, g):
+            for key in range(start, stop):
+                db.set(key, 1)
+        for _, _, _, _, start, stop in blockRanges(g, 7):
+            for key in range(start, stop):
+                db.set(key, 0)
 
     for gm in range(6, -1, -1):
         for rm in range(gm, -1, -1):
+            if (gm, rm) in progress.done:
+                continue
             print(gm, rm)
 
             # Heuristic: sort positions by total (X+O) pip count. The total pip count is a good
@@ -124,14 +142,29 @@ def main():
             # closer to game end are more likely to update first, speeding up convergence.
             #
             updateList = sorted(halfList(db, gm, rm), key=lambda i2: i2[0])
+
+            # Race pairs only depend on pairs with fewer pips, so in this order a single pass
+            # gives their exact values, and they stay fixed during the rounds below.
+            rest = []
+            for item in updateList:
+                _totalPips, key, rkey, data = item
+                if typeBearOff(db.key2board(key)):
+                    p1, p2 = ply1bfr(data, db)
+                    db.set(key,  p1)
+                    db.set(rkey, p2)
+                else:
+                    rest.append(item)
+            print("{0} race position pairs.".format(len(updateList) - len(rest)))
+            updateList = rest
+
             total = len(updateList)
-            tenth = total // 10
+            tenth = max(1, total // 10)
             print("{0} position pairs.".format(total))
             print()
 
             count = 0
-            iteration_round = 1
-            maximum_error = 1.0
+            iteration_round = progress.start([(gm, rm)]) + 1
+            maximum_error = progress.maxError
             while maximum_error > 1.0e-12:
                 print("round {0} ({1} {2})".format(iteration_round, gm, rm))
                 maximum_error = 0.0
@@ -147,10 +180,68 @@ def main():
                     if count % tenth == 0:
                         print("{0} {1} {2}".format(count, int(100.0 * count / total), maximum_error))
                 count = 0
+                progress.swept(iteration_round, maximum_error)
                 iteration_round += 1
                 print("{0} {1}".format(maximum_error, total))
+                checkpoint(db, progress)
+            progress.finish()
             del updateList
-    db.save("{0}.inpro.bin".format(fnbase))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="""Create the winning probabilities database.""")
+
+    parser.add_argument("--graph", metavar="FILE",
+                        help="Read moves from this successor graph (see makegraph.py).")
+    parser.add_argument("--python", action="store_true",
+                        help="Use the (very slow) pure Python solver.")
+    parser.add_argument("--processes", "-j", type=int, default=1, metavar="N",
+                        help="Number of worker processes (0 for one per CPU).")
+    parser.add_argument("--checkpoint", metavar="FILE",
+                        help="Save progress to this file every now and then (deleted when done).")
+    parser.add_argument("--interval", type=float, default=600, metavar="SECONDS",
+                        help="Time between checkpoints.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue from the last --checkpoint.")
+    parser.add_argument("--profile", action="store_true",
+                        help="Print where the time went on exit.")
+    parser.add_argument("--compression", choices=("zlib", "lzma"),
+                        help="Save compressed (see royalur.probsdb).")
+    parser.add_argument("--compact", action="store_true",
+                        help="Leave out the positions where the game is over (see royalur.probsdb).")
+    parser.add_argument("output", nargs="?", default="db.inpro.bin", help="Database file name.")
+
+    args = parser.parse_args()
+    if args.resume and not args.checkpoint:
+        parser.error("--resume needs a --checkpoint file")
+    if args.profile:
+        from royalur import instrument
+        instrument.profileAtExit(globals())
+
+    db = PositionsWinProbs()
+    if args.resume:
+        progress = loadCheckpoint(args.checkpoint, db.db, args.interval)
+        print("resuming, {0} blocks done".format(len(progress.done)))
+    else:
+        progress = Checkpoint(args.checkpoint, args.interval)
+
+    def report(gm, rm, sweep, maximum_error):
+        print("round {0} ({1} {2}) {3}".format(sweep, gm, rm, maximum_error))
+        checkpoint(db, progress)
+
+    if args.python or solver.numpy is None:
+        pythonSolve(db, progress)
+    else:
+        graph = SuccessorGraph(args.graph) if args.graph else None
+        if args.processes == 1:
+            solver.solve(db, graph, report=report, progress=progress)
+        else:
+            solver.solveParallel(db, args.processes or None, graph, report=report,
+                                 progress=progress)
+    db.compression = args.compression
+    db.compact = args.compact
+    db.save(args.output)
+    progress.remove()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,61 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+""" This script builds the successor graph of ROGOUR (see royalur.successors): for every position
+and dice roll, the indices of all positions reachable by a move. Build it once, and solvers and
+searches can memory-map it instead of generating moves.
+"""
+from __future__ import print_function
+from __future__ import absolute_import
+
+import argparse
+import os.path
+import sys
+
+from royalur import TOTAL_POSITIONS, royalURdataDir
+from royalur.successors import buildSuccessorGraph
+
+
+def main():
+    parser = argparse.ArgumentParser(description="""Build the ROGOUR successor graph.""")
+
+    parser.add_argument("--start", type=int, default=0, help="First position index.")
+
+    parser.add_argument("--stop", type=int, default=TOTAL_POSITIONS,
+                        help="One past the last position index.")
+
+    parser.add_argument("graph", metavar="FILE", nargs="?",
+                        default=os.path.join(royalURdataDir, "successors.bin"),
+                        help="Output file.")
+
+    parser.add_argument("--profile", action="store_true", help="Print where the time went on exit.")
+
+    options = parser.parse_args()
+    if options.profile:
+        from royalur import instrument
+        instrument.profileAtExit(globals())
+
+    total = options.stop - options.start
+
+    def report(done):
+        print("{0} {1}%".format(done, int(100.0 * done / total)), end="\r")
+        sys.stdout.flush()
+
+    buildSuccessorGraph(options.graph, options.start, options.stop, report)
+    print()
+
+
+if __name__ == "__main__":
+    main()
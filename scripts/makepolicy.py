@@ -0,0 +1,63 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+""" This script builds the policy table of ROGOUR (see royalur.policy): the best move of every
+position and roll according to a probabilities database. Play from it with
+royalur.play.getPolicyPlayer.
+"""
+from __future__ import print_function
+from __future__ import absolute_import
+
+import argparse
+import os.path
+import sys
+
+from royalur import TOTAL_POSITIONS, royalURdataDir, PositionsWinProbs
+from royalur.policy import buildPolicy
+from royalur.successors import SuccessorGraph
+
+
+def main():
+    parser = argparse.ArgumentParser(description="""Build the ROGOUR policy table.""")
+
+    parser.add_argument("--db", metavar="FILE", default=os.path.join(royalURdataDir, "db16.bin"),
+                        help="Probabilities database (memory-mapped).")
+
+    parser.add_argument("--graph", metavar="FILE", help="Successor graph of all positions.")
+
+    parser.add_argument("policy", metavar="FILE", nargs="?",
+                        default=os.path.join(royalURdataDir, "policy.bin"),
+                        help="Output file.")
+
+    parser.add_argument("--profile", action="store_true", help="Print where the time went on exit.")
+
+    options = parser.parse_args()
+    if options.profile:
+        from royalur import instrument
+        instrument.profileAtExit(globals())
+
+    db = PositionsWinProbs(options.db, useMmap=True)
+    graph = SuccessorGraph(options.graph) if options.graph else None
+
+    def report(done):
+        print("{0} {1}%".format(done, int(100.0 * done / TOTAL_POSITIONS)), end="\r")
+        sys.stdout.flush()
+
+    buildPolicy(db, options.policy, graph, report=report)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -21,74 +21,104 @@ WARNING: This will take some time. You can download the files from XXXX.
 from __future__ import print_function
 from __future__ import absolute_import
 
+import argparse
+import array
+import multiprocessing
 import os.path
 
 from royalur import *
 
+# Set before the workers are forked (see levels)
+_levels = None
+_level = None
+_successors = None
+_nShards = None
+
+def _expand(k):
+  """ Indices not seen yet which are reached from the positions of the current level in shard k,
+  each once (in increasing order), so that little goes back through the pipe. """
+
+  found = set()
+  for start, stop in shardRanges(k, _nShards):
+    i = _levels.find(_level, start, stop)
+    while i >= 0:
+      board = index2Board(i)
+      if not gameOver(board):
+        for ib in _successors(board):
+          if not _levels[ib]:
+            found.add(ib)
+      i = _levels.find(_level, i + 1, stop)
+  return array.array('I', sorted(found))
+
+def levels(successors, processes):
+  """ BFS from the start position, following successors(board). The level of each position
+  (0 if unreachable) as a bytearray.
+
+  Each level is split into shards of the index space (see royalur.urcore.shardRanges) which are
+  expanded by processes workers. """
+
+  global _levels, _level, _successors, _nShards
+
+  _levels = bytearray(b'\x00') * TOTAL_POSITIONS
+  _levels[board2Index(startPosition())] = 1
+  _successors = successors
+  _nShards = 4 * processes if processes > 1 else 1
+  tot = 1
+  level = 1
+  while True:
+    _level = level
+    if processes > 1:
+      # fork every level, so the workers see the levels so far
+      pool = multiprocessing.get_context("fork").Pool(processes)
+      try:
+        shards = pool.map(_expand, range(_nShards))
+      finally:
+        pool.close()
+        pool.join()
+    else:
+      shards = [_expand(0)]
+    added = 0
+    for found in shards:
+      for ib in found:
+        if not _levels[ib]:
+          _levels[ib] = level + 1
+          added += 1
+    print(level,tot,added)
+    if added == 0 :
+      break
+    tot += added
+    level += 1
+  return _levels
+
 def main():
-  db = PositionsWinProbs(os.path.join(royalURdataDir, "db16.bin"))
+  parser = argparse.ArgumentParser(description="""Compute the seen and reached levels of all
+  positions.""")
+
+  parser.add_argument("--processes", "-p", type=int, default=1,
+                      help="Number of worker processes.")
+
+  options = parser.parse_args()
+
+  db = openDatabase(os.path.join(royalURdataDir, "db16.bin"))
   ishtar = getDBplayer(db)
 
-  if not os.path.exists(os.path.join(royalURdataDir, "iplay-levels.bin")):
-    bseen = bytearray(b'\x00') * TOTAL_POSITIONS
-    bseen[board2Index(startPosition())] = 1
-    tot = 1
-    level = 1
-    while True:
-      added = 0
-      for i in range(TOTAL_POSITIONS) :
-        assert bseen[i] <= level+1
-        if bseen[i] == level:
-          board = index2Board(i)
-          if not gameOver(board):
-            for dice in range(5) :
-              am = allMoves(board, dice)
-              mv = ishtar(am);         assert len(mv) == 1
-              b,e = mv[0]
-              ib = board2Index(b)
-              if not bseen[ib]:
-                bseen[ib] = level + 1
-                added += 1
-      print(level,tot,added)
-      if added == 0 :
-        break
-      tot += added
-      level += 1
-
-    f = open(os.path.join(royalURdataDir, "iplay-levels.bin"), 'wb')
-    f.write(bseen)
-    f.close()
-    del bseen
-
-  if not os.path.exists(os.path.join(royalURdataDir, "ireached-levels.bin")):
-    breached = bytearray(b'\x00') * TOTAL_POSITIONS
-    breached[board2Index(startPosition())] = 1
-    tot = 1
-    level = 1
-    while True:
-      added = 0
-      for i in range(TOTAL_POSITIONS) :
-        assert breached[i] <= level+1
-        if breached[i] == level:
-          board = index2Board(i)
-          if not gameOver(board):
-            for dice in range(5) :
-              for mv in allMoves(board, dice) :
-                b,e = mv
-                ib = board2Index(b)
-                if not breached[ib]:
-                  breached[ib] = level + 1
-                  added += 1
-      print(level,tot,added)
-      if added == 0 :
-        break
-      tot += added
-      level += 1
-
-    f = open(os.path.join(royalURdataDir, "ireached-levels.bin"), 'wb')
-    f.write(breached)
-    f.close()
-    del breached
+  def bestPlay(board):
+    for dice in range(5) :
+      mv = ishtar(allMoves(board, dice));      assert len(mv) == 1
+      yield board2Index(mv[0][0])
+
+  def allPlay(board):
+    bb = board2Bits(board)
+    for dice in range(5) :
+      for ib,e in bitsMoveIndices(bb, dice) :
+        yield ib
+
+  for name, successors in (("iplay-levels.bin", bestPlay), ("ireached-levels.bin", allPlay)):
+    filename = os.path.join(royalURdataDir, name)
+    if not os.path.exists(filename):
+      f = open(filename, 'wb')
+      f.write(levels(successors, options.processes))
+      f.close()
 
 if __name__ == "__main__":
   main()
@@ -35,17 +35,18 @@ setuptools.setup(
         "Operating System :: Microsoft :: Windows",
         "Operating System :: POSIX :: Linux",
         "Programming Language :: Python",
-        "Programming Language :: Python :: 2",
-        "Programming Language :: Python :: 2.7",
         "Programming Language :: Python :: 3",
+        "Programming Language :: Python :: 3 :: Only",
         "Topic :: Games/Entertainment :: Board Games"
     ],
-    packages=setuptools.find_packages(),
+    python_requires=">=3.5",
+    packages=setuptools.find_packages(exclude=["benchmarks"]),
     include_package_data=True,
     ext_modules=[module1],
     entry_points={
         "console_scripts": [
             "printGame=royalur.cli.printGame:main",
+            "urserver=royalur.cli.urserver:main",
             "curses-gui=royalur.cli.cursesGUI:main [curses]"
         ],
         "gui_scripts": [
@@ -54,7 +55,8 @@ setuptools.setup(
     },
     extras_require={
         "curses": ["windows-curses;platform_system=='Windows'"],
-        "Pillow": ["Pillow"]
+        "Pillow": ["Pillow"],
+        "numpy": ["numpy"]
     },
     command_options={
         "build_sphinx": {
@@ -0,0 +1,67 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import
+
+import gc
+import unittest
+
+from royalur.urcore import *
+import benchmarks
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_run(self):
+        def setup():
+            boards = benchmarks.samplePositions(10)
+            return lambda: [reverseBoard(b) for b in boards]
+
+        r = benchmarks.runBenchmark(setup, 10, 2, minTime=0.01)
+        self.assertTrue(r["seconds"] > 0 and r["median"] >= r["seconds"])
+        self.assertEqual(r["ops"], 10)
+        self.assertTrue(r["peakBytes"] > 0)
+        self.assertEqual(benchmarks.samplePositions(10), benchmarks.samplePositions(10))
+
+
+    def test_gc(self):
+        # all timed calls, warm-up included, run without the garbage collector
+        states = []
+        benchmarks.runBenchmark(lambda: lambda: states.append(gc.isenabled()), 1, 3, minTime=0.01)
+        self.assertTrue(gc.isenabled())
+        # the last call only measures memory
+        self.assertFalse(any(states[:-1]))
+        # a single repeat is a single timed call
+        states = []
+        r = benchmarks.runBenchmark(lambda: lambda: states.append(1), 1, 1)
+        self.assertEqual((len(states), r["calls"]), (2, 1))
+
+
+    def test_selected(self):
+        self.assertTrue(benchmarks.selected("urcore.allMoves", False))
+        self.assertFalse(benchmarks.selected("probsdb.load", True))
+        self.assertTrue(benchmarks.selected("probsdb.load", True, ["probsdb"]))
+        self.assertFalse(benchmarks.selected("urcore.allMoves", False, ["probsdb"]))
+
+
+    def test_compare(self):
+        base = {"results": {"a": {"seconds": 1.0}, "b": {"seconds": 1.0}, "c": {"seconds": 1.0}}}
+        new = {"results": {"a": {"seconds": 1.05}, "b": {"seconds": 1.5}, "d": {"seconds": 1.0}}}
+        rows = benchmarks.compare(new, base, threshold=0.1)
+        self.assertEqual(sorted((name, regression) for name, _, _, _, regression in rows),
+                         [("a", False), ("b", True)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import
+
+import unittest
+
+import random
+
+from royalur.urcore import *
+from royalur.bitboard import *
+
+
+class TestBitboard(unittest.TestCase):
+    def oneBoard(self, i):
+        b = index2Board(i)
+        bb = board2Bits(b)
+        self.assertEqual(bits2Board(bb), b)
+        self.assertEqual(index2Bits(i), bb)
+        self.assertEqual(bits2Index(bb), i)
+        self.assertEqual(bitsReverse(bb), board2Bits(reverseBoard(b)))
+        self.assertEqual(bitsHomes(bb), homes(b))
+        self.assertEqual(bitsGameOver(bb), gameOver(b))
+        self.assertEqual(bitsTypeBearOff(bb), typeBearOff(b))
+        if not gameOver(b):
+            for pips in range(5):
+                am = allMoves(b, pips)
+                self.assertEqual(bitsAllMoves(bb, pips), [(board2Bits(m), e) for m, e in am],
+                                 (b, pips))
+                self.assertEqual(bitsMoveIndices(bb, pips), [(board2Index(m), e) for m, e in am])
+        else:
+            self.assertRaises(ValueError, bitsAllMoves, bb, 1)
+
+
+    def test_start(self):
+        self.assertEqual(board2Bits(startPosition()), 0)
+        self.oneBoard(board2Index(startPosition()))
+
+
+    def test_random(self):
+        for _ in range(5000):
+            self.oneBoard(random.randrange(TOTAL_POSITIONS))
+
+
+    def test_invalid(self):
+        b = index2Board(random.randrange(TOTAL_POSITIONS))
+        self.assertRaises(ValueError, bits2Index, 1 << 34)
+        # a Green and a Red piece on the same strip square
+        self.assertRaises(ValueError, bits2Board, (1 << 5) | (1 << (14 + 5)))
+        self.assertRaises(ValueError, index2Bits, TOTAL_POSITIONS)
+        self.assertRaises(ValueError, bitsAllMoves, board2Bits(b), 5)
+        b[14] = 8
+        self.assertRaises(ValueError, board2Bits, b)
+
+
+    def test_blocks(self):
+        for g in range(8):
+            for r in range(8):
+                for i, b in enumerate(positionsIterator(g, r)):
+                    if i == 200:
+                        break
+                    self.oneBoard(board2Index(b))
+
+
+if __name__ == "__main__":
+    unittest.main()
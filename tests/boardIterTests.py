@@ -22,7 +22,7 @@ import random
 
 from royalur.urcore import *
 from royalur.binomhack import bmap
-from royalur.urcore import nPositionsOff, bitsIterator
+from royalur.urcore import nPositionsOff, bitsIterator, GR_OFF, RD_OFF
 
 
 class TestCore(unittest.TestCase):
@@ -51,6 +51,55 @@ class TestCore(unittest.TestCase):
                 self.assertEqual(nPositionsOff[g, r], n, (g, r, n, nPositionsOff[g, r]))
                 self.assertEqual(len(allb), n, (g, r, n, len(allb)))
 
+    def test_blockRanges(self):
+        # ranges tile the whole index space, in order
+        at = 0
+        for g, r, gHome, rHome, start, stop in blockRanges():
+            self.assertEqual(start, at)
+            self.assertLess(start, stop)
+            at = stop
+        self.assertEqual(at, TOTAL_POSITIONS)
+
+        for g in range(7, 3, -1):
+            for r in range(7, 3, -1):
+                ranges = list(blockRanges(g, r))
+                self.assertEqual(sum(x[5] - x[4] for x in ranges), nPositionsOff[g, r])
+                indices = set(board2Index(b) for b in positionsIterator(g, r))
+                self.assertEqual(indices, set(i for x in ranges for i in range(x[4], x[5])))
+
+    def test_boardChunks(self):
+        for g, r in ((7, 7), (6, 5), (5, 5), (4, 6)):
+            n = 0
+            for first, boards in boardChunks(g, r, size=1000):
+                self.assertEqual(len(boards) % 22, 0)
+                for k in range(0, len(boards), 22):
+                    b = list(boards[k:k + 22])
+                    self.assertEqual(board2Index(b), first + k // 22)
+                    self.assertEqual((b[GR_OFF], b[RD_OFF]), (g, r))
+                    n += 1
+            self.assertEqual(n, nPositionsOff[g, r])
+
+    def test_shards(self):
+        for n in (1, 5, 64):
+            shards = [shardRanges(k, n) for k in range(n)]
+            sizes = [sum(stop - start for start, stop in s) for s in shards]
+            self.assertEqual(sum(sizes), TOTAL_POSITIONS)
+            self.assertLessEqual(max(sizes) - min(sizes), 1)
+            ranges = [x for s in shards for x in s]
+            for (_, stop), (start, _) in zip(ranges, ranges[1:]):
+                self.assertLessEqual(stop, start)
+
+        with self.assertRaises(ValueError):
+            shardRanges(3, 3)
+
+        indices = []
+        for k in range(3):
+            for i, b in iterShard(k, 3, 5, 4, size=500):
+                self.assertEqual(board2Index(b), i)
+                indices.append(i)
+        self.assertEqual(indices, sorted(set(indices)))
+        self.assertEqual(len(indices), nPositionsOff[5, 4])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -64,6 +64,38 @@ class TestCore(unittest.TestCase):
                 l[i] = 1
 
 
+    def test_batch(self):
+        indices = list(range(0, TOTAL_POSITIONS, 9973)) + [TOTAL_POSITIONS - 1]
+        boards = [index2Board(i) for i in indices]
+        packed = indices2Boards(indices)
+        self.assertEqual(unpackBoards(packed), boards)
+        self.assertEqual(boards2Indices(packed).tolist(), indices)
+        self.assertEqual(boards2Indices(boards).tolist(), indices)
+        with self.assertRaises(ValueError):
+            indices2Boards([TOTAL_POSITIONS])
+
+
+    def test_batchTypes(self):
+        import array
+        from royalur import irogaur
+
+        packed = indices2Boards([0, 1, 2])
+        # same bytes, wrong item types: rejected, not reinterpreted
+        with self.assertRaises(TypeError):
+            boards2Indices(array.array("h", packed.tobytes()))
+        with self.assertRaises(TypeError):
+            irogaur.boards2Indices(packed, array.array("b", bytes(12)))
+        with self.assertRaises(TypeError):
+            irogaur.indices2Boards(array.array("i", [0, 1, 2]), array.array("b", bytes(66)))
+        with self.assertRaises(TypeError):
+            irogaur.indices2Boards(array.array("I", [0, 1, 2]), array.array("q", bytes(72)))
+        with self.assertRaises(TypeError):
+            irogaur.rangeBoards(0, array.array("h", bytes(44)))
+
+        # bytes are fine for boards
+        self.assertEqual(boards2Indices(packed.tobytes()).tolist(), [0, 1, 2])
+
+
     def test_cov_full(self):
         l = bytearray(b"\x00") * TOTAL_POSITIONS
         for g in range(7):
@@ -0,0 +1,85 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import
+
+import unittest
+
+import array
+import os
+import shutil
+import tempfile
+
+from royalur.checkpoint import Checkpoint, loadCheckpoint
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.fname = os.path.join(self.tmpdir, "db.ckpt")
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+    def test_roundTrip(self):
+        values = array.array("d", [x / 7. for x in range(1000)])
+        cp = Checkpoint(self.fname)
+        cp.start([(6, 6)])
+        cp.swept(1, 0.25)
+        cp.finish()
+        self.assertEqual(cp.start([(6, 5)]), 0)
+        cp.swept(12, 1e-9)
+        cp.save(values)
+        self.assertEqual(os.listdir(self.tmpdir), ["db.ckpt"])
+
+        loaded = array.array("d", bytes(8 * len(values)))
+        cp = loadCheckpoint(self.fname, loaded)
+        self.assertEqual(loaded, values)
+        self.assertEqual((cp.done, cp.current, cp.sweep, cp.maxError),
+                         ([(6, 6)], [(6, 5)], 12, 1e-9))
+        # resuming the same block continues the count, a different one starts over
+        self.assertEqual(cp.start([(6, 5)]), 12)
+        self.assertEqual(cp.start([(6, 4), (5, 5)]), 0)
+
+
+    def test_size(self):
+        Checkpoint(self.fname).save(bytearray(16))
+        with self.assertRaises(ValueError):
+            loadCheckpoint(self.fname, bytearray(8))
+        with open(self.fname, "wb") as f:
+            f.write(b"not a checkpoint")
+        with self.assertRaises(ValueError):
+            loadCheckpoint(self.fname, bytearray(16))
+
+
+    def test_due(self):
+        self.assertFalse(Checkpoint().due())
+        self.assertTrue(Checkpoint(self.fname, interval=0).due())
+        self.assertFalse(Checkpoint(self.fname, interval=3600).due())
+
+
+    def test_remove(self):
+        cp = Checkpoint(self.fname)
+        cp.save(bytearray(16))
+        cp.remove()
+        self.assertEqual(os.listdir(self.tmpdir), [])
+        cp.remove()
+        Checkpoint().remove()
+
+
+if __name__ == "__main__":
+    unittest.main()
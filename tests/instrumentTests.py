@@ -0,0 +1,103 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import
+
+import unittest
+
+import random
+import subprocess
+import sys
+
+from royalur import urcore, play, humanStrategies, instrument, solver
+from royalur.probsdb import PositionsWinProbs
+from royalur.urcore import *
+
+
+class TestInstrument(unittest.TestCase):
+    def tearDown(self):
+        instrument.disable()
+        instrument.reset()
+
+
+    def test_counts(self):
+        originals = (urcore.allMoves, play.allMoves, play.hplay, play.rolloutPlay.__defaults__,
+                     list(humanStrategies.strategies))
+        calls = []
+        instrument.enable(lambda name, dt: calls.append(name))
+        self.assertTrue(instrument.enabled())
+        self.assertIsNot(play.allMoves, originals[1])
+
+        random.seed(1)
+        play.rollout(startPosition(), 5)
+        counters = instrument.snapshot()
+        self.assertEqual(counters["moves.allMoves"]["calls"], calls.count("moves.allMoves"))
+        self.assertTrue(counters["moves.allMoves"]["calls"] > 0)
+        self.assertTrue(counters["strategy.bestHumanStrategySoFar"]["calls"] > 0)
+        self.assertTrue(counters["strategy.hitAny"]["calls"] > 0)
+        self.assertTrue(all(c["seconds"] >= 0 for c in counters.values()))
+
+        instrument.disable()
+        self.assertFalse(instrument.enabled())
+        self.assertEqual((urcore.allMoves, play.allMoves, play.hplay, play.rolloutPlay.__defaults__,
+                          humanStrategies.strategies), originals)
+        # counters are kept, and stay put
+        play.rollout(startPosition(), 5)
+        self.assertEqual(instrument.snapshot(), counters)
+        instrument.reset()
+        self.assertEqual(instrument.snapshot(), {})
+
+
+    def test_points(self):
+        # every declared call site holds the function, so that enabling replaces it
+        for name, owner, attr, sites in instrument._points():
+            f = vars(owner)[attr]
+            for place, key in instrument._places(owner, attr, sites, None):
+                self.assertIs(getattr(place, key), f, (name, place, key))
+
+        allMoves = urcore.allMoves
+        namespace = {"allMoves": allMoves, "other": allMoves}
+        instrument.enable(namespace=namespace)
+        # only the name the function is known by
+        self.assertIs(namespace["other"], allMoves)
+        namespace["allMoves"](startPosition(), 2)
+        self.assertEqual(instrument.snapshot()["moves.allMoves"]["calls"], 1)
+        instrument.disable()
+        self.assertIs(namespace["allMoves"], allMoves)
+
+
+    def test_lazy(self):
+        # importing the module imports none of the modules it instruments
+        code = ("import sys; import royalur.instrument; "
+                "print(' '.join(m for m in ('royalur.server', 'royalur.solver', 'royalur.search')"
+                " if m in sys.modules))")
+        out = subprocess.check_output([sys.executable, "-c", code])
+        self.assertEqual(out.strip(), b"")
+
+
+    @unittest.skipIf(solver.numpy is None, "requires numpy")
+    def test_solver(self):
+        # the default makedb path
+        db = PositionsWinProbs()
+        solver.initGameOver(db)
+        instrument.enable()
+        solver.solveBlock(db, 6, 6)
+        counters = instrument.snapshot()
+        for name in ("solver.blockPairs", "solver.receipts", "solver.sweep"):
+            self.assertTrue(counters[name]["calls"] > 0, name)
+
+
+if __name__ == "__main__":
+    unittest.main()
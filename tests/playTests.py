@@ -0,0 +1,49 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import
+
+import unittest
+
+from royalur.urcore import *
+from royalur.dice import PipsSource
+from royalur.play import playGame, pitStrategies
+
+
+class TestDice(unittest.TestCase):
+    def test_source(self):
+        rolls = PipsSource(3, blockSize=100).block(16000)
+        counts = [rolls.count(p) for p in range(5)]
+        for c, w in zip(counts, (1, 4, 6, 4, 1)):
+            self.assertLess(abs(c - 1000 * w), 200)
+
+        a, b = PipsSource(9, blockSize=64), PipsSource(9, blockSize=64)
+        self.assertEqual([a() for _ in range(500)], list(b.block(7)) + [b() for _ in range(493)])
+        self.assertNotEqual(PipsSource(9).split(1).block(50), PipsSource(9).split(2).block(50))
+        self.assertEqual(PipsSource(9).split(1).block(50), PipsSource(9).split(1).block(50))
+
+
+    def test_games(self):
+        first = lambda moves: moves[:1]
+        r1, r2 = [], []
+        playGame(first, first, record=r1, dice=PipsSource(4))
+        playGame(first, first, record=r2, dice=PipsSource(4))
+        self.assertEqual(r1, r2)
+        self.assertEqual(sum(pitStrategies(lambda m: m[:1], lambda m: m[-1:], 10,
+                                           dice=PipsSource(4))), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
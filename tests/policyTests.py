@@ -0,0 +1,115 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import
+
+import unittest
+
+import array
+import os
+import shutil
+import tempfile
+
+from royalur.urcore import *
+from royalur.probsdb import PositionsWinProbs
+from royalur.play import choose, getDBmove, getPolicyPlayer
+from royalur.humanStrategies import bestHumanStrategySoFar
+from royalur.policy import Policy, buildPolicy, moveChanges, UNKNOWN
+from royalur import solver
+
+
+@unittest.skipIf(solver.numpy is None, "requires numpy")
+class TestPolicy(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = PositionsWinProbs()
+        solver.initGameOver(cls.db)
+        solver.solveBlock(cls.db, 6, 6)
+        solver.solveBlock(cls.db, 6, 5)
+        solver.solveBlock(cls.db, 5, 5)
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.fname = os.path.join(cls.tmpdir, "policy.bin")
+        start, stop = solver.blockRange(5, 5)
+        buildPolicy(cls.db, cls.fname, start=start, stop=stop)
+        cls.policy = Policy(cls.fname)
+
+
+    @classmethod
+    def tearDownClass(cls):
+        del cls.policy
+        shutil.rmtree(cls.tmpdir)
+
+
+    def value(self, move):
+        b, e = move
+        p = self.db.aget(b)
+        return p if e else 1 - p
+
+
+    def test_best(self):
+        for board in positionsIterator(5, 5):
+            for pips in range(1, 5):
+                am = allMoves(board, pips)
+                m = self.policy.move(board, pips)
+                self.assertEqual(m, am[self.policy.rank(board2Index(board), pips)]
+                                 if len(am) > 1 else am[0])
+                self.assertEqual(self.value(m), max(self.value(x) for x in am))
+
+
+    def test_unknown(self):
+        # not built
+        board = [0]*22
+        board[0], board[4], board[14], board[21] = 1, 1, 5, 4
+        self.assertEqual(self.policy.rank(board2Index(board), 1), UNKNOWN)
+        self.assertIsNone(self.policy.move(board, 1))
+        # the player falls back to the human-like player
+        player = getPolicyPlayer(self.fname)
+        am = allMoves(board, 1)
+        self.assertEqual(choose(player, board, 1, am), bestHumanStrategySoFar(am))
+        self.assertEqual(player(am), bestHumanStrategySoFar(am))
+
+
+    def test_player(self):
+        player = getPolicyPlayer(self.policy)
+        for board in positionsIterator(5, 5):
+            for pips in range(1, 5):
+                am = allMoves(board, pips)
+                if len(am) > 1:
+                    self.assertEqual(choose(player, board, pips, am),
+                                     [self.policy.move(board, pips, am)])
+                    # with the moves alone, as a database player
+                    m, = player(am)
+                    self.assertEqual(self.value(m), self.value(getDBmove(am, self.db)[0]))
+
+
+    def test_moveChanges(self):
+        start, stop = solver.blockRange(5, 5)
+        rows = solver.numpy.arange(start, stop, dtype=solver.numpy.uint32)
+        self.assertFalse(moveChanges(self.db, self.db, rows).any())
+
+        class Worst(object):
+            # every move has the value of its opposite, the worst move looks best
+            def take(_, indices):
+                return array.array("d", [1 - p for p in self.db.take(indices)])
+
+        changed = moveChanges(Worst(), self.db, rows)
+        for i, board in zip(rows.tolist(), unpackBoards(indices2Boards(rows.tolist()))):
+            worse = any(len(set(self.value(m) for m in allMoves(board, pips))) > 1
+                        for pips in range(1, 5))
+            self.assertEqual(changed[i - start], worse, board)
+
+
+if __name__ == "__main__":
+    unittest.main()
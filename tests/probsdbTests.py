@@ -0,0 +1,237 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import
+
+import unittest
+
+import array
+import mmap
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+
+from royalur.urcore import *
+from royalur.probsdb import PositionsWinProbs, openDatabase, shareDatabase, shared_memory, \
+    compareValues, COMPACT_POSITIONS
+from royalur.probsdb import _compress, _decompress, _encode, _formatOfSize, _itemSizes, _nbytes, \
+    _Z_HEADER, _Z_MAGIC, _Z_VERSION, _TERMINAL, lzma
+
+# A handful of (index, 16-bit value) pairs written into an otherwise all-zero database.
+SAMPLES = ((0, 65534), (1, 65535), (board2Index(startPosition()), 32767),
+           (TOTAL_POSITIONS // 2, 12345), (TOTAL_POSITIONS - 1, 65535))
+
+
+class TestProbsDB(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.fname = os.path.join(self.tmpdir, "db16.bin")
+        with open(self.fname, "wb") as f:
+            f.truncate(2 * TOTAL_POSITIONS)
+            for i, v in SAMPLES:
+                f.seek(2 * i)
+                f.write(struct.pack(">H", v))
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+    def test_mmap(self):
+        db = PositionsWinProbs(self.fname, useMmap=True)
+        self.assertEqual(db.formatchar, "H")
+        self.assertTrue(db.readonly())
+        for i, v in SAMPLES:
+            if v == 65535:
+                self.assertEqual(db.get(i), None)
+            else:
+                self.assertEqual(db.get(i), v / 65535.)
+        self.assertEqual(db.get(2), 0.0)
+        self.assertEqual(db.aget(startPosition()), 32767 / 65535.)
+        with self.assertRaises(ValueError):
+            db.set(0, 0.5)
+
+
+    def test_load_save(self):
+        mdb = PositionsWinProbs(self.fname, useMmap=True)
+        db = PositionsWinProbs(self.fname)
+        self.assertEqual(db.formatchar, "H")
+        self.assertFalse(db.readonly())
+        for i, _ in SAMPLES:
+            self.assertEqual(db.get(i), mdb.get(i))
+
+        db.formatchar = "d"
+        db.set(2, 0.125)
+        fname = os.path.join(self.tmpdir, "db.bin")
+        db.save(fname)
+        self.assertEqual(os.path.getsize(fname), 8 * TOTAL_POSITIONS)
+        db = PositionsWinProbs(fname, useMmap=True)
+        self.assertEqual(db.formatchar, "d")
+        self.assertEqual(db.get(2), 0.125)
+        for i, _ in SAMPLES:
+            self.assertEqual(db.get(i), mdb.get(i))
+
+
+    def test_compressed(self):
+        db = PositionsWinProbs(self.fname, useMmap=True)
+        db.compression = "zlib"
+        fname = os.path.join(self.tmpdir, "db16z.bin")
+        db.save(fname)
+        self.assertLess(os.path.getsize(fname), TOTAL_POSITIONS // 100)
+
+        zdb = PositionsWinProbs(fname, useMmap=True)
+        self.assertEqual((zdb.formatchar, zdb.compression), ("H", "zlib"))
+        self.assertTrue(zdb.readonly())
+        indices = [i for i, _ in SAMPLES] + [2, 16383, 16384]
+        for i in indices:
+            self.assertEqual(zdb.get(i), db.get(i))
+        self.assertEqual(zdb.take(indices).tobytes(), db.take(indices).tobytes())
+        start = board2Index(startPosition()) - 10000
+        self.assertEqual(zdb.chunk(start, start + 20000).tolist(),
+                         db.chunk(start, start + 20000).tolist())
+
+        # only the last blocks used are kept
+        zdb.db.cacheBlocks = 2
+        zdb.db.cache.clear()
+        for i in indices:
+            zdb.get(i)
+        self.assertEqual(list(zdb.db.cache), [i // zdb.db.blockSize for i in indices[-2:]])
+
+        db.compression = "gzip"
+        with self.assertRaises(ValueError):
+            db.save(fname)
+
+
+    def test_quantized(self):
+        db = PositionsWinProbs(self.fname, useMmap=True)
+        indices = [i for i, _ in SAMPLES] + [2, 3]
+        for formatchar, size, tolerance in (("T", 3 * TOTAL_POSITIONS // 2, 0.5 / 4094),
+                                            ("B", TOTAL_POSITIONS, 0.005)):
+            db.formatchar = formatchar
+            fname = os.path.join(self.tmpdir, "db" + formatchar)
+            db.save(fname)
+            self.assertEqual(os.path.getsize(fname), size)
+
+            qdb = PositionsWinProbs(fname, useMmap=True)
+            self.assertEqual(qdb.formatchar, formatchar)
+            for i, v in SAMPLES:
+                if v == 65535:
+                    self.assertEqual(qdb.get(i), None)
+                else:
+                    self.assertAlmostEqual(qdb.get(i), v / 65535., delta=tolerance)
+            # 0 and 1 are exact
+            self.assertEqual(qdb.get(2), 0.0)
+            self.assertEqual(qdb.take(indices).tobytes(),
+                             array.array("d", [qdb.db[i] for i in indices]).tobytes())
+            self.assertEqual(qdb.chunk(5, 20).tobytes(),
+                             array.array("d", [qdb.db[i] for i in range(5, 20)]).tobytes())
+
+            errors = compareValues(qdb, db, 0, 1 << 21)
+            self.assertEqual(errors["missing"], 0)
+            self.assertEqual(errors["count"], (1 << 21) - 1)
+            self.assertLessEqual(errors["maxError"], tolerance)
+            self.assertLess(errors["meanError"], 1e-6)
+
+
+    def test_codecs(self):
+        values = [k / 1000. for k in range(1000)] + [float("NaN"), 0.25] * 100
+        for formatchar in ("B", "T", "H", "f", "d"):
+            raw = _encode(array.array("d", values), formatchar)
+            for codec in ("zlib", "lzma") if lzma else ("zlib",):
+                self.assertEqual(_decompress(_compress(raw, formatchar, codec), formatchar, codec),
+                                 raw)
+
+
+    def test_formatOfSize(self):
+        # the format of a plain file is told by its size alone
+        sizes = [_nbytes(formatchar, TOTAL_POSITIONS) for formatchar in _itemSizes]
+        self.assertEqual(len(set(sizes)), len(sizes))
+        for formatchar, size in zip(_itemSizes, sizes):
+            self.assertEqual(_formatOfSize(size), formatchar)
+        self.assertIsNone(_formatOfSize(2 * TOTAL_POSITIONS + 1))
+
+
+    def test_compact(self):
+        db = PositionsWinProbs(self.fname)
+        for g in range(7):
+            for _, _, _, _, start, stop in blockRanges(7, g):
+                db.db[start:stop] = array.array("d", [1.0]) * (stop - start)
+            for _, _, _, _, start, stop in blockRanges(g, 7):
+                db.db[start:stop] = array.array("d", [0.0]) * (stop - start)
+        db.compact = True
+        fname = os.path.join(self.tmpdir, "db16c.bin")
+        db.save(fname)
+        self.assertEqual(os.path.getsize(fname), 2 * COMPACT_POSITIONS)
+        self.assertEqual(_formatOfSize(2 * COMPACT_POSITIONS), "H")
+
+        # around every range left out, and the samples
+        indices = [i for i, _ in SAMPLES] + [2]
+        for start, stop, _ in _TERMINAL:
+            indices += [start - 1, start, stop - 1, stop % TOTAL_POSITIONS]
+        for compression in (None, "zlib"):
+            db.compression = compression
+            db.save(fname)
+            for useMmap in (True, False):
+                cdb = PositionsWinProbs(fname, useMmap=useMmap)
+                self.assertTrue(cdb.compact)
+                self.assertEqual(cdb.compression, compression)
+                self.assertEqual([cdb.get(i) for i in indices], [db.get(i) for i in indices])
+                self.assertEqual(cdb.take(indices).tobytes(), db.take(indices).tobytes())
+                start = _TERMINAL[0][0] - 100
+                self.assertEqual(cdb.chunk(start, start + 5000).tobytes(),
+                                 db.chunk(start, start + 5000).tobytes())
+                self.assertEqual(cdb.chunk(TOTAL_POSITIONS - 500, TOTAL_POSITIONS).tobytes(),
+                                 db.chunk(TOTAL_POSITIONS - 500, TOTAL_POSITIONS).tobytes())
+
+
+    def test_plainWithMagic(self):
+        # a plain file starting like a compressed one is still plain
+        with open(self.fname, "r+b") as f:
+            f.write(_Z_HEADER.pack(_Z_MAGIC, _Z_VERSION, b"H", 0, 1 << 13, TOTAL_POSITIONS))
+        for useMmap in (True, False):
+            db = PositionsWinProbs(self.fname, useMmap=useMmap)
+            self.assertEqual((db.formatchar, db.compression), ("H", None))
+            self.assertEqual(db.get(0), struct.unpack(">H", _Z_MAGIC[:2])[0] / 65535.)
+
+
+    @unittest.skipIf(shared_memory is None, "requires multiprocessing.shared_memory")
+    def test_shared(self):
+        name = "royalur-test-{0}".format(os.getpid())
+        shm = shareDatabase(self.fname, name)
+        try:
+            db = PositionsWinProbs(shared=name)
+            self.assertEqual(db.formatchar, "H")
+            self.assertTrue(db.readonly())
+            for i, v in SAMPLES:
+                self.assertEqual(db.get(i), None if v == 65535 else v / 65535.)
+
+            # clients exiting leave the segment alone
+            code = ("from royalur.probsdb import PositionsWinProbs;"
+                    "print(PositionsWinProbs(shared={0!r}).get(0))".format(name))
+            out = subprocess.check_output([sys.executable, "-c", code])
+            self.assertEqual(float(out), 65534 / 65535.)
+            self.assertEqual(openDatabase(self.fname, shared=name).get(0), 65534 / 65535.)
+        finally:
+            shm.close()
+            shm.unlink()
+
+        self.assertTrue(isinstance(openDatabase(self.fname, shared=name).db.buf, mmap.mmap))
+
+
+if __name__ == "__main__":
+    unittest.main()
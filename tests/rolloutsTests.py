@@ -0,0 +1,110 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import
+
+import unittest
+
+import multiprocessing
+
+from royalur.urcore import *
+from royalur.play import getDBplayer
+from royalur.rollouts import rolloutStats, compareMoves, pipCountEvaluator, parallelRollout
+from royalur import rollouts
+
+
+def lastPieces():
+    """ One piece each on the last square. Green wins with probability 4/7. """
+
+    board = [0]*22
+    board[13], board[20], board[14], board[21] = 1, -1, 6, 6
+    return board
+
+
+class TestRollouts(unittest.TestCase):
+    def test_plain(self):
+        p, se, var = rolloutStats(lastPieces(), 2000, seed=11)
+        self.assertLess(abs(p - 4 / 7.), 4 * se)
+        self.assertAlmostEqual(var, p * (1 - p), places=3)
+        self.assertEqual((p, se, var), rolloutStats(lastPieces(), 2000, seed=11))
+
+        p, se, var = rolloutStats(lastPieces(), 1000, seed=11, antithetic=True)
+        self.assertLess(abs(p - 4 / 7.), 4 * se)
+
+
+    def test_control(self):
+        # With the exact probability as evaluator, luck explains every result.
+        p, se, var = rolloutStats(lastPieces(), 200, seed=3, evaluator=lambda b: 4 / 7.)
+        self.assertAlmostEqual(p, 4 / 7., places=12)
+        self.assertLess(var, 1e-20)
+
+        p0, _, var0 = rolloutStats(startPosition(), 100, seed=3)
+        p1, _, var1 = rolloutStats(startPosition(), 100, seed=3, evaluator=pipCountEvaluator)
+        self.assertLess(var1, var0)
+
+
+    def test_commonDice(self):
+        board = startPosition()
+        moves = allMoves(board, 2)
+        stats = compareMoves([moves[0], moves[0]], 100, seed=5)
+        self.assertEqual(stats[0][:3], stats[1][:3])
+        self.assertEqual(stats[1][3], 0)
+
+        b = [0]*22
+        b[0], b[5], b[9], b[14], b[21] = 1, 1, -1, 4, 5
+        b[15] = -1
+        moves = allMoves(b, 2)
+        self.assertEqual(len(moves), 3)
+        stats = compareMoves(moves, 200, seed=5)
+        for p, se, var, diffSe in stats[1:]:
+            self.assertLess(diffSe, se + stats[0][1])
+
+
+    def test_parallel(self):
+        p, se = parallelRollout(lastPieces(), 4000, processes=2, seed=7, chunk=500)
+        self.assertLess(abs(p - 4 / 7.), 4 * se)
+        self.assertEqual((p, se), parallelRollout(lastPieces(), 4000, processes=1, seed=7,
+                                                  chunk=500))
+
+        p, se = parallelRollout(startPosition(), 200, processes=1, seed=1, chunk=64)
+        self.assertTrue(0 < p < 1 and 0 < se < 0.1)
+        self.assertEqual((p, se), parallelRollout(startPosition(), 200, processes=1, seed=1,
+                                                  chunk=64))
+
+
+    def test_noFork(self):
+        getContext = multiprocessing.get_context
+
+        def noFork(method=None):
+            if method == "fork":
+                raise ValueError("cannot find context for 'fork'")
+            return getContext(method)
+
+        # a lambda player cannot be sent to spawned workers: played here, with the same result
+        player = getDBplayer(None)
+        rollouts.multiprocessing.get_context = noFork
+        try:
+            self.assertIsNone(rollouts._workerContext((player, None, None)))
+            self.assertIsNotNone(rollouts._workerContext((None, None, None)))
+            result = parallelRollout(lastPieces(), 300, player, player, processes=2, seed=7,
+                                     chunk=100)
+        finally:
+            rollouts.multiprocessing.get_context = getContext
+        self.assertEqual(result, parallelRollout(lastPieces(), 300, player, player, processes=1,
+                                                 seed=7, chunk=100))
+
+
+if __name__ == "__main__":
+    unittest.main()
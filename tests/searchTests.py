@@ -0,0 +1,86 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import
+
+import unittest
+
+from royalur.urcore import *
+from royalur.play import prob
+from royalur.rollouts import pipCountEvaluator
+from royalur.search import Search, probStar
+
+
+class PipCountDB(object):
+    """ Stands in for the probabilities database. """
+
+    def aget(self, board):
+        return pipCountEvaluator(board)
+
+
+def somePositions():
+    b = [0]*22
+    b[0], b[5], b[9], b[14], b[21] = 1, 1, -1, 4, 5
+    b[15] = -1
+    return [startPosition(), b, code2Board(board2Code(reverseBoard(b)))]
+
+
+class TestSearch(unittest.TestCase):
+    def test_prob(self):
+        db = PipCountDB()
+        search = Search(db)
+        for board in somePositions():
+            for ply in range(3):
+                self.assertEqual(search.prob(board, ply), prob(board, ply, db))
+        stats = search.stats()
+        self.assertTrue(stats["hits"] > 0 and 0 < stats["hitRate"] < 1)
+        self.assertEqual(stats["size"], stats["misses"])
+
+
+    def test_table(self):
+        board = somePositions()[1]
+        search = Search(pipCountEvaluator, tableSize=50)
+        p = search.prob(board, 3)
+        self.assertEqual(len(search.table), 50)
+        search.clear()
+        self.assertEqual(search.stats()["hits"], 0)
+        self.assertEqual(Search(pipCountEvaluator).prob(board, 3), p)
+
+
+class TestStar(unittest.TestCase):
+    def test_values(self):
+        db = PipCountDB()
+        for board in somePositions():
+            for ply in range(4):
+                p = prob(board, ply, db)
+                self.assertEqual(probStar(board, ply, db)[0], p)
+                self.assertEqual(probStar(board, ply, db, probing=False)[0], p)
+
+
+    def test_nodes(self):
+        def visited(board, ply):
+            if ply == 0:
+                return 1
+            return 1 + sum(visited(b, ply-1) for pips in range(5)
+                           for b, e in allMoves(board, pips) if not gameOver(b))
+
+        board = somePositions()[1]
+        self.assertEqual(probStar(board, 0, pipCountEvaluator), (pipCountEvaluator(board), 1))
+        p, nodes = probStar(board, 3, pipCountEvaluator)
+        self.assertTrue(nodes < visited(board, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import
+
+import unittest
+
+import asyncio
+import json
+
+from royalur.urcore import *
+from royalur.play import getDBmove, prob
+from royalur.rollouts import pipCountEvaluator
+from royalur.server import Evaluator, startServer
+
+
+class PipCountDB(object):
+    """ Stands in for the probabilities database. """
+
+    def get(self, index):
+        return pipCountEvaluator(index2Board(index))
+
+    def aget(self, board):
+        return pipCountEvaluator(board)
+
+
+def somePositions():
+    b = [0]*22
+    b[0], b[5], b[9], b[14], b[21] = 1, 1, -1, 4, 5
+    b[15] = -1
+    return [startPosition(), b, reverseBoard(b)]
+
+
+class TestEvaluator(unittest.TestCase):
+    def test_evaluate(self):
+        db = PipCountDB()
+        boards = somePositions()
+        positions = [board2Code(boards[0]), board2Index(boards[1]), board2Code(boards[2])]
+        results = Evaluator(db).evaluate(positions, moves=True, ply=1)
+        for board, r in zip(boards, results):
+            self.assertEqual(r["index"], board2Index(board))
+            self.assertEqual(code2Board(r["code"]), board)
+            self.assertEqual(r["winProb"], db.aget(board))
+            self.assertEqual(r["ply"], prob(board, 1, db))
+            self.assertIsNone(r["moves"][0])
+            for pips in range(1, 5):
+                m = r["moves"][pips]
+                (b, e), = getDBmove(allMoves(board, pips), db)
+                self.assertIn((code2Board(m["code"]), m["extraTurn"]), allMoves(board, pips))
+                self.assertEqual(m["winProb"], db.aget(b) if e else 1 - db.aget(b))
+
+
+    def test_missing(self):
+        class NoValues(object):
+            def get(self, index):
+                return None
+
+            def aget(self, board):
+                return None
+
+        r, = Evaluator(NoValues()).evaluate([board2Code(startPosition())], moves=True)
+        self.assertIsNone(r["winProb"])
+        self.assertEqual(r["moves"][1:], [{"pips": pips, "error": "no database value"}
+                                          for pips in range(1, 5)])
+
+        # no legal move is a move all the same
+        b = [0]*22
+        b[13], b[20], b[14], b[21] = 1, -1, 6, 6
+        r, = Evaluator(PipCountDB()).evaluate([board2Code(b)], moves=True)
+        self.assertIsNone(r["moves"][2]["from"])
+        self.assertEqual(code2Board(r["moves"][2]["code"]), reverseBoard(b))
+
+
+    def test_errors(self):
+        ev = Evaluator(PipCountDB(), maxPly=2)
+        for positions, ply in (([-1], 0), (["?"], 0), ([1.5], 0), ([0], 3)):
+            with self.assertRaises(ValueError):
+                ev.evaluate(positions, ply=ply)
+        for moves, ply in ((False, True), (False, 1.0), (1, 0), ("yes", 0), (None, 0)):
+            with self.assertRaises(ValueError):
+                ev.evaluate([0], moves=moves, ply=ply)
+
+
+class TestServer(unittest.TestCase):
+    def test_http(self):
+        async def request(reader, writer, method, path, body=None):
+            data = json.dumps(body).encode() if body is not None else b""
+            writer.write("{0} {1} HTTP/1.1\r\nHost: x\r\nContent-Length: {2}\r\n\r\n"
+                         .format(method, path, len(data)).encode() + data)
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while True:
+                h = await reader.readline()
+                if h == b"\r\n":
+                    break
+                if h.lower().startswith(b"content-length:"):
+                    length = int(h.split(b":")[1])
+            return status, json.loads(await reader.readexactly(length))
+
+        async def client(port, positions):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            answers = [await request(reader, writer, "GET", "/health")]
+            # same connection
+            answers.append(await request(reader, writer, "POST", "/evaluate",
+                                         {"positions": positions, "moves": True}))
+            answers.append(await request(reader, writer, "POST", "/evaluate", {"positions": ["?"]}))
+            answers.append(await request(reader, writer, "GET", "/nothing"))
+            writer.close()
+            return answers
+
+        async def run():
+            server = await startServer(PipCountDB(), port=0)
+            port = server.sockets[0].getsockname()[1]
+            try:
+                codes = [board2Code(b) for b in somePositions()]
+                return await asyncio.gather(*[client(port, codes[k:]) for k in range(3)])
+            finally:
+                server.close()
+                await server.wait_closed()
+
+        loop = asyncio.new_event_loop()
+        try:
+            answers = loop.run_until_complete(run())
+        finally:
+            loop.close()
+
+        expected = Evaluator(PipCountDB()).evaluate([board2Code(b) for b in somePositions()],
+                                                    moves=True)
+        for k, (health, evaluate, bad, missing) in enumerate(answers):
+            self.assertEqual(health, (200, {"status": "ok"}))
+            self.assertEqual(evaluate, (200, {"results": expected[k:]}))
+            self.assertEqual(bad[0], 400)
+            self.assertEqual(missing[0], 404)
+
+
+    def test_contentLength(self):
+        async def request(port, length):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write("POST /evaluate HTTP/1.1\r\nContent-Length: {0}\r\n\r\n[0]"
+                         .format(length).encode())
+            status = int((await reader.readline()).split()[1])
+            # and the server hangs up
+            await reader.read()
+            writer.close()
+            return status
+
+        async def run():
+            server = await startServer(PipCountDB(), port=0)
+            port = server.sockets[0].getsockname()[1]
+            try:
+                return [await request(port, length) for length in ("abc", "-3", "1e3")]
+            finally:
+                server.close()
+                await server.wait_closed()
+
+        loop = asyncio.new_event_loop()
+        try:
+            self.assertEqual(loop.run_until_complete(run()), [400, 400, 400])
+        finally:
+            loop.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import
+
+import unittest
+
+import os
+import shutil
+import tempfile
+
+from royalur.urcore import *
+from royalur.probsdb import PositionsWinProbs
+from royalur.successors import SuccessorGraph, buildSuccessorGraph
+from royalur.checkpoint import Checkpoint
+from royalur import solver
+
+
+def onePly(board, db):
+    """ Win probability of Green to play on board, from the probabilities of its successors. """
+
+    p = 0.0
+    for pr, pips in ((1, 0), (4, 1), (6, 2), (4, 3), (1, 4)):
+        best = 0.0
+        for b, e in allMoves(board, pips):
+            if gameOver(b):
+                best = 1.0
+                break
+            v = db.aget(b)
+            best = max(best, v if e else 1 - v)
+        p += pr * best
+    return p / 16
+
+
+@unittest.skipIf(solver.numpy is None, "requires numpy")
+class TestSolver(unittest.TestCase):
+    BLOCKS = ((6, 6), (6, 5), (5, 5))
+
+    def setUp(self):
+        self.db = PositionsWinProbs()
+        solver.initGameOver(self.db)
+        for gm, rm in self.BLOCKS:
+            solver.solveBlock(self.db, gm, rm)
+
+
+    def test_fixedPoint(self):
+        for gm, rm in self.BLOCKS:
+            for board in positionsIterator(gm, rm):
+                for b in (board, reverseBoard(board)):
+                    self.assertAlmostEqual(self.db.aget(b), onePly(b, self.db), places=10)
+
+
+    def test_simple(self):
+        # one piece each on the last square, 1 wins: p = 1/4 + 3/4 (1 - p)
+        board = [0]*22
+        board[13], board[20], board[14], board[21] = 1, -1, 6, 6
+        self.assertAlmostEqual(self.db.aget(board), 4 / 7., places=12)
+
+
+    def test_graph(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            fname = os.path.join(tmpdir, "graph.bin")
+            start, stop = solver.blockRange(6, 6)
+            buildSuccessorGraph(fname, start, stop)
+            db = PositionsWinProbs()
+            solver.initGameOver(db)
+            solver.solveBlock(db, 6, 6, graph=SuccessorGraph(fname))
+            for i in range(start, stop):
+                self.assertEqual(db.get(i), self.db.get(i))
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+    def test_race(self):
+        db = PositionsWinProbs()
+        solver.initGameOver(db)
+        for gm, rm in self.BLOCKS:
+            solver.solveRace(db, gm, rm)
+            for board in positionsIterator(gm, rm):
+                if typeBearOff(board):
+                    for b in (board, reverseBoard(board)):
+                        self.assertAlmostEqual(db.aget(b), self.db.aget(b), places=12)
+                        self.assertAlmostEqual(db.aget(b), onePly(b, db), places=12)
+
+
+    def test_resume(self):
+        class Interrupt(Exception):
+            pass
+
+        def interrupt(gm, rm, sweep, maxError):
+            if (gm, rm) == (6, 5) and sweep == 5:
+                raise Interrupt()
+
+        db = PositionsWinProbs()
+        progress = Checkpoint()
+        with self.assertRaises(Interrupt):
+            solver.solve(db, report=interrupt, progress=progress)
+        self.assertEqual((progress.done, progress.current, progress.sweep), ([(6, 6)], [(6, 5)], 5))
+
+        sweeps = []
+        solver.solveBlock(db, 6, 5, progress=progress,
+                          report=lambda gm, rm, sweep, maxError: sweeps.append(sweep))
+        self.assertEqual(sweeps[0], 6)
+        self.assertEqual(progress.done, [(6, 6), (6, 5)])
+        start, stop = solver.blockRange(6, 5)
+        for i in range(start, stop):
+            self.assertEqual(db.get(i), self.db.get(i))
+
+
+@unittest.skipIf(solver.numpy is None, "requires numpy")
+class TestSolverParallel(unittest.TestCase):
+    def test_waves(self):
+        waves = solver.dependencyWaves()
+        self.assertEqual(waves[:3], [[(6, 6)], [(6, 5)], [(6, 4), (5, 5)]])
+        self.assertEqual(waves[-1], [(0, 0)])
+        self.assertEqual(sum(len(w) for w in waves), 28)
+
+
+    def test_parallel(self):
+        db = solver.solveParallel(processes=2, waves=solver.dependencyWaves()[:3])
+        for gm, rm in ((6, 6), (6, 5), (6, 4), (5, 5)):
+            for board in positionsIterator(gm, rm):
+                for b in (board, reverseBoard(board)):
+                    self.assertAlmostEqual(db.aget(b), onePly(b, db), places=10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+# Copyright (c) 2019-2021 Matthew Sheby.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import
+
+import unittest
+
+import os
+import shutil
+import tempfile
+
+from royalur.urcore import *
+from royalur.successors import SuccessorGraph, buildSuccessorGraph
+
+
+class TestSuccessors(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+    def check(self, start, stop):
+        fname = os.path.join(self.tmpdir, "graph.bin")
+        buildSuccessorGraph(fname, start, stop)
+        g = SuccessorGraph(fname)
+        self.assertEqual((g.start, g.count), (start, stop - start))
+        for i in range(start, stop):
+            self.assertTrue(i in g)
+            b = index2Board(i)
+            for pips in range(5):
+                expected = [] if gameOver(b) else [(board2Index(m), e) for m, e in allMoves(b, pips)]
+                self.assertEqual(g.successors(i, pips), expected)
+        self.assertFalse(stop in g)
+
+
+    def test_start(self):
+        i = board2Index(startPosition())
+        self.check(i - 100, i + 100)
+
+
+    def test_end(self):
+        # crosses into the game-over blocks
+        self.check(TOTAL_POSITIONS - 3000, TOTAL_POSITIONS)
+
+
+if __name__ == "__main__":
+    unittest.main()